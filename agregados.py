@@ -0,0 +1,239 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import and_, case, delete, extract, func, insert, or_, select, update
+from sqlalchemy.dialects import mysql, sqlite
+from models import db, Reserva, AgregadoDiario
+from eventos import na_mesma_transacao, DESCONHECIDO
+
+# Campos da reserva que mudam o agregado
+CAMPOS = ('data_entrada', 'tipo_servico', 'status', 'valor_final', 'desconto_percentual')
+# Colunas somadas em agregados_diarios
+SOMAS = ('reservas', 'finalizadas', 'canceladas', 'receita', 'soma_descontos')
+
+AGRUPAMENTOS = ('dia', 'mes', 'ano')
+
+
+def _dia(data_entrada):
+    return data_entrada.date() if isinstance(data_entrada, datetime) else data_entrada
+
+
+def contribuicao(valores):
+    """Quanto uma reserva soma no agregado do seu dia: ((dia, tipo_servico), {coluna: valor})."""
+    finalizada = valores['status'] == 'FINALIZADA'
+    return (_dia(valores['data_entrada']), valores['tipo_servico']), {
+        'reservas': 1,
+        'finalizadas': 1 if finalizada else 0,
+        'canceladas': 1 if valores['status'] == 'CANCELADA' else 0,
+        'receita': Decimal(str(valores['valor_final'] or 0)) if finalizada else Decimal('0'),
+        'soma_descontos': Decimal(str(valores['desconto_percentual'] or 0))
+    }
+
+
+def _completo(valores):
+    return all(valores.get(campo, DESCONHECIDO) is not DESCONHECIDO for campo in CAMPOS)
+
+
+def _consulta_agrupada():
+    """SELECT que calcula os agregados direto da tabela de reservas."""
+    dia = func.date(Reserva.data_entrada, type_=db.Date)
+    finalizada = Reserva.status == 'FINALIZADA'
+    return select(
+        dia,
+        Reserva.tipo_servico,
+        func.count(Reserva.id),
+        func.sum(case((finalizada, 1), else_=0)),
+        func.sum(case((Reserva.status == 'CANCELADA', 1), else_=0)),
+        func.coalesce(func.sum(case((finalizada, Reserva.valor_final), else_=0)), 0),
+        func.coalesce(func.sum(Reserva.desconto_percentual), 0)
+    ).group_by(dia, Reserva.tipo_servico)
+
+
+def reconstruir(conexao, dias=None):
+    """
+    Apaga e recalcula os agregados a partir das reservas, com um INSERT ... SELECT
+    feito todo no banco. Sem 'dias', refaz a tabela inteira.
+    """
+    tabela = AgregadoDiario.__table__
+    consulta = _consulta_agrupada()
+    apagar = delete(tabela)
+
+    if dias is not None:
+        if not dias:
+            return
+        dias = sorted(dias)
+        apagar = apagar.where(tabela.c.dia.in_(dias))
+        consulta = consulta.where(or_(*(
+            and_(Reserva.data_entrada >= datetime.combine(dia, datetime.min.time()),
+                 Reserva.data_entrada < datetime.combine(dia + timedelta(days=1), datetime.min.time()))
+            for dia in dias
+        )))
+
+    conexao.execute(apagar)
+    conexao.execute(insert(tabela).from_select(['dia', 'tipo_servico'] + list(SOMAS), consulta))
+
+
+def _somar(conexao, deltas):
+    """
+    Soma as diferenças nas linhas dos agregados, criando a linha do dia se ainda não existir.
+    O incremento é feito pelo próprio banco (coluna = coluna + valor), então dois processos
+    gravando reservas do mesmo dia ao mesmo tempo não perdem nenhuma soma.
+    """
+    tabela = AgregadoDiario.__table__
+    parametros = [dict(valores, dia=dia, tipo_servico=tipo) for (dia, tipo), valores in deltas.items()]
+    if not parametros:
+        return
+
+    if conexao.dialect.name == 'mysql':
+        comando = mysql.insert(tabela)
+        comando = comando.on_duplicate_key_update({c: tabela.c[c] + comando.inserted[c] for c in SOMAS})
+    elif conexao.dialect.name == 'sqlite':
+        comando = sqlite.insert(tabela)
+        comando = comando.on_conflict_do_update(
+            index_elements=['dia', 'tipo_servico'],
+            set_={c: tabela.c[c] + comando.excluded[c] for c in SOMAS}
+        )
+    else:
+        for p in parametros:
+            atualizado = conexao.execute(
+                update(tabela)
+                .where(tabela.c.dia == p['dia'], tabela.c.tipo_servico == p['tipo_servico'])
+                .values({c: tabela.c[c] + p[c] for c in SOMAS})
+            )
+            if not atualizado.rowcount:
+                conexao.execute(insert(tabela).values(p))
+        _apagar_vazios(conexao, parametros)
+        return
+
+    conexao.execute(comando, parametros)
+    _apagar_vazios(conexao, parametros)
+
+
+def _apagar_vazios(conexao, parametros):
+    """Uma reserva que saiu do dia (ex: mudou de data) pode deixar a linha zerada."""
+    dias = {p['dia'] for p in parametros if p['reservas'] < 0}
+    if dias:
+        tabela = AgregadoDiario.__table__
+        conexao.execute(delete(tabela).where(tabela.c.dia.in_(dias), tabela.c.reservas == 0))
+
+
+def _dia_no_banco(conexao, id_reserva):
+    data_entrada = conexao.execute(
+        select(Reserva.data_entrada).where(Reserva.id == id_reserva)
+    ).scalar()
+    return _dia(data_entrada)
+
+
+@na_mesma_transacao(Reserva)
+def _atualizar_agregados(conexao, alteracoes):
+    """
+    Mantém agregados_diarios em dia dentro da mesma transação da reserva.
+    Normalmente só somamos as diferenças; se algum valor antigo não estava carregado
+    na memória, recalculamos os dias envolvidos a partir da tabela de reservas.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(SOMAS, 0))
+    recalcular = set()
+
+    for alteracao in alteracoes:
+        if alteracao.acao == 'criado':
+            antes, depois = None, alteracao.valores
+        elif alteracao.acao == 'removido':
+            antes, depois = alteracao.valores, None
+        else:
+            if not any(campo in alteracao.anteriores for campo in CAMPOS):
+                continue
+            antes, depois = dict(alteracao.valores, **alteracao.anteriores), alteracao.valores
+
+        if all(v is None or _completo(v) for v in (antes, depois)):
+            for sinal, valores in ((-1, antes), (1, depois)):
+                if valores is None:
+                    continue
+                chave, somas = contribuicao(valores)
+                for coluna, valor in somas.items():
+                    deltas[chave][coluna] += sinal * valor
+            continue
+
+        # Faltou algum valor: descobrimos os dias (antes e depois) para recalcular
+        if depois is not None:
+            dia_atual = _dia(depois.get('data_entrada', DESCONHECIDO))
+            if dia_atual is DESCONHECIDO:
+                dia_atual = _dia_no_banco(conexao, alteracao.id)
+            recalcular.add(dia_atual)
+        dia_anterior = _dia(antes.get('data_entrada', DESCONHECIDO)) if antes is not None else None
+        if dia_anterior is DESCONHECIDO:
+            if alteracao.acao == 'alterado' and 'data_entrada' not in alteracao.anteriores:
+                continue  # a data não mudou: o dia anterior é o mesmo de agora
+            # Não sabemos em que dia a reserva estava: refazemos tudo
+            reconstruir(conexao)
+            return
+        if dia_anterior is not None:
+            recalcular.add(dia_anterior)
+
+    recalcular.discard(None)
+    _somar(conexao, {
+        chave: valores for chave, valores in deltas.items()
+        if chave[0] not in recalcular and any(valores.values())
+    })
+    if recalcular:
+        reconstruir(conexao, recalcular)
+
+
+# ---------- leitura ----------
+
+def ler_periodo(texto, final=False):
+    """
+    Converte 'AAAA', 'AAAA-MM' ou 'AAAA-MM-DD' em uma data (ValueError se inválido).
+    Com final=True devolve o último dia do período (ex: '2024-02' -> 2024-02-29).
+    """
+    partes = [int(p) for p in texto.split('-')]
+    if not 1 <= len(partes) <= 3:
+        raise ValueError(texto)
+    inicio = date(partes[0], partes[1] if len(partes) > 1 else 1, partes[2] if len(partes) > 2 else 1)
+    if not final or len(partes) == 3:
+        return inicio
+    if len(partes) == 1:
+        return date(inicio.year, 12, 31)
+    proximo_mes = date(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+    return proximo_mes - timedelta(days=1)
+
+
+def serie_receita(inicio=None, fim=None, agrupar='mes', tipo_servico=None):
+    """Série de receita/reservas por dia, mês ou ano, lida só de agregados_diarios."""
+    tabela = AgregadoDiario.__table__
+    ano = extract('year', tabela.c.dia)
+    mes = extract('month', tabela.c.dia)
+    periodo = {'dia': [tabela.c.dia], 'mes': [ano, mes], 'ano': [ano]}[agrupar]
+
+    consulta = select(
+        *periodo,
+        tabela.c.tipo_servico,
+        *(func.sum(tabela.c[coluna]) for coluna in SOMAS)
+    ).group_by(*periodo, tabela.c.tipo_servico).order_by(*periodo, tabela.c.tipo_servico)
+
+    if inicio:
+        consulta = consulta.where(tabela.c.dia >= inicio)
+    if fim:
+        consulta = consulta.where(tabela.c.dia <= fim)
+    if tipo_servico:
+        consulta = consulta.where(tabela.c.tipo_servico == tipo_servico)
+
+    serie = []
+    for linha in db.session.execute(consulta):
+        chave = linha[:len(periodo)]
+        reservas, finalizadas, canceladas, receita, soma_descontos = linha[len(periodo) + 1:]
+        if agrupar == 'dia':
+            rotulo = _dia(chave[0]).isoformat()
+        elif agrupar == 'mes':
+            rotulo = f'{int(chave[0]):04d}-{int(chave[1]):02d}'
+        else:
+            rotulo = f'{int(chave[0]):04d}'
+        serie.append({
+            'periodo': rotulo,
+            'tipo_servico': linha[len(periodo)],
+            'reservas': int(reservas),
+            'finalizadas': int(finalizadas),
+            'canceladas': int(canceladas),
+            'receita': float(receita),
+            'desconto_medio': round(float(soma_descontos) / int(reservas), 2) if reservas else 0.0
+        })
+    return serie
@@ -1,12 +1,45 @@
 # Importação das bibliotecas necessárias para o funcionamento do sistema
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_cors import CORS
 from datetime import datetime, timedelta
-from sqlalchemy import func, extract, and_, or_
+from sqlalchemy import func, extract, or_
 from config import Config
-from models import db, Usuario, Reserva, RegistroPonto, Promocao
+from models import db, Usuario, Reserva, RegistroPonto, Promocao, AgregadoDiario
+from agregados import AGRUPAMENTOS, ler_periodo, serie_receita, reconstruir
+from estatisticas import estatisticas
+from promocoes import motor_promocoes, aplicar_melhor_promocao
+from disponibilidade import disponibilidade, verificar_reserva
+from notificacoes import central, canais_do_usuario
+from importacao import ImportadorClientes, ler_linhas
+from senhas import servico_senhas, SistemaOcupado, SENHA_PENDENTE
+from visitas import acumulador_visitas
+from identidade import cache_identidade
+from instrumentacao import instrumentacao
+from cache_http import resposta_condicional
+from fragmentos import cache_fragmentos, configurar_templates, compilar_templates
+from estaticos import estaticos
+from compactacao import compactacao, jsonify_lista
+from reservas_lote import criar_reservas_lote, LoteInvalido
+from ponto import bater_ponto
+from tarefas import fila_tarefas
+import tarefas_cadastro  # registra as tarefas de cadastro/checkout na fila
+from replicas import leitura_na_replica, usando_replica, roteador_replica
+from migracoes import migrar
+from auditoria import auditar
+from consultas import usuario_por_email, reservas_do_cliente, presenca_do_dia
+from dados_sinteticos import GeradorDados, SENHA_PADRAO
+from folha import ler_mes, relatorio_mensal, totais as totais_folha, para_csv as folha_para_csv
+from exportacao import (
+    CONSULTAS as CONSULTAS_EXPORTACAO, TABELAS as TABELAS_EXPORTACAO, FORMATOS as FORMATOS_EXPORTACAO,
+    ler_filtros, gerar_linhas, comprimir
+)
+import click
+import hmac
+import json
 import os
+import queue
+import zlib
 
 # Criação da nossa aplicação Flask
 app = Flask(__name__)
@@ -16,6 +49,15 @@ app.config.from_object(Config)
 # Inicializamos as extensões do banco de dados e CORS (permite acesso de diferentes domínios)
 db.init_app(app)
 CORS(app)
+# Mede consultas e tempo de cada requisição (Server-Timing e /metrics)
+instrumentacao.init_app(app)
+# Templates compilados guardados em disco (flask compilar-templates compila todos antes de subir)
+configurar_templates(app)
+# CSS, JS e imagens com hash no nome, já compactados e com cache longo (flask construir-estaticos)
+estaticos.init_app(app)
+# Respostas de /api/* em JSON sem espaços e compactadas com gzip/deflate
+app.json.compact = True
+compactacao.init_app(app)
 
 # Configuração do Sistema de Login (Flask-Login)
 login_manager = LoginManager()
@@ -26,13 +68,36 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Por favor, faça login para acessar esta página.'
 login_manager.login_message_category = 'info'
 
+# Maior quantidade de itens que uma listagem paginada devolve de uma vez
+LIMITE_MAXIMO_PAGINA = 500
+
 @login_manager.user_loader
 def carregar_usuario(id_usuario):
     """
     Função necessária para o Flask-Login saber como recuperar 
     o usuário do banco de dados usando o ID salvo na sessão.
+    Usa o cache de identidade (identidade.py): na maioria das requisições
+    o usuário já está na memória e não há consulta ao banco.
+    """
+    return cache_identidade.obter(int(id_usuario))
+
+
+@app.errorhandler(SistemaOcupado)
+def sistema_ocupado(erro):
+    """
+    Todos os processos de senha estão ocupados (ex: muitos logins na troca de turno).
+    Respondemos 503 na hora para o navegador tentar de novo em instantes.
     """
-    return Usuario.query.get(int(id_usuario))
+    db.session.rollback()
+    mensagem = 'Sistema ocupado no momento. Tente novamente em alguns segundos.'
+    cabecalhos = {'Retry-After': '2'}
+    
+    if request.path.startswith('/api/'):
+        return jsonify({'error': mensagem}), 503, cabecalhos
+    
+    flash(mensagem, 'warning')
+    pagina = 'registro.html' if request.endpoint == 'registro' else 'login.html'
+    return render_template(pagina), 503, cabecalhos
 
 
 # ==================== ROTAS DE AUTENTICAÇÃO ====================
@@ -43,9 +108,23 @@ def pagina_inicial():
     Rota da Página Inicial.
     Mostra os serviços disponíveis e as promoções ativas.
     """
-    # Buscamos as promoções ativas no banco de dados para mostrar na vitrine
-    promocoes = Promocao.query.filter_by(ativa=True).all()
-    return render_template('index.html', promocoes=promocoes)
+    # As promoções ativas vêm da memória (motor_promocoes), sem consultar o banco a cada visita,
+    # e o conteúdo da página fica guardado já renderizado até alguma promoção mudar.
+    # Só o menu do topo e os avisos (base.html) são renderizados de novo em cada visita.
+    versao = motor_promocoes.versao()
+    gerar = lambda: render_template('index.html', conteudo=cache_fragmentos.obter(
+        ('inicio', versao), lambda: render_template('index_conteudo.html', promocoes=motor_promocoes.ativas())
+    ))
+    if session.get('_flashes'):
+        # Avisos pendentes aparecem uma vez só: essa página não pode vir do cache HTTP
+        return gerar()
+    
+    # A página muda com as promoções, com quem está logado (menu do topo)
+    # e com os nomes dos arquivos de CSS/JS a cada build
+    versao_pagina = f'{versao}-{estaticos.versao}'
+    if current_user.is_authenticated:
+        versao_pagina += f'-{current_user.id}-{current_user.tipo_usuario}-{zlib.crc32(current_user.nome.encode()):x}'
+    return resposta_condicional(versao_pagina, gerar, publica=not current_user.is_authenticated)
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -65,7 +144,7 @@ def login():
         senha = request.form.get('senha')
         
         # Procuramos o usuário no banco de dados
-        usuario = Usuario.query.filter_by(email=email).first()
+        usuario = db.session.scalars(usuario_por_email(email)).first()
         
         # Passo 1: O e-mail existe?
         if not usuario:
@@ -74,6 +153,12 @@ def login():
             
         # Passo 2: A senha está correta? (A função verificar_senha faz a mágica)
         if usuario.verificar_senha(senha) and usuario.ativo:
+            # Se a hash foi feita com um método/custo antigo, aproveitamos para refazê-la
+            # (com commit aqui mesmo: nada mais nesta requisição grava a sessão)
+            if usuario.senha_desatualizada():
+                usuario.set_senha(senha)
+                db.session.commit()
+            
             # Tudo certo! Iniciamos a sessão do usuário
             login_user(usuario, remember=True)
             # Registramos que ele entrou hoje (para fins de fidelidade)
@@ -137,8 +222,12 @@ def registro():
         novo_usuario.set_senha(senha)
         
         try:
-            # Tentamos salvar no banco de dados
+            # Tentamos salvar no banco de dados; o e-mail de boas-vindas vai pela fila
+            # de tarefas (flask worker), no mesmo commit, sem atrasar a resposta
             db.session.add(novo_usuario)
+            db.session.flush()
+            fila_tarefas.enfileirar('email_boas_vindas', {'usuario_id': novo_usuario.id},
+                                    chave=f'boas-vindas:{novo_usuario.id}')
             db.session.commit()
             
             flash('Sua conta foi criada com sucesso! Você já pode entrar.', 'success')
@@ -203,13 +292,15 @@ def painel_cliente():
         flash('Acesso negado.', 'error')
         return redirect(url_for('dashboard'))
     
-    return render_template('dashboard_cliente.html')
+    # O contador de visitas inclui as que ainda não foram gravadas no banco
+    return render_template('dashboard_cliente.html', total_visitas=acumulador_visitas.total_visitas(current_user))
 
 
 # ==================== API - ESTATÍSTICAS PARA O ADMINISTRADOR ====================
 
 @app.route('/api/admin/estatisticas')
 @login_required
+@leitura_na_replica
 def api_admin_estatisticas():
     """
     Retorna números gerais do sistema para o painel do Admin.
@@ -217,38 +308,94 @@ def api_admin_estatisticas():
     if not current_user.is_admin():
         return jsonify({'error': 'Acesso negado'}), 403
     
-    # Contagem de usuários registrados por tipo
-    total_clientes = Usuario.query.filter_by(tipo_usuario='CLIENTE').count()
-    total_funcionarios = Usuario.query.filter_by(tipo_usuario='FUNCIONARIO').count()
-    total_admins = Usuario.query.filter_by(tipo_usuario='ADM').count()
-    
-    # Quantas reservas estão "ATIVAS" no momento
-    reservas_ativas = Reserva.query.filter_by(status='ATIVA').count()
+    # Os números vêm de um cache curto que é zerado sempre que alguém
+    # cria/altera usuários, reservas ou pontos (veja estatisticas.py)
+    return jsonify(estatisticas.obter())
+
+
+@app.route('/api/admin/receita')
+@login_required
+@leitura_na_replica
+def api_admin_receita():
+    """
+    Receita e reservas ao longo do tempo, lidas dos agregados diários.
+    Parâmetros: ?agrupar=dia|mes|ano&inicio=AAAA[-MM[-DD]]&fim=AAAA[-MM[-DD]]&tipo_servico=HOTEL
+    """
+    if not current_user.is_admin():
+        return jsonify({'error': 'Acesso negado'}), 403
     
-    # Soma de todo o dinheiro ganho com reservas FINALIZADAS
-    receita_total = db.session.query(func.sum(Reserva.valor_final)).filter_by(status='FINALIZADA').scalar() or 0
+    agrupar = request.args.get('agrupar', 'mes')
+    tipo_servico = request.args.get('tipo_servico', '').upper() or None
+    try:
+        inicio = ler_periodo(request.args['inicio']) if request.args.get('inicio') else None
+        fim = ler_periodo(request.args['fim'], final=True) if request.args.get('fim') else None
+        if agrupar not in AGRUPAMENTOS or (tipo_servico and tipo_servico not in ('HOTEL', 'GARAGEM')):
+            raise ValueError(agrupar)
+    except ValueError:
+        return jsonify({'error': 'Parâmetros inválidos. Use agrupar=dia|mes|ano e datas AAAA, AAAA-MM ou AAAA-MM-DD'}), 400
     
-    # Quantos funcionários bateram entrada e ainda não bateram saída hoje
-    hoje = datetime.utcnow().date()
-    funcionarios_presentes = RegistroPonto.query.filter(
-        RegistroPonto.data == hoje,
-        RegistroPonto.hora_saida.is_(None)
-    ).count()
+    serie = serie_receita(inicio, fim, agrupar, tipo_servico)
+    return jsonify({
+        'agrupar': agrupar,
+        'serie': serie,
+        'receita_total': sum(item['receita'] for item in serie),
+        'reservas_total': sum(item['reservas'] for item in serie)
+    })
+
+
+@app.route('/api/admin/metricas')
+@login_required
+def api_admin_metricas():
+    """Números internos de desempenho (ex: fila e tempo das hashes de senha)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Acesso negado'}), 403
     
     return jsonify({
-        'usuarios': {
-            'clientes': total_clientes,
-            'funcionarios': total_funcionarios,
-            'admins': total_admins
-        },
-        'reservas_ativas': reservas_ativas,
-        'receita_total': float(receita_total),
-        'funcionarios_presentes': funcionarios_presentes
+        'senhas': servico_senhas.metricas(),
+        'identidade': cache_identidade.metricas()
     })
 
 
+@app.route('/metrics')
+def metricas_prometheus():
+    """
+    Métricas deste processo no formato do Prometheus: tempo e consultas por rota,
+    consultas lentas, fila de senhas, cache de identidade e conexões de avisos.
+    """
+    token = app.config.get('METRICAS_TOKEN')
+    com_token = bool(token) and hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()
+    )
+    admin = current_user.is_authenticated and current_user.is_admin()
+    if not (com_token or admin or app.config.get('METRICAS_PUBLICAS')):
+        return Response('Acesso negado\n', status=403, mimetype='text/plain')
+    
+    senhas = servico_senhas.metricas()
+    identidade = cache_identidade.metricas()
+    replica = roteador_replica.metricas()
+    fragmentos = cache_fragmentos.metricas()
+    extras = [
+        ('senhas_hashes_total', 'counter', 'Hashes de senha calculadas.', senhas['total']),
+        ('senhas_recusadas_total', 'counter', 'Pedidos de senha recusados com 503.', senhas['recusadas']),
+        ('senhas_em_andamento', 'gauge', 'Hashes de senha sendo calculadas agora.', senhas['em_andamento']),
+        ('senhas_espera_segundos_total', 'counter', 'Tempo total na fila dos processos de senha.', senhas['espera_total_s']),
+        ('identidade_cache_acertos_total', 'counter', 'Usuários logados achados no cache.', identidade['acertos']),
+        ('identidade_cache_faltas_total', 'counter', 'Usuários logados buscados no banco.', identidade['faltas']),
+        ('identidade_cache_itens', 'gauge', 'Usuários no cache de identidade.', identidade['itens']),
+        ('sse_assinaturas', 'gauge', 'Navegadores conectados em /api/eventos.', central.total_assinaturas()),
+        ('fragmentos_cache_acertos_total', 'counter', 'Trechos de página servidos já renderizados.', fragmentos['acertos']),
+        ('fragmentos_cache_faltas_total', 'counter', 'Trechos de página renderizados de novo.', fragmentos['faltas']),
+        ('visitas_pendentes', 'gauge', 'Usuários com visitas ainda não gravadas.', len(acumulador_visitas.todos_pendentes())),
+        ('replica_leituras_total', 'counter', 'Leituras de relatórios feitas na réplica.', replica['leituras_replica']),
+        ('replica_leituras_primario_total', 'counter', 'Leituras de relatórios que ficaram no primário.', replica['leituras_primario']),
+        ('replica_falhas_total', 'counter', 'Verificações em que a réplica estava fora ou atrasada.', replica['falhas_replica']),
+    ]
+    return Response(instrumentacao.metricas_prometheus(extras), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/admin/clientes-frequentes')
 @login_required
+@leitura_na_replica
 def api_admin_clientes_frequentes():
     """Mostra quem são os clientes que mais visitam o estabelecimento"""
     if not current_user.is_admin():
@@ -264,66 +411,195 @@ def api_admin_clientes_frequentes():
         Usuario.ultima_visita >= data_limite
     ).order_by(Usuario.total_visitas.desc()).limit(10).all()
     
-    return jsonify({
-        'clientes': [
-            {
-                'id': c.id,
-                'nome': c.nome,
-                'email': c.email,
-                'total_visitas': c.total_visitas,
-                'ultima_visita': c.ultima_visita.isoformat() if c.ultima_visita else None
-            }
-            for c in clientes
-        ]
-    })
+    # Visitas que ainda estão na memória (não gravadas) também contam no ranking
+    pendentes = acumulador_visitas.todos_pendentes()
+    ja_listados = {c.id for c in clientes}
+    faltando = [id_usuario for id_usuario in pendentes if id_usuario not in ja_listados]
+    if faltando:
+        clientes += Usuario.query.filter(
+            Usuario.id.in_(faltando),
+            Usuario.tipo_usuario == 'CLIENTE'
+        ).all()
+    
+    ranking = []
+    for c in clientes:
+        ultima_visita = acumulador_visitas.ultima_visita(c)
+        if ultima_visita and ultima_visita >= data_limite:
+            ranking.append((acumulador_visitas.total_visitas(c), ultima_visita, c))
+    ranking.sort(key=lambda item: item[0], reverse=True)
+    
+    return jsonify_lista('clientes', [
+        {
+            'id': c.id,
+            'nome': c.nome,
+            'email': c.email,
+            'total_visitas': total_visitas,
+            'ultima_visita': ultima_visita.isoformat()
+        }
+        for total_visitas, ultima_visita, c in ranking[:10]
+    ])
 
 
 @app.route('/api/admin/usuarios')
 @login_required
+@leitura_na_replica
 def api_admin_usuarios():
-    """Lista todos os cadastros (pode filtrar por tipo via URL)"""
+    """
+    Lista os cadastros em páginas (pode filtrar por tipo via URL).
+    A paginação é por cursor: ?limit=50&after=<último id recebido>.
+    Com ?formato=ndjson a lista inteira é enviada aos poucos, uma linha JSON por usuário,
+    e com ?formato=colunar a página vem em colunas (nomes dos campos uma vez só).
+    """
     if not current_user.is_admin():
         return jsonify({'error': 'Acesso negado'}), 403
     
     tipo_filtro = request.args.get('tipo', None)
-    consulta = Usuario.query
+    depois_de = request.args.get('after', 0, type=int)
+    consulta = Usuario.query.filter(Usuario.id > depois_de).order_by(Usuario.id)
     
     if tipo_filtro:
         consulta = consulta.filter_by(tipo_usuario=tipo_filtro)
     
-    usuarios = consulta.all()
-    return jsonify({'usuarios': [u.to_dict() for u in usuarios]})
+    if request.args.get('formato') == 'ndjson':
+        # yield_per usa um cursor no servidor: as linhas vêm do banco em blocos
+        # e são enviadas na hora, sem montar a lista toda na memória
+        def gerar_linhas():
+            for usuario in consulta.yield_per(1000):
+                yield json.dumps(usuario.to_dict(), ensure_ascii=False) + '\n'
+        
+        return Response(stream_with_context(gerar_linhas()), mimetype='application/x-ndjson')
+    
+    limite = max(1, min(request.args.get('limit', 50, type=int), LIMITE_MAXIMO_PAGINA))
+    # Buscamos um a mais só para saber se existe uma próxima página
+    usuarios = consulta.limit(limite + 1).all()
+    tem_mais = len(usuarios) > limite
+    usuarios = usuarios[:limite]
+    
+    return jsonify_lista('usuarios', [u.to_dict() for u in usuarios], proximo=usuarios[-1].id if tem_mais else None)
 
 
 @app.route('/api/admin/funcionarios-presenca')
 @login_required
+@leitura_na_replica
 def api_admin_funcionarios_presenca():
     """Verifica quem dos funcionários está trabalhando agora"""
     if not current_user.is_admin():
         return jsonify({'error': 'Acesso negado'}), 403
     
-    hoje = datetime.utcnow().date()
+    # Por padrão é hoje, mas dá para consultar outro dia com ?data=AAAA-MM-DD
+    texto_data = request.args.get('data')
+    try:
+        dia = datetime.strptime(texto_data, '%Y-%m-%d').date() if texto_data else datetime.utcnow().date()
+    except ValueError:
+        return jsonify({'error': 'Data inválida. Use o formato AAAA-MM-DD'}), 400
     
-    # Pega todos os funcionários ativos
-    lista_funcionarios = Usuario.query.filter_by(tipo_usuario='FUNCIONARIO', ativo=True).all()
+    # Uma única consulta: todos os funcionários ativos com o ponto do dia (se existir)
+    linhas = db.session.execute(presenca_do_dia(dia)).all()
     
     relatorio = []
-    for func in lista_funcionarios:
-        # Tenta achar o ponto de hoje desse funcionário
-        ponto = RegistroPonto.query.filter_by(
-            funcionario_id=func.id,
-            data=hoje
-        ).first()
+    vistos = set()
+    for id_funcionario, nome, hora_entrada, hora_saida in linhas:
+        # Se houver mais de um ponto no mesmo dia, vale o primeiro
+        if id_funcionario in vistos:
+            continue
+        vistos.add(id_funcionario)
         
         relatorio.append({
-            'id': func.id,
-            'nome': func.nome,
-            'presente': ponto is not None and ponto.hora_saida is None,
-            'hora_entrada': ponto.hora_entrada.isoformat() if ponto else None,
-            'hora_saida': ponto.hora_saida.isoformat() if ponto and ponto.hora_saida else None
+            'id': id_funcionario,
+            'nome': nome,
+            'presente': hora_entrada is not None and hora_saida is None,
+            'turno': turno_do_horario(hora_entrada),
+            'hora_entrada': hora_entrada.isoformat() if hora_entrada else None,
+            'hora_saida': hora_saida.isoformat() if hora_saida else None
+        })
+    
+    extras = {'data': dia.isoformat()}
+    
+    # ?agrupar=turno separa a lista por turno de entrada
+    if request.args.get('agrupar') == 'turno':
+        grupos = {}
+        for item in relatorio:
+            grupo = grupos.setdefault(item['turno'], {'total': 0, 'presentes': 0, 'funcionarios': []})
+            grupo['total'] += 1
+            grupo['presentes'] += 1 if item['presente'] else 0
+            grupo['funcionarios'].append(item)
+        extras['grupos'] = grupos
+    
+    return jsonify_lista('funcionarios', relatorio, **extras)
+
+
+def turno_do_horario(hora_entrada):
+    """Descobre o turno pelo horário em que o funcionário bateu a entrada"""
+    if hora_entrada is None:
+        return 'SEM_REGISTRO'
+    if 5 <= hora_entrada.hour < 12:
+        return 'MANHA'
+    if 12 <= hora_entrada.hour < 18:
+        return 'TARDE'
+    return 'NOITE'
+
+
+@app.route('/api/admin/folha')
+@login_required
+@leitura_na_replica
+def api_admin_folha():
+    """
+    Folha de ponto do mês para o RH: horas, horas extras e saídas não registradas por funcionário.
+    Parâmetros: ?mes=AAAA-MM (padrão: mês atual)&formato=csv|colunar
+    """
+    if not current_user.is_admin():
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    try:
+        inicio, fim = ler_mes(request.args.get('mes'))
+    except ValueError:
+        return jsonify({'error': 'Mês inválido. Use o formato AAAA-MM'}), 400
+    
+    relatorio = relatorio_mensal(inicio, fim)
+    
+    if request.args.get('formato') == 'csv':
+        return Response(folha_para_csv(relatorio), mimetype='text/csv', headers={
+            'Content-Disposition': f'attachment; filename=folha-{inicio:%Y-%m}.csv'
         })
     
-    return jsonify({'funcionarios': relatorio})
+    return jsonify_lista('funcionarios', relatorio, mes=f'{inicio:%Y-%m}', totais=totais_folha(relatorio))
+
+
+@app.route('/api/admin/exportar/<tabela>')
+@login_required
+@leitura_na_replica
+def api_admin_exportar(tabela):
+    """
+    Exporta reservas ou registros de ponto para a contabilidade: /api/admin/exportar/reservas
+    Parâmetros: ?formato=csv|ndjson&inicio=AAAA-MM-DD&fim=AAAA-MM-DD&tipo_servico=HOTEL&status=FINALIZADA
+    O arquivo é enviado aos poucos (e compactado com gzip se o navegador aceitar).
+    """
+    if not current_user.is_admin():
+        return jsonify({'error': 'Acesso negado'}), 403
+
+    formato = request.args.get('formato', 'csv')
+    if tabela not in TABELAS_EXPORTACAO or formato not in FORMATOS_EXPORTACAO:
+        return jsonify({'error': 'Exportação não encontrada'}), 404
+
+    try:
+        filtros = ler_filtros(
+            request.args.get('inicio'), request.args.get('fim'),
+            request.args.get('tipo_servico'), request.args.get('status')
+        )
+    except ValueError as erro:
+        return jsonify({'error': f'Parâmetros inválidos: {erro}'}), 400
+
+    pedacos = gerar_linhas(CONSULTAS_EXPORTACAO[tabela](**filtros), formato)
+    cabecalhos = {
+        'Content-Disposition': f'attachment; filename={tabela}.{formato}',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.accept_encodings['gzip']:
+        pedacos = comprimir(pedacos)
+        cabecalhos['Content-Encoding'] = 'gzip'
+
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(pedacos), mimetype=mimetype, headers=cabecalhos)
 
 
 # ==================== API - FUNCIONÁRIO ====================
@@ -331,46 +607,41 @@ def api_admin_funcionarios_presenca():
 @app.route('/api/funcionario/bater-ponto', methods=['POST'])
 @login_required
 def api_funcionario_bater_ponto():
-    """Registra entrada ou saída do funcionário"""
+    """Registra entrada ou saída do funcionário (um único comando no banco, veja ponto.py)"""
     if not current_user.is_funcionario():
         return jsonify({'error': 'Acesso negado'}), 403
     
-    hoje = datetime.utcnow().date()
     agora = datetime.utcnow()
-    
-    # Verificar se já bateu ponto hoje
-    ponto_hoje = RegistroPonto.query.filter_by(
-        funcionario_id=current_user.id,
-        data=hoje
-    ).first()
-    
-    if not ponto_hoje:
-        # Registrar entrada
-        ponto = RegistroPonto(
-            funcionario_id=current_user.id,
-            data=hoje,
-            hora_entrada=agora
-        )
-        db.session.add(ponto)
+    try:
+        tipo, ponto = bater_ponto(current_user.id, agora)
         db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    if tipo == 'entrada':
         return jsonify({
             'success': True,
             'tipo': 'entrada',
             'message': 'Entrada registrada com sucesso!',
-            'hora': agora.isoformat()
+            'hora': ponto['hora_entrada'].isoformat()
         })
-    elif not ponto_hoje.hora_saida:
-        # Registrar saída
-        ponto_hoje.hora_saida = agora
-        ponto_hoje.calcular_horas()
-        db.session.commit()
+    elif tipo == 'saida':
         return jsonify({
             'success': True,
             'tipo': 'saida',
             'message': 'Saída registrada com sucesso!',
-            'hora': agora.isoformat(),
-            'total_horas': float(ponto_hoje.total_horas)
+            'hora': ponto['hora_saida'].isoformat(),
+            'total_horas': float(ponto['total_horas'])
         })
+    elif tipo == 'repetido':
+        # Segunda batida logo depois da entrada: a entrada continua valendo
+        return jsonify({
+            'success': False,
+            'tipo': 'entrada',
+            'message': 'Entrada já registrada agora há pouco',
+            'hora': ponto['hora_entrada'].isoformat()
+        }), 409
     else:
         return jsonify({
             'success': False,
@@ -385,11 +656,25 @@ def api_funcionario_meu_ponto():
     if not current_user.is_funcionario():
         return jsonify({'error': 'Acesso negado'}), 403
     
+    # Com ?mes=AAAA-MM vem o mês inteiro e o resumo de horas; sem ele, os 30 últimos pontos
+    if request.args.get('mes'):
+        try:
+            inicio, fim = ler_mes(request.args['mes'])
+        except ValueError:
+            return jsonify({'error': 'Mês inválido. Use o formato AAAA-MM'}), 400
+        
+        pontos = RegistroPonto.query.filter(
+            RegistroPonto.funcionario_id == current_user.id,
+            RegistroPonto.data.between(inicio, fim)
+        ).order_by(RegistroPonto.data.desc()).all()
+        resumo = relatorio_mensal(inicio, fim, funcionario_id=current_user.id)
+        return jsonify_lista('pontos', [p.to_dict() for p in pontos], resumo=resumo[0] if resumo else None)
+    
     pontos = RegistroPonto.query.filter_by(
         funcionario_id=current_user.id
     ).order_by(RegistroPonto.data.desc()).limit(30).all()
     
-    return jsonify({'pontos': [p.to_dict() for p in pontos]})
+    return jsonify_lista('pontos', [p.to_dict() for p in pontos])
 
 
 @app.route('/api/funcionario/promocoes')
@@ -400,13 +685,8 @@ def api_funcionario_promocoes():
         return jsonify({'error': 'Acesso negado'}), 403
     
     agora = datetime.utcnow()
-    promocoes = Promocao.query.filter(
-        Promocao.ativa == True,
-        Promocao.data_inicio <= agora,
-        Promocao.data_fim >= agora
-    ).all()
-    
-    return jsonify({'promocoes': [p.to_dict() for p in promocoes]})
+    versao = motor_promocoes.versao_vigentes(agora)
+    return resposta_condicional(versao, lambda: jsonify({'promocoes': motor_promocoes.vigentes(agora)}))
 
 
 @app.route('/api/funcionario/criar-reserva', methods=['POST'])
@@ -433,9 +713,19 @@ def api_funcionario_criar_reserva():
         numero_vaga=data.get('numero_vaga'),
         data_saida_prevista=datetime.fromisoformat(data.get('data_saida_prevista')) if data.get('data_saida_prevista') else None,
         valor_base=data.get('valor_base'),
-        desconto_percentual=data.get('desconto_percentual', 0)
+        desconto_percentual=data.get('desconto_percentual')
     )
-    reserva.calcular_valor_final()
+    
+    # Se o funcionário não informou um desconto, usamos a melhor promoção do cliente
+    if reserva.desconto_percentual is None:
+        aplicar_melhor_promocao(reserva, cliente)
+    else:
+        reserva.calcular_valor_final()
+    
+    # Não deixamos reservar um quarto/vaga que já está ocupado no período
+    erro = verificar_reserva(reserva)
+    if erro:
+        return jsonify({'error': erro}), 409
     
     db.session.add(reserva)
     db.session.commit()
@@ -447,20 +737,76 @@ def api_funcionario_criar_reserva():
     })
 
 
+@app.route('/api/funcionario/criar-reservas-lote', methods=['POST'])
+@login_required
+def api_funcionario_criar_reservas_lote():
+    """
+    Cria várias reservas de uma vez (check-in de grupos de turismo e frotas de empresas).
+    Corpo: {"reservas": [{mesmos campos de criar-reserva}, ...], "atomico": true}
+    Com atomico=true (padrão) nada é gravado se algum item tiver erro;
+    com atomico=false os itens certos são gravados e os errados voltam com o motivo.
+    """
+    if not current_user.is_funcionario():
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    atomico = data.get('atomico', True) is not False
+    try:
+        resultados, criadas = criar_reservas_lote(
+            data.get('reservas'), current_user.id, atomico, app.config.get('RESERVAS_LOTE_MAXIMO', 500)
+        )
+    except LoteInvalido as erro:
+        return jsonify({'error': str(erro)}), 400
+    
+    falhas = sum(1 for r in resultados if r.get('erro'))
+    return jsonify({
+        'success': falhas == 0,
+        'atomico': atomico,
+        'criadas': criadas,
+        'falhas': falhas,
+        'resultados': resultados
+    }), 200 if criadas or not falhas else 422
+
+
 # ==================== API - CLIENTE ====================
 
 @app.route('/api/cliente/minhas-reservas')
 @login_required
 def api_cliente_minhas_reservas():
-    """Lista reservas do cliente"""
+    """
+    Lista reservas do cliente, das mais novas para as mais antigas, em páginas.
+    Parâmetros: ?limit=20&after=<cursor>&inicio=AAAA-MM-DD&fim=AAAA-MM-DD&formato=colunar
+    """
     if not current_user.is_cliente():
         return jsonify({'error': 'Acesso negado'}), 403
     
-    reservas = Reserva.query.filter_by(
-        cliente_id=current_user.id
-    ).order_by(Reserva.data_entrada.desc()).all()
+    try:
+        inicio = datetime.strptime(request.args['inicio'], '%Y-%m-%d') if request.args.get('inicio') else None
+        fim = datetime.strptime(request.args['fim'], '%Y-%m-%d') if request.args.get('fim') else None
+        cursor = ler_cursor_reserva(request.args.get('after'))
+    except ValueError:
+        return jsonify({'error': 'Parâmetros inválidos. Datas no formato AAAA-MM-DD'}), 400
+    
+    limite = max(1, min(request.args.get('limit', 20, type=int), LIMITE_MAXIMO_PAGINA))
+    reservas = db.session.scalars(reservas_do_cliente(current_user.id, inicio, fim, cursor, limite)).all()
+    tem_mais = len(reservas) > limite
+    reservas = reservas[:limite]
     
-    return jsonify({'reservas': [r.to_dict() for r in reservas]})
+    return jsonify_lista('reservas', [r.to_dict() for r in reservas],
+                         proximo=criar_cursor_reserva(reservas[-1]) if tem_mais else None)
+
+
+def criar_cursor_reserva(reserva):
+    """O cursor guarda a data de entrada e o id da última reserva da página"""
+    return f'{reserva.data_entrada.isoformat()}_{reserva.id}'
+
+
+def ler_cursor_reserva(texto):
+    """Desfaz o cursor criado por criar_cursor_reserva (ValueError se for inválido)"""
+    if not texto:
+        return None
+    data_texto, _, id_texto = texto.rpartition('_')
+    return datetime.fromisoformat(data_texto), int(id_texto)
 
 
 @app.route('/api/cliente/nova-reserva', methods=['POST'])
@@ -479,10 +825,15 @@ def api_cliente_nova_reserva():
         numero_quarto=data.get('numero_quarto'),
         numero_vaga=data.get('numero_vaga'),
         data_saida_prevista=datetime.fromisoformat(data.get('data_saida_prevista')) if data.get('data_saida_prevista') else None,
-        valor_base=data.get('valor_base'),
-        desconto_percentual=0
+        valor_base=data.get('valor_base')
     )
-    reserva.calcular_valor_final()
+    # Aplica automaticamente a melhor promoção disponível para o cliente
+    aplicar_melhor_promocao(reserva, current_user)
+    
+    # Não deixamos reservar um quarto/vaga que já está ocupado no período
+    erro = verificar_reserva(reserva)
+    if erro:
+        return jsonify({'error': erro}), 409
     
     db.session.add(reserva)
     db.session.commit()
@@ -502,14 +853,68 @@ def api_cliente_promocoes_disponiveis():
         return jsonify({'error': 'Acesso negado'}), 403
     
     agora = datetime.utcnow()
-    promocoes = Promocao.query.filter(
-        Promocao.ativa == True,
-        Promocao.data_inicio <= agora,
-        Promocao.data_fim >= agora,
-        Promocao.minimo_visitas <= current_user.total_visitas
-    ).all()
+    visitas = acumulador_visitas.total_visitas(current_user)
+    versao = motor_promocoes.versao_vigentes(agora, visitas)
+    return resposta_condicional(versao, lambda: jsonify({'promocoes': motor_promocoes.vigentes(agora, visitas)}))
+
+
+# ==================== API - AVISOS EM TEMPO REAL ====================
+
+@app.route('/api/eventos')
+@login_required
+def api_eventos():
+    """
+    Canal de avisos em tempo real (Server-Sent Events) para os painéis.
+    O navegador fica conectado e recebe um evento sempre que uma reserva, ponto,
+    promoção ou usuário é salvo, em vez de ficar perguntando de tempos em tempos.
+    """
+    assinatura = central.assinar(canais_do_usuario(current_user), app.config['SSE_FILA_MAXIMA'])
+    intervalo_ping = app.config['SSE_INTERVALO_PING']
+    
+    def gerar_eventos():
+        try:
+            # Se a conexão cair, o navegador tenta de novo depois de 5 segundos
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    yield assinatura.fila.get(timeout=intervalo_ping)
+                except queue.Empty:
+                    # Comentário vazio só para manter a conexão viva
+                    yield ': ping\n\n'
+        finally:
+            central.cancelar(assinatura)
+    
+    resposta = Response(gerar_eventos(), mimetype='text/event-stream')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
+
+
+# ==================== API - DISPONIBILIDADE ====================
+
+@app.route('/api/disponibilidade')
+@login_required
+def api_disponibilidade():
+    """
+    Quartos ou vagas livres em um período.
+    Ex: /api/disponibilidade?tipo=HOTEL&inicio=2026-01-10T14:00&fim=2026-01-12T12:00
+    """
+    tipo = request.args.get('tipo', 'HOTEL')
+    if tipo not in ('HOTEL', 'GARAGEM'):
+        return jsonify({'error': 'Tipo de serviço inválido'}), 400
     
-    return jsonify({'promocoes': [p.to_dict() for p in promocoes]})
+    try:
+        inicio = datetime.fromisoformat(request.args['inicio']) if request.args.get('inicio') else datetime.utcnow()
+        fim = datetime.fromisoformat(request.args['fim']) if request.args.get('fim') else None
+    except ValueError:
+        return jsonify({'error': 'Datas inválidas. Use o formato AAAA-MM-DDTHH:MM'}), 400
+    
+    return jsonify({
+        'tipo': tipo,
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat() if fim else None,
+        'livres': disponibilidade.livres(tipo, inicio, fim)
+    })
 
 
 # ==================== CHECKOUT & LOJA ====================
@@ -551,18 +956,16 @@ def processar_checkout():
             
             # Criamos uma conta automática para o convidado
             try:
-                import secrets
-                # Geramos uma senha aleatória que ele não sabe (depois ele pode resetar)
-                senha_temporaria = secrets.token_urlsafe(8)
-                
+                # Sem senha (SENHA_PENDENTE): ninguém entra nessa conta até o
+                # convidado definir uma senha
                 novo_guest = Usuario(
                     nome=dados.get('nome'),
                     email=email,
                     cpf=cpf,
                     telefone=dados.get('telefone'),
-                    tipo_usuario='CLIENTE'
+                    tipo_usuario='CLIENTE',
+                    senha_hash=SENHA_PENDENTE
                 )
-                novo_guest.set_senha(senha_temporaria)
                 db.session.add(novo_guest)
                 db.session.commit()
                 
@@ -579,22 +982,49 @@ def processar_checkout():
     try:
         tipo_servico = dados.get('tipo_servico')
         valor_base = dados.get('valor_base')
+        data_entrada = datetime.fromisoformat(dados['data_entrada']) if dados.get('data_entrada') else datetime.utcnow()
+        data_saida = datetime.fromisoformat(dados['data_saida']) if dados.get('data_saida') else None
+        
+        # No checkout o cliente escolhe só a categoria do quarto (PADRAO/LUXO);
+        # o número do quarto ou da vaga é o primeiro livre no período
+        preferencia = dados.get('numero_quarto')
+        livres = disponibilidade.livres(tipo_servico, data_entrada, data_saida)
+        if disponibilidade.inventario(tipo_servico) and not livres:
+            flash('Não há disponibilidade para o período escolhido.', 'error')
+            return redirect(url_for('checkout', tipo=tipo_servico))
         
         # Criamos o objeto da Reserva com os dados que vieram do site
         nova_reserva = Reserva(
             cliente_id=usuario_atual.id,
             tipo_servico=tipo_servico,
             valor_base=valor_base,
-            numero_quarto=dados.get('numero_quarto'),
             placa_veiculo=dados.get('placa_veiculo'),
+            data_entrada=data_entrada,
+            data_saida_prevista=data_saida,
+            observacoes=f'Preferência de quarto: {preferencia}' if preferencia else None,
             status='ATIVA'
         )
         
-        # Chama a função do modelo que calcula descontos se houver
-        nova_reserva.calcular_valor_final()
+        # Aplica a melhor promoção disponível e calcula o valor final
+        aplicar_melhor_promocao(nova_reserva, usuario_atual)
         
-        # Salva tudo no banco de dados
+        # Outro checkout ao mesmo tempo pode levar o primeiro livre: passamos para o próximo.
+        # Sempre na mesma ordem, para que dois checkouts não fiquem travando um ao outro
+        for numero_livre in livres or [None]:
+            nova_reserva.numero_quarto = numero_livre if tipo_servico == 'HOTEL' else None
+            nova_reserva.numero_vaga = numero_livre if tipo_servico == 'GARAGEM' else None
+            erro = verificar_reserva(nova_reserva)
+            if not erro:
+                break
+        if erro:
+            flash(erro, 'error')
+            return redirect(url_for('checkout', tipo=tipo_servico))
+        
+        # Salva tudo no banco de dados (o e-mail de confirmação sai depois, pela fila de tarefas)
         db.session.add(nova_reserva)
+        db.session.flush()
+        fila_tarefas.enfileirar('email_reserva', {'reserva_id': nova_reserva.id},
+                                chave=f'email-reserva:{nova_reserva.id}')
         db.session.commit()
         
         flash('Parabéns! Sua reserva foi realizada com sucesso.', 'success')
@@ -673,6 +1103,168 @@ def popular_banco():
     print('-----------------------------------------')
 
 
+@app.cli.command()
+@click.argument('arquivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'ndjson']), help='Padrão: pela extensão do arquivo')
+@click.option('--lote', default=1000, show_default=True, help='Quantas linhas gravar por INSERT')
+@click.option('--processos', type=int, help='Processos para gerar as hashes (padrão: número de CPUs)')
+@click.option('--senhas-geradas', type=click.Path(dir_okay=False),
+              help='Gera senha para as linhas sem senha e grava email,senha neste arquivo')
+def importar_clientes(arquivo, formato, lote, processos, senhas_geradas):
+    """Importa clientes de um CSV/NDJSON: flask importar-clientes clientes.csv"""
+    relatorio = None
+    if senhas_geradas:
+        # Só o dono lê o arquivo com as senhas
+        relatorio = open(os.open(senhas_geradas, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600),
+                         'w', encoding='utf-8', newline='')
+    try:
+        importador = ImportadorClientes(tamanho_lote=lote, processos=processos, senhas_geradas=relatorio)
+        segundos = importador.importar(ler_linhas(arquivo, formato))
+    finally:
+        if relatorio:
+            relatorio.close()
+    
+    # O INSERT em lote não passa pelos avisos de commit do ORM
+    estatisticas.invalidar()
+    
+    print('-----------------------------------------')
+    print(f'Importação concluída em {segundos:.1f}s')
+    print(f'Linhas lidas: {importador.lidas}')
+    print(f'Clientes inseridos: {importador.inseridas}')
+    if senhas_geradas:
+        print(f'Senhas geradas: {importador.senhas_geradas} (gravadas em {senhas_geradas})')
+    for motivo, quantidade in sorted(importador.ignoradas.items()):
+        print(f'Ignoradas ({motivo}): {quantidade}')
+    if importador.linhas_invalidas:
+        numeros = ', '.join(str(n) for n in importador.linhas_invalidas[:20])
+        print(f"Linhas inválidas: {numeros}{' ...' if len(importador.linhas_invalidas) > 20 else ''}")
+    print('-----------------------------------------')
+
+
+@app.cli.command()
+@click.argument('tabela', type=click.Choice(TABELAS_EXPORTACAO))
+@click.argument('arquivo', type=click.File('wb'))
+@click.option('--formato', type=click.Choice(FORMATOS_EXPORTACAO), default='csv', show_default=True)
+@click.option('--inicio', help='Data inicial (AAAA-MM-DD)')
+@click.option('--fim', help='Data final (AAAA-MM-DD)')
+@click.option('--tipo-servico', help='HOTEL ou GARAGEM (só reservas)')
+@click.option('--status', help='ATIVA, FINALIZADA ou CANCELADA (só reservas)')
+@click.option('--gzip', 'compactar', is_flag=True, help='Compacta o arquivo com gzip')
+def exportar(tabela, arquivo, formato, inicio, fim, tipo_servico, status, compactar):
+    """Exporta reservas ou pontos: flask exportar reservas reservas.csv --inicio 2024-01-01"""
+    try:
+        filtros = ler_filtros(inicio, fim, tipo_servico, status)
+    except ValueError as erro:
+        raise click.BadParameter(str(erro))
+    
+    pedacos = gerar_linhas(CONSULTAS_EXPORTACAO[tabela](**filtros), formato)
+    with usando_replica():
+        if compactar:
+            for dados in comprimir(pedacos):
+                arquivo.write(dados)
+        else:
+            for pedaco in pedacos:
+                arquivo.write(pedaco.encode('utf-8'))
+    print(f'Exportação de {tabela} concluída.')
+
+
+@app.cli.command()
+@click.argument('mes')
+@click.argument('arquivo', type=click.File('w', encoding='utf-8'))
+def exportar_folha(mes, arquivo):
+    """Exporta a folha de ponto do mês em CSV: flask exportar-folha 2024-03 folha.csv"""
+    try:
+        inicio, fim = ler_mes(mes)
+    except ValueError:
+        raise click.BadParameter('Use o formato AAAA-MM', param_hint='MES')
+    
+    with usando_replica():
+        relatorio = relatorio_mensal(inicio, fim)
+    arquivo.write(folha_para_csv(relatorio))
+    resumo = totais_folha(relatorio)
+    print(f"Folha de {mes}: {resumo['funcionarios']} funcionários, {resumo['total_horas']:.2f}h "
+          f"({resumo['horas_extras']:.2f}h extras), {resumo['saidas_faltando']} saídas faltando.")
+
+
+@app.cli.command()
+def reconstruir_agregados():
+    """Recalcula os agregados diários a partir das reservas: flask reconstruir-agregados"""
+    with db.engine.begin() as conexao:
+        reconstruir(conexao)
+    estatisticas.invalidar()
+    print(f'Agregados reconstruídos: {AgregadoDiario.query.count()} linhas (dia x serviço).')
+
+
+@app.cli.command()
+@click.option('--usuarios', default=1000, show_default=True)
+@click.option('--reservas', default=10000, show_default=True)
+@click.option('--pontos', default=5000, show_default=True)
+@click.option('--semente', default=42, show_default=True, help='Mesma semente = mesmos dados')
+def gerar_dados(usuarios, reservas, pontos, semente):
+    """Enche o banco com dados falsos para testes de desempenho: flask gerar-dados --usuarios 10000"""
+    ids = GeradorDados(semente).gerar(usuarios, reservas, pontos)
+    
+    # Os INSERTs em lote não passam pelos avisos de commit do ORM
+    with db.engine.begin() as conexao:
+        reconstruir(conexao)
+    estatisticas.limpar()
+    disponibilidade.invalidar()
+    
+    print('-----------------------------------------')
+    print(f"Dados gerados em {ids['segundos']:.1f}s")
+    print(f'Todos os usuários gerados usam a senha: {SENHA_PADRAO}')
+    print(f'Admin: adm0.s{semente}@exemplo.com')
+    print('-----------------------------------------')
+
+
+@app.cli.command()
+def construir_estaticos():
+    """Gera static/dist: arquivos com hash no nome, cópias .gz/.br e imagens WebP: flask construir-estaticos"""
+    estaticos.construir(app.static_folder)
+    print('Reinicie o app para usar os arquivos novos.')
+
+
+@app.cli.command('compilar-templates')
+def compilar_templates_cmd():
+    """Compila todos os templates e guarda o bytecode em TEMPLATES_CACHE_PASTA: flask compilar-templates"""
+    cache = app.jinja_env.bytecode_cache
+    print(f'{compilar_templates(app)} templates compilados em {cache.directory if cache else "memória (cache desligado)"}.')
+
+
+@app.cli.command('worker')
+@click.option('--threads', type=int, default=None, help='Trabalhadores neste processo (padrão: TAREFAS_TRABALHADORES)')
+@click.option('--uma-vez', is_flag=True, help='Executa as tarefas vencidas e sai (ex: pelo cron)')
+def worker(threads, uma_vez):
+    """Executa a fila de tarefas (e-mails de cadastro e de reserva): flask worker"""
+    fila_tarefas.trabalhar(app, threads, uma_vez=uma_vez)
+
+
+@app.cli.command()
+@click.option('--so-mostrar', is_flag=True, help='Só mostra o SQL, sem alterar o banco')
+def migrar_banco(so_mostrar):
+    """Cria as tabelas e índices que faltam em um banco existente: flask migrar-banco"""
+    migrar(db.engine, executar=not so_mostrar)
+    if not so_mostrar:
+        print('Migração concluída.')
+
+
+@app.cli.command()
+@click.option('--falhar', is_flag=True, help='Sai com erro se alguma consulta ler a tabela inteira (útil no CI)')
+def auditar_consultas(falhar):
+    """Roda EXPLAIN nas consultas das rotas mais usadas: flask auditar-consultas"""
+    varreduras = 0
+    for nome, plano, varredura in auditar(db.engine):
+        print(f"[{'VARREDURA COMPLETA' if varredura else 'OK'}] {nome}")
+        for linha in plano:
+            print(f'    {linha}')
+        varreduras += 1 if varredura else 0
+    
+    print('-----------------------------------------')
+    print(f'{varreduras} consulta(s) lendo a tabela inteira.')
+    if falhar and varreduras:
+        raise SystemExit(1)
+
+
 # Início da aplicação
 if __name__ == '__main__':
     # Rodamos o servidor na porta 8080 (padrão do sistema)
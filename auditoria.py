@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+from models import db
+from consultas import usuario_por_email, reservas_do_cliente, presenca_do_dia
+from estatisticas import consulta_reservas_ativas
+from disponibilidade import consulta_ocupacao
+from exportacao import consulta_reservas
+from ponto import consulta_do_dia
+from folha import ler_mes, consulta_folha
+from promocoes import consulta_ativas
+
+
+def consultas_quentes():
+    """
+    As consultas que as rotas mais usadas fazem, com valores de exemplo.
+    São montadas pelas mesmas funções que as rotas chamam, então o EXPLAIN é do SQL de verdade.
+    """
+    agora = datetime.utcnow()
+    hoje = agora.date()
+    return {
+        'login (usuário por email)': usuario_por_email('exemplo@email.com'),
+        'minhas-reservas (cliente por data)': reservas_do_cliente(1, inicio=agora - timedelta(days=30)),
+        'estatisticas (reservas ativas)': consulta_reservas_ativas(),
+        'disponibilidade (conflito de quarto)': consulta_ocupacao(('HOTEL', '101'), agora, agora + timedelta(days=2)),
+        'exportar reservas (período)': consulta_reservas(inicio=hoje - timedelta(days=30), fim=hoje),
+        'bater-ponto (ponto do dia)': consulta_do_dia(1, hoje),
+        'funcionarios-presenca (pontos do dia)': presenca_do_dia(hoje),
+        'folha (pontos do mês)': consulta_folha(*ler_mes()),
+        'promocoes (ativas)': consulta_ativas(),
+    }
+
+
+def _plano(conexao, sql):
+    """Roda o EXPLAIN do banco e devolve (linhas do plano, se há leitura da tabela inteira)."""
+    nome = conexao.dialect.name
+    if nome == 'sqlite':
+        linhas = [linha[-1] for linha in conexao.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+        # Só 'SEARCH' busca pelo índice; 'SCAN tabela' lê tudo, mesmo 'USING (COVERING) INDEX'
+        # (aí percorre o índice inteiro). SCAN de subconsulta (não é tabela) não conta
+        varredura = any(l.split(' ')[0] == 'SCAN' and l.split(' ')[1] in db.metadata.tables for l in linhas)
+    elif nome == 'mysql':
+        resultado = conexao.exec_driver_sql(f'EXPLAIN {sql}')
+        colunas = list(resultado.keys())
+        linhas = [dict(zip(colunas, linha)) for linha in resultado]
+        varredura = any(linha.get('type') == 'ALL' for linha in linhas)
+        linhas = [
+            f"{l.get('table')}: type={l.get('type')} key={l.get('key')} rows={l.get('rows')} {l.get('Extra') or ''}".strip()
+            for l in linhas
+        ]
+    else:
+        linhas = [linha[0] for linha in conexao.exec_driver_sql(f'EXPLAIN {sql}')]
+        varredura = any('Seq Scan' in l for l in linhas)
+    return linhas, varredura
+
+
+def auditar(engine):
+    """Lista (nome, plano, varredura_completa) de cada consulta quente."""
+    resultado = []
+    with engine.connect() as conexao:
+        for nome, consulta in consultas_quentes().items():
+            sql = str(consulta.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+            plano, varredura = _plano(conexao, sql)
+            resultado.append((nome, plano, varredura))
+    return resultado
@@ -0,0 +1,249 @@
+"""
+Mede o desempenho das rotas /api/* e dos métodos dos modelos com bancos de tamanhos diferentes.
+
+    python benchmark.py --escalas 1000,10000 --repeticoes 5 --saida resultados.json
+
+Cada escala é 'usuarios' (reservas = 10x e pontos = 5x) ou 'usuarios:reservas:pontos'.
+Sem DATABASE_URL, usa o arquivo SQLite benchmark.db na pasta atual. O banco é APAGADO e recriado
+em cada escala, por isso com DATABASE_URL (ex: MySQL) é preciso passar --apagar-banco.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+BANCO_EXTERNO = bool(os.environ.get('DATABASE_URL'))
+# Caminho absoluto: com um caminho relativo o Flask-SQLAlchemy poria o arquivo em instance/
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.abspath('benchmark.db')}")
+
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+from app import app
+from models import db, Usuario, Reserva, RegistroPonto
+from agregados import reconstruir
+from dados_sinteticos import GeradorDados
+from estatisticas import estatisticas
+from promocoes import motor_promocoes
+from disponibilidade import disponibilidade
+from identidade import cache_identidade
+
+# Rotas que precisam de valores na URL ou de parâmetros para serem medidas
+VALORES_ROTA = {
+    '/api/admin/exportar/<tabela>': [{'tabela': 'reservas'}, {'tabela': 'pontos'}],
+}
+PARAMETROS_ROTA = {
+    '/api/admin/receita': 'agrupar=mes',
+    '/api/disponibilidade': 'tipo=HOTEL',
+}
+# Rotas que não terminam sozinhas (ficam abertas enviando avisos)
+IGNORAR = {'/api/eventos'}
+
+
+def _papel(caminho):
+    for prefixo, papel in (('/api/admin/', 'admin'), ('/api/funcionario/', 'funcionario')):
+        if caminho.startswith(prefixo):
+            return papel
+    return 'cliente'
+
+
+def _corpo_post(caminho, cpf_cliente):
+    if caminho == '/api/funcionario/criar-reserva':
+        return {'cpf_cliente': cpf_cliente, 'tipo_servico': 'GARAGEM', 'valor_base': 35}
+    if caminho == '/api/funcionario/criar-reservas-lote':
+        return {'reservas': [{'cpf_cliente': cpf_cliente, 'tipo_servico': 'GARAGEM', 'valor_base': 35}] * 10, 'atomico': False}
+    if caminho == '/api/cliente/nova-reserva':
+        return {'tipo_servico': 'GARAGEM', 'valor_base': 35}
+    return {}
+
+
+def rotas_api():
+    """(método, caminho, url) de todas as rotas /api/* do app."""
+    rotas = []
+    for regra in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if not regra.rule.startswith('/api/') or regra.rule in IGNORAR:
+            continue
+        for metodo in sorted(regra.methods & {'GET', 'POST'}):
+            for valores in VALORES_ROTA.get(regra.rule, [{}]):
+                url = regra.rule
+                for nome, valor in valores.items():
+                    url = url.replace(f'<{nome}>', valor)
+                if regra.rule in PARAMETROS_ROTA:
+                    url += '?' + PARAMETROS_ROTA[regra.rule]
+                rotas.append((metodo, regra.rule, url))
+    return rotas
+
+
+class ContadorConsultas:
+    """Conta os comandos SQL enviados ao banco."""
+
+    def __init__(self, engine):
+        self.total = 0
+        event.listen(engine, 'before_cursor_execute', self._contar)
+
+    def _contar(self, *args):
+        self.total += 1
+
+
+def _resumo(tempos):
+    tempos = sorted(tempos)
+    return {
+        'mediana_ms': round(statistics.median(tempos) * 1000, 3),
+        'p95_ms': round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))] * 1000, 3),
+        'min_ms': round(tempos[0] * 1000, 3)
+    }
+
+
+def medir_rotas(ids, repeticoes=5, contador=None):
+    """Chama cada rota /api/* como o papel certo e mede tempo, status e quantidade de consultas."""
+    contador = contador or ContadorConsultas(db.engine)
+    usuarios = {'admin': ids['admin'], 'funcionario': ids['funcionarios'][0], 'cliente': ids['clientes'][0]}
+    cpf_cliente = db.session.get(Usuario, ids['clientes'][0]).cpf
+    clientes_http = {}
+    for papel, id_usuario in usuarios.items():
+        cliente_http = app.test_client()
+        with cliente_http.session_transaction() as sessao:
+            sessao['_user_id'] = str(id_usuario)
+            sessao['_fresh'] = True
+        clientes_http[papel] = cliente_http
+
+    resultados = []
+    for metodo, regra, url in rotas_api():
+        cliente_http = clientes_http[_papel(regra)]
+        tempos, consultas, status, tamanho = [], [], None, 0
+        for _ in range(repeticoes):
+            # As requisições reaproveitam o contexto do app aberto aqui, e o Flask-Login
+            # guarda o usuário em g: tiramos para cada requisição carregar o seu
+            g.pop('_login_user', None)
+            antes = contador.total
+            inicio = time.perf_counter()
+            if metodo == 'GET':
+                resposta = cliente_http.get(url)
+            else:
+                resposta = cliente_http.post(url, json=_corpo_post(regra, cpf_cliente))
+            tamanho = len(resposta.get_data())  # lê a resposta inteira (exportações vêm aos poucos)
+            tempos.append(time.perf_counter() - inicio)
+            consultas.append(contador.total - antes)
+            status = resposta.status_code
+        resultados.append(dict(
+            _resumo(tempos), metodo=metodo, rota=url, papel=_papel(regra), status=status,
+            consultas=max(consultas), bytes=tamanho
+        ))
+    return resultados
+
+
+def medir_modelos(repeticoes=5, amostra=1000):
+    """Tempo médio por chamada (microssegundos) dos métodos dos modelos."""
+    reservas = Reserva.query.options(
+        joinedload(Reserva.cliente), joinedload(Reserva.funcionario)
+    ).limit(amostra).all()
+    usuarios = Usuario.query.limit(amostra).all()
+    pontos = RegistroPonto.query.options(joinedload(RegistroPonto.funcionario)).limit(amostra).all()
+
+    metodos = {
+        'Reserva.calcular_valor_final': (reservas, Reserva.calcular_valor_final),
+        'Reserva.to_dict': (reservas, Reserva.to_dict),
+        'Usuario.to_dict': (usuarios, Usuario.to_dict),
+        'RegistroPonto.calcular_horas': (pontos, RegistroPonto.calcular_horas),
+        'RegistroPonto.to_dict': (pontos, RegistroPonto.to_dict),
+    }
+    resultados = []
+    for nome, (objetos, metodo) in metodos.items():
+        if not objetos:
+            continue
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            for objeto in objetos:
+                metodo(objeto)
+            tempos.append((time.perf_counter() - inicio) / len(objetos))
+        resultados.append({
+            'metodo': nome,
+            'objetos': len(objetos),
+            'mediana_us': round(statistics.median(tempos) * 1e6, 3),
+            'min_us': round(min(tempos) * 1e6, 3)
+        })
+    # Nada do que foi calculado aqui deve ir para o banco
+    db.session.rollback()
+    return resultados
+
+
+def ler_escala(texto):
+    partes = [int(p) for p in texto.split(':')]
+    if len(partes) == 1:
+        return {'usuarios': partes[0], 'reservas': partes[0] * 10, 'pontos': partes[0] * 5}
+    usuarios, reservas, pontos = partes
+    return {'usuarios': usuarios, 'reservas': reservas, 'pontos': pontos}
+
+
+def preparar_banco(escala, semente=42, mostrar=print):
+    """Apaga o banco, gera os dados da escala e zera os caches do processo."""
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    ids = GeradorDados(semente, mostrar=mostrar).gerar(**escala)
+    with db.engine.begin() as conexao:
+        reconstruir(conexao)
+    estatisticas.limpar()
+    motor_promocoes.invalidar()
+    disponibilidade.invalidar()
+    cache_identidade.limpar()
+    return ids
+
+
+def _versao_codigo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def executar(escalas, repeticoes=5, mostrar=print):
+    resultado = {
+        'gerado_em': datetime.utcnow().isoformat(),
+        'commit': _versao_codigo(),
+        'python': platform.python_version(),
+        'banco': db.engine.dialect.name,
+        'repeticoes': repeticoes,
+        'escalas': []
+    }
+    contador = ContadorConsultas(db.engine)
+    for escala in escalas:
+        mostrar(f"== Escala: {escala['usuarios']} usuários, {escala['reservas']} reservas, {escala['pontos']} pontos")
+        ids = preparar_banco(escala, mostrar=mostrar)
+        rotas = medir_rotas(ids, repeticoes, contador)
+        for r in rotas:
+            mostrar(f"  {r['metodo']:4} {r['rota']:45} {r['status']}  {r['mediana_ms']:9.2f} ms  {r['consultas']:3} consultas")
+        resultado['escalas'].append(dict(
+            escala, segundos_gerando=round(ids['segundos'], 2), rotas=rotas, modelos=medir_modelos(repeticoes)
+        ))
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das rotas /api/* com dados sintéticos')
+    parser.add_argument('--escalas', default='1000', help='Ex: 1000,10000 ou 1000:20000:5000')
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--saida', default='benchmark-resultados.json')
+    parser.add_argument('--apagar-banco', action='store_true', help='Confirma que o banco de DATABASE_URL pode ser apagado')
+    argumentos = parser.parse_args()
+
+    if BANCO_EXTERNO and not argumentos.apagar_banco:
+        sys.exit('DATABASE_URL está definido: o benchmark APAGA esse banco. Use --apagar-banco para confirmar.')
+
+    with app.app_context():
+        db.engine.echo = False  # o log de SQL no terminal atrapalha as medições
+        resultado = executar([ler_escala(e) for e in argumentos.escalas.split(',')], argumentos.repeticoes)
+
+    with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    print(f'Resultados gravados em {argumentos.saida}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+from flask import make_response, request
+
+# Sempre confere com o servidor antes de usar a cópia guardada (a conferência custa só um 304)
+SEMPRE_CONFERIR = 'no-cache'
+
+
+def resposta_condicional(versao, gerar, publica=False):
+    """
+    Responde com cache HTTP condicional (ETag).
+    Se o navegador (ou um proxy) já tem a versão atual, devolve 304 sem chamar 'gerar',
+    ou seja, sem consultar o banco nem montar o JSON/HTML de novo.
+
+    - versao: texto que muda sempre que o conteúdo muda (vira o ETag)
+    - gerar: função que monta a resposta completa quando for preciso
+    - publica: a mesma resposta serve para todos (proxies podem guardar);
+      senão só o navegador do usuário guarda
+
+    Não mandamos Last-Modified: a versão vem do conteúdo e é a mesma em todos os processos,
+    mas uma data de alteração confiável não existe (ex: promoção apagada).
+    """
+    # ETag fraco: o conteúdo é o mesmo, mas o corpo pode mudar de bytes (ex: compactação)
+    etag = f'W/"{versao}"'
+    nao_mudou = bool(request.if_none_match) and request.if_none_match.contains_weak(versao)
+
+    resposta = make_response('', 304) if nao_mudou else make_response(gerar())
+    if resposta.status_code not in (200, 304):
+        return resposta
+    resposta.headers['ETag'] = etag
+    resposta.headers['Cache-Control'] = f"{'public' if publica else 'private'}, {SEMPRE_CONFERIR}"
+    resposta.vary.add('Cookie')
+    return resposta
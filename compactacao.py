@@ -0,0 +1,94 @@
+import zlib
+from flask import current_app, jsonify, request
+
+# Tipos de resposta que valem a pena compactar
+TIPOS_COMPACTAVEIS = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain')
+# wbits do zlib para cada codificação do HTTP ('deflate' é o formato zlib)
+CODIFICACOES = (('gzip', 31), ('deflate', 15))
+
+
+class CompactacaoRespostas:
+    """
+    Compacta as respostas de /api/* com gzip ou deflate, conforme o Accept-Encoding do navegador.
+    Respostas menores que COMPRESSAO_MINIMO bytes vão sem compactar (não compensa).
+    Respostas enviadas aos poucos (NDJSON, CSV) são compactadas pedaço a pedaço, sem esperar o fim.
+    Respostas que já vêm compactadas (ex: exportações com gzip) e os avisos em tempo real
+    (text/event-stream, que precisam chegar na hora) ficam como estão.
+    """
+
+    def init_app(self, app):
+        app.after_request(self._compactar)
+
+    def _escolher(self):
+        """(nome, wbits) da codificação preferida pelo navegador, ou None."""
+        aceitas = request.accept_encodings
+        opcoes = [(aceitas[nome], -posicao, nome, wbits) for posicao, (nome, wbits) in enumerate(CODIFICACOES) if aceitas[nome]]
+        if not opcoes:
+            return None
+        _, _, nome, wbits = max(opcoes)
+        return nome, wbits
+
+    def _compactar(self, resposta):
+        if (not request.path.startswith('/api/') or resposta.status_code < 200 or resposta.status_code in (204, 304)
+                or 'Content-Encoding' in resposta.headers or resposta.mimetype not in TIPOS_COMPACTAVEIS):
+            return resposta
+        # A resposta muda conforme o Accept-Encoding, mesmo quando não compactamos
+        resposta.vary.add('Accept-Encoding')
+        escolhida = self._escolher()
+        if escolhida is None:
+            return resposta
+        nome, wbits = escolhida
+        nivel = current_app.config.get('COMPRESSAO_NIVEL', 6)
+
+        if resposta.is_streamed:
+            resposta.response = self._compactar_aos_poucos(resposta.response, nivel, wbits)
+            resposta.headers.pop('Content-Length', None)
+        else:
+            dados = resposta.get_data()
+            if len(dados) < current_app.config.get('COMPRESSAO_MINIMO', 1024):
+                return resposta
+            compactador = zlib.compressobj(nivel, zlib.DEFLATED, wbits)
+            resposta.set_data(compactador.compress(dados) + compactador.flush())
+
+        resposta.headers['Content-Encoding'] = nome
+        # O corpo mudou de bytes: um ETag forte deixaria de valer
+        etag, fraco = resposta.get_etag()
+        if etag and not fraco:
+            resposta.set_etag(etag, weak=True)
+        return resposta
+
+    def _compactar_aos_poucos(self, pedacos, nivel, wbits):
+        compactador = zlib.compressobj(nivel, zlib.DEFLATED, wbits)
+        try:
+            for pedaco in pedacos:
+                if isinstance(pedaco, str):
+                    pedaco = pedaco.encode('utf-8')
+                dados = compactador.compress(pedaco)
+                if dados:
+                    yield dados
+            yield compactador.flush()
+        finally:
+            # Fecha o gerador original (ex: libera o cursor do banco se o navegador desistir)
+            if hasattr(pedacos, 'close'):
+                pedacos.close()
+
+
+# Instância única usada pela aplicação
+compactacao = CompactacaoRespostas()
+
+
+def colunar(itens):
+    """
+    Lista de dicionários em formato de colunas: os nomes dos campos uma vez só
+    e depois uma lista de valores por item. Ex:
+    [{'id': 1, 'nome': 'Ana'}, {'id': 2, 'nome': 'Bia'}] -> {'colunas': ['id', 'nome'], 'linhas': [[1, 'Ana'], [2, 'Bia']]}
+    """
+    colunas = list(dict.fromkeys(campo for item in itens for campo in item))
+    return {'colunas': colunas, 'linhas': [[item.get(campo) for campo in colunas] for item in itens]}
+
+
+def jsonify_lista(chave, itens, **extras):
+    """jsonify({chave: itens, ...}); com ?formato=colunar a lista vai em colunas (veja colunar)."""
+    if request.args.get('formato') == 'colunar':
+        itens = colunar(itens)
+    return jsonify({chave: itens, **extras})
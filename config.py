@@ -3,12 +3,128 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def opcoes_pool(url, prefixo):
+    """
+    Opções do pool de conexões de um banco, ajustáveis por variáveis de ambiente
+    (ex: DB_POOL_TAMANHO, REPLICA_POOL_RECICLAR). O SQLite não usa tamanho de pool.
+    """
+    opcoes = {
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.environ.get(f'{prefixo}_POOL_RECICLAR') or 1800)
+    }
+    if not url.startswith('sqlite'):
+        opcoes['pool_size'] = int(os.environ.get(f'{prefixo}_POOL_TAMANHO') or 10)
+        opcoes['max_overflow'] = int(os.environ.get(f'{prefixo}_POOL_EXTRA') or 5)
+    return opcoes
+
+
 class Config:
     """Configurações da aplicação"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'chave-secreta-desenvolvimento-2024'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'mysql+pymysql://root:@localhost/sistema_cadastro'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ECHO = True  # Log de queries SQL
+    # Log de todas as queries SQL só em desenvolvimento (em produção custa caro e não diz de qual
+    # requisição veio cada consulta: para isso use o Server-Timing, /metrics e o log de consultas lentas)
+    SQLALCHEMY_ECHO = (os.environ.get('SQLALCHEMY_ECHO') or '').lower() in ('1', 'true') or os.environ.get('FLASK_ENV') == 'development'
+    # Conexões: testadas antes do uso (pre-ping) e renovadas antes do wait_timeout do MySQL
+    SQLALCHEMY_ENGINE_OPTIONS = opcoes_pool(SQLALCHEMY_DATABASE_URI, 'DB')
+    
+    # Réplica só de leitura para relatórios e painéis do Admin (rotas com @leitura_na_replica).
+    # Se ela cair ou ficar mais de REPLICA_ATRASO_MAXIMO segundos atrás, as leituras voltam
+    # para o primário; o estado da réplica é verificado a cada REPLICA_VERIFICAR segundos.
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    SQLALCHEMY_BINDS = {
+        'replica': dict(url=REPLICA_DATABASE_URL, **opcoes_pool(REPLICA_DATABASE_URL, 'REPLICA'))
+    } if REPLICA_DATABASE_URL else {}
+    REPLICA_ATRASO_MAXIMO = int(os.environ.get('REPLICA_ATRASO_MAXIMO') or 30)
+    REPLICA_VERIFICAR = 5
+    
+    # Cache das estatísticas do painel do Admin (em segundos)
+    ESTATISTICAS_TTL = 15
+    # As promoções ficam na memória e são relidas do banco a cada X segundos
+    # (e sempre que uma promoção é salva neste processo)
+    PROMOCOES_RECARREGAR = 60
+    
+    # Inventário de quartos e vagas (pode ser trocado por variáveis de ambiente separadas por vírgula)
+    QUARTOS_HOTEL = (os.environ.get('QUARTOS_HOTEL') or ','.join(str(n) for n in range(101, 121))).split(',')
+    VAGAS_GARAGEM = (os.environ.get('VAGAS_GARAGEM') or ','.join(f'A-{n:02d}' for n in range(1, 41))).split(',')
+    # O índice de ocupação é relido do banco a cada X segundos
+    DISPONIBILIDADE_RECARREGAR = 60
+    
+    # Avisos em tempo real (/api/eventos): tamanho da fila de cada navegador
+    # e intervalo (segundos) do ping que mantém a conexão aberta
+    SSE_FILA_MAXIMA = 100
+    SSE_INTERVALO_PING = 15
+    
+    # Hash de senhas: método/custo do werkzeug (ex: 'scrypt', 'scrypt:65536:8:1', 'pbkdf2:sha256:600000'),
+    # quantos processos auxiliares calculam as hashes e quantos pedidos podem esperar na fila
+    # antes de respondermos 503. Senhas com método antigo são refeitas no próximo login.
+    SENHAS_METODO = os.environ.get('SENHAS_METODO') or 'scrypt'
+    SENHAS_PROCESSOS = int(os.environ.get('SENHAS_PROCESSOS') or 2)
+    SENHAS_FILA_MAXIMA = 32
+    SENHAS_TIMEOUT = 10
+    
+    # Visitas (logins) ficam na memória e são gravadas em lote a cada X segundos
+    # ou quando muitos usuários estão esperando. Com um caminho em VISITAS_DIARIO,
+    # cada visita também é anotada em arquivo para não se perder se o processo cair
+    # (cada processo usa arquivos <VISITAS_DIARIO>.<pid>.*, veja visitas.py).
+    VISITAS_INTERVALO = 10
+    VISITAS_LOTE_MAXIMO = 500
+    VISITAS_DIARIO = os.environ.get('VISITAS_DIARIO')
+    
+    # Cache dos usuários logados (Flask-Login): validade em segundos e quantidade máxima
+    IDENTIDADE_CACHE_TTL = 30
+    IDENTIDADE_CACHE_MAXIMO = 10000
+    
+    # Quantas reservas cabem em um pedido de /api/funcionario/criar-reservas-lote
+    RESERVAS_LOTE_MAXIMO = 500
+    
+    # Segundos mínimos entre a entrada e a saída: uma segunda batida antes disso
+    # (dedo duplo no relógio de ponto) não fecha o ponto do dia
+    PONTO_INTERVALO_MINIMO = 60
+    
+    # Fila de tarefas (flask worker): threads por processo, espera (s) quando a fila está vazia,
+    # quantas tarefas cada thread pega de uma vez, tentativas até desistir, espera antes de tentar
+    # de novo (dobra a cada falha, até o máximo) e depois de quanto tempo uma tarefa presa
+    # (trabalhador que caiu) volta para a fila
+    TAREFAS_TRABALHADORES = int(os.environ.get('TAREFAS_TRABALHADORES') or 2)
+    TAREFAS_INTERVALO = 1.0
+    TAREFAS_LOTE = 10
+    TAREFAS_TENTATIVAS = 5
+    TAREFAS_ESPERA_BASE = 10
+    TAREFAS_ESPERA_MAXIMA = 3600
+    TAREFAS_TEMPO_LIMITE = 300
+    
+    # E-mails enviados pelas tarefas (sem EMAIL_SERVIDOR eles só vão para o log)
+    EMAIL_SERVIDOR = os.environ.get('EMAIL_SERVIDOR')
+    EMAIL_PORTA = int(os.environ.get('EMAIL_PORTA') or 587)
+    EMAIL_USUARIO = os.environ.get('EMAIL_USUARIO')
+    EMAIL_SENHA = os.environ.get('EMAIL_SENHA')
+    EMAIL_REMETENTE = os.environ.get('EMAIL_REMETENTE') or 'nao-responda@sistema.com'
+    
+    # Jornada de trabalho por dia (horas): o que passar disso entra como hora extra na folha
+    JORNADA_DIARIA_HORAS = 8
+    
+    # Templates: o bytecode compilado do Jinja fica nessa pasta (sem valor: instance/templates-cache;
+    # vazio desliga); flask compilar-templates compila todos de uma vez.
+    # Trechos de página já renderizados: quantidade máxima.
+    TEMPLATES_CACHE_PASTA = os.environ.get('TEMPLATES_CACHE_PASTA')
+    FRAGMENTOS_MAXIMO = 256
+    # Usa os arquivos de static/dist (gerados por flask construir-estaticos), se existirem
+    ESTATICOS_COM_HASH = (os.environ.get('ESTATICOS_COM_HASH') or '1').lower() in ('1', 'true')
+    
+    # Respostas de /api/* menores que isso (bytes) não são compactadas; nível do gzip/deflate (1 a 9)
+    COMPRESSAO_MINIMO = 1024
+    COMPRESSAO_NIVEL = 6
+    
+    # Consultas que levarem mais que isso (milissegundos) vão para o log com a rota que as fez
+    # (0 ou vazio desliga)
+    SQL_LENTA_MS = int(os.environ.get('SQL_LENTA_MS', 200) or 0) or None
+    # /metrics só responde a um Admin logado ou ao cabeçalho 'Authorization: Bearer <METRICAS_TOKEN>';
+    # METRICAS_PUBLICAS=1 libera sem login (ex: só acessível pela rede interna do Prometheus)
+    METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+    METRICAS_PUBLICAS = (os.environ.get('METRICAS_PUBLICAS') or '').lower() in ('1', 'true')
     
     # Configurações de sessão
     SESSION_COOKIE_SECURE = False  # True em produção com HTTPS
@@ -0,0 +1,54 @@
+from datetime import timedelta
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import configure_mappers, joinedload
+from models import Usuario, Reserva, RegistroPonto
+
+# Consultas das rotas do app.py, montadas aqui para que o `flask auditar-consultas`
+# rode o EXPLAIN exatamente no SQL que as rotas enviam
+
+
+def usuario_por_email(email):
+    """Login: o usuário dono do email."""
+    return select(Usuario).where(Usuario.email == email).limit(1)
+
+
+def reservas_do_cliente(cliente_id, inicio=None, fim=None, cursor=None, limite=20):
+    """
+    Minhas reservas: das mais novas para as mais antigas, a partir do cursor (data_entrada, id).
+    Traz uma reserva a mais que o limite, para saber se há próxima página.
+    """
+    # Reserva.cliente é um backref: só existe depois que os mapeamentos são configurados
+    # (na primeira consulta do ORM; o auditar-consultas pode chegar aqui antes dela)
+    configure_mappers()
+    # joinedload traz o nome do cliente e do funcionário no mesmo SELECT,
+    # em vez de uma consulta extra para cada reserva dentro do to_dict()
+    consulta = select(Reserva).options(
+        joinedload(Reserva.cliente),
+        joinedload(Reserva.funcionario)
+    ).where(Reserva.cliente_id == cliente_id)
+
+    if inicio:
+        consulta = consulta.where(Reserva.data_entrada >= inicio)
+    if fim:
+        # O dia final entra inteiro no filtro
+        consulta = consulta.where(Reserva.data_entrada < fim + timedelta(days=1))
+    if cursor:
+        data_cursor, id_cursor = cursor
+        consulta = consulta.where(or_(
+            Reserva.data_entrada < data_cursor,
+            and_(Reserva.data_entrada == data_cursor, Reserva.id < id_cursor)
+        ))
+    return consulta.order_by(Reserva.data_entrada.desc(), Reserva.id.desc()).limit(limite + 1)
+
+
+def presenca_do_dia(dia):
+    """Presença: todos os funcionários ativos com o ponto do dia (se existir), numa consulta só."""
+    return select(
+        Usuario.id, Usuario.nome, RegistroPonto.hora_entrada, RegistroPonto.hora_saida
+    ).outerjoin(
+        RegistroPonto,
+        and_(RegistroPonto.funcionario_id == Usuario.id, RegistroPonto.data == dia)
+    ).where(
+        Usuario.tipo_usuario == 'FUNCIONARIO',
+        Usuario.ativo == True
+    ).order_by(Usuario.id, RegistroPonto.id)
@@ -0,0 +1,184 @@
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import current_app
+from werkzeug.security import generate_password_hash
+from models import db, Usuario, Reserva, RegistroPonto
+
+SENHA_PADRAO = 'senha123'
+TAMANHO_LOTE = 5000
+
+# Pesos usados para sortear os dados (aproximam o que acontece no dia a dia)
+PESO_HOTEL = 0.6
+DESCONTOS = (0, 5, 10, 15, 20)
+PESOS_DESCONTOS = (60, 10, 15, 10, 5)
+FUNCIONARIOS_POR_USUARIO = 0.05
+
+
+def _gravar(tabela, linhas):
+    """INSERT em lotes (executemany), sem passar pelo ORM."""
+    for inicio in range(0, len(linhas), TAMANHO_LOTE):
+        db.session.execute(tabela.insert(), linhas[inicio:inicio + TAMANHO_LOTE])
+        db.session.commit()
+
+
+class GeradorDados:
+    """
+    Preenche o banco com dados falsos para testes de desempenho.
+    Tudo é sorteado a partir da 'semente', então duas execuções com os mesmos
+    números geram exatamente os mesmos dados. Use sementes diferentes para
+    gerar mais dados no mesmo banco (os emails e CPFs levam a semente).
+
+    - Clientes: poucos vêm muito, a maioria vem pouco (distribuição de Pareto).
+    - Reservas: 60% hotel; valores com variação normal; a maioria finalizada,
+      as dos últimos dias ainda ativas e uma parte cancelada.
+    - Pontos: dias seguidos para cada funcionário (5 em 7 dias), entrada por volta
+      das 8h, jornada por volta de 8h30 e algumas saídas esquecidas.
+    """
+
+    def __init__(self, semente=42, mostrar=print):
+        self.semente = semente
+        self.sorteio = random.Random(semente)
+        self.mostrar = mostrar
+        self.agora = datetime.utcnow().replace(microsecond=0)
+
+    def gerar(self, usuarios=1000, reservas=10000, pontos=5000):
+        inicio = time.perf_counter()
+        ids = self._gerar_usuarios(usuarios)
+        self._gerar_reservas(reservas, ids['clientes'], ids['funcionarios'])
+        self._gerar_pontos(pontos, ids['funcionarios'])
+        ids['segundos'] = time.perf_counter() - inicio
+        return ids
+
+    # ---------- usuários ----------
+
+    def _gerar_usuarios(self, quantidade):
+        sorteio = self.sorteio
+        quantidade = max(quantidade, 3)
+        funcionarios = max(1, int(quantidade * FUNCIONARIOS_POR_USUARIO))
+        senha_hash = generate_password_hash(SENHA_PADRAO, current_app.config['SENHAS_METODO'])
+
+        linhas = []
+        for i in range(quantidade):
+            tipo = 'ADM' if i == 0 else 'FUNCIONARIO' if i <= funcionarios else 'CLIENTE'
+            cadastro = self.agora - timedelta(days=sorteio.randint(0, 3 * 365))
+            visitas = min(int(sorteio.paretovariate(1.2)), 500)
+            linhas.append({
+                'nome': f'{tipo.title()} Sintético {i}',
+                'email': f'{tipo.lower()}{i}.s{self.semente}@exemplo.com',
+                'cpf': f'{self.semente % 1000:03d}{i:011d}',
+                'telefone': f'(11) 9{i % 10000:04d}-{sorteio.randint(0, 9999):04d}',
+                'senha_hash': senha_hash,
+                'tipo_usuario': tipo,
+                'ativo': sorteio.random() > 0.02,
+                'data_cadastro': cadastro,
+                'ultima_visita': cadastro + (self.agora - cadastro) * sorteio.random(),
+                'total_visitas': visitas
+            })
+        # O administrador fica sempre ativo para poder entrar no sistema
+        linhas[0]['ativo'] = True
+
+        _gravar(Usuario.__table__, linhas)
+        self.mostrar(f'{quantidade} usuários gravados')
+
+        ids = {'admin': None, 'funcionarios': [], 'clientes': []}
+        gerados = db.session.query(Usuario.id, Usuario.tipo_usuario).filter(
+            Usuario.email.like(f'%.s{self.semente}@exemplo.com')
+        ).order_by(Usuario.id)
+        for id_usuario, tipo in gerados:
+            if tipo == 'ADM':
+                ids['admin'] = id_usuario
+            else:
+                ids['funcionarios' if tipo == 'FUNCIONARIO' else 'clientes'].append(id_usuario)
+        return ids
+
+    # ---------- reservas ----------
+
+    def _gerar_reservas(self, quantidade, clientes, funcionarios):
+        sorteio = self.sorteio
+        quartos = current_app.config.get('QUARTOS_HOTEL') or ['101']
+        vagas = current_app.config.get('VAGAS_GARAGEM') or ['A-01']
+        # Clientes fiéis: peso de Pareto para cada cliente
+        pesos = [sorteio.paretovariate(1.5) for _ in clientes]
+        escolhidos = sorteio.choices(clientes, weights=pesos, k=quantidade)
+        # Períodos das reservas ATIVAS de cada quarto/vaga: duas ativas nunca ocupam o mesmo
+        # ao mesmo tempo (como no sistema de verdade, veja disponibilidade.py)
+        ocupados = {}
+
+        linhas = []
+        for cliente_id in escolhidos:
+            hotel = sorteio.random() < PESO_HOTEL
+            dias_atras = int(sorteio.expovariate(1 / 120))
+            entrada = self.agora - timedelta(days=dias_atras, hours=sorteio.randint(0, 23))
+            duracao = timedelta(days=sorteio.randint(1, 5)) if hotel else timedelta(hours=sorteio.randint(1, 12))
+            sorteado = sorteio.random()
+            status = 'ATIVA' if dias_atras < 3 else 'CANCELADA' if sorteado < 0.05 else 'FINALIZADA'
+            opcoes = quartos if hotel else vagas
+            numero = sorteio.choice(opcoes)
+            if status == 'ATIVA':
+                livres = [
+                    n for n in opcoes
+                    if all(fim <= entrada or entrada + duracao <= inicio for inicio, fim in ocupados.get((hotel, n), ()))
+                ]
+                if livres:
+                    numero = sorteio.choice(livres)
+                    ocupados.setdefault((hotel, numero), []).append((entrada, entrada + duracao))
+                else:
+                    # Tudo ocupado nesse período: o cliente não conseguiu o quarto
+                    status = 'CANCELADA'
+
+            base = Decimal(str(max(10, round(sorteio.gauss(250 if hotel else 35, 60 if hotel else 10), 2))))
+            desconto = Decimal(sorteio.choices(DESCONTOS, weights=PESOS_DESCONTOS)[0])
+            final = (base - (base * desconto / 100).quantize(Decimal('0.01'))).quantize(Decimal('0.01'))
+            linhas.append({
+                'cliente_id': cliente_id,
+                'funcionario_id': sorteio.choice(funcionarios) if sorteio.random() < 0.3 else None,
+                'tipo_servico': 'HOTEL' if hotel else 'GARAGEM',
+                'numero_quarto': numero if hotel else None,
+                'numero_vaga': None if hotel else numero,
+                'placa_veiculo': None if hotel else f'SNT{sorteio.randint(0, 9)}A{sorteio.randint(10, 99)}',
+                'data_entrada': entrada,
+                'data_saida_prevista': entrada + duracao,
+                'data_saida_real': entrada + duracao if status == 'FINALIZADA' else None,
+                'valor_base': base,
+                'desconto_percentual': desconto,
+                'valor_final': final,
+                'status': status
+            })
+
+        _gravar(Reserva.__table__, linhas)
+        self.mostrar(f'{quantidade} reservas gravadas')
+
+    # ---------- pontos ----------
+
+    def _gerar_pontos(self, quantidade, funcionarios):
+        sorteio = self.sorteio
+        linhas = []
+        dia = self.agora.date()
+        # Anda para trás, dia a dia, até chegar na quantidade pedida
+        while len(linhas) < quantidade:
+            for funcionario_id in funcionarios:
+                if len(linhas) >= quantidade:
+                    break
+                if sorteio.random() > 5 / 7:
+                    continue
+                entrada = datetime.combine(dia, datetime.min.time()) + timedelta(
+                    minutes=max(0, int(sorteio.gauss(8 * 60, 45)))
+                )
+                hoje = dia == self.agora.date()
+                esqueceu = sorteio.random() < 0.02
+                if hoje and entrada > self.agora:
+                    continue
+                saida = None if hoje or esqueceu else entrada + timedelta(minutes=max(60, int(sorteio.gauss(510, 60))))
+                linhas.append({
+                    'funcionario_id': funcionario_id,
+                    'data': dia,
+                    'hora_entrada': entrada,
+                    'hora_saida': saida,
+                    'total_horas': (Decimal((saida - entrada).total_seconds()) / 3600).quantize(Decimal('0.01')) if saida else None
+                })
+            dia -= timedelta(days=1)
+
+        _gravar(RegistroPonto.__table__, linhas)
+        self.mostrar(f'{quantidade} registros de ponto gravados')
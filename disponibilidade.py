@@ -0,0 +1,318 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Reserva, TravaRecurso
+from eventos import ao_confirmar, DESCONHECIDO
+
+# Reserva sem saída prevista ocupa o quarto/vaga até ser finalizada
+_SEM_FIM = datetime.max
+
+
+def recurso_da_reserva(tipo_servico, numero_quarto, numero_vaga):
+    """Qual quarto ou vaga a reserva ocupa: ('HOTEL', '101'), ('GARAGEM', 'A-15') ou None."""
+    numero = numero_quarto if tipo_servico == 'HOTEL' else numero_vaga
+    return (tipo_servico, str(numero)) if numero else None
+
+
+class _Agenda:
+    """
+    Períodos ocupados de um único quarto/vaga, ordenados pela data de início.
+    Os períodos podem se sobrepor (reservas antigas, importações, dados de teste), então
+    guardamos também o maior fim até cada posição: uma estadia longa lá atrás continua
+    ocupando o quarto mesmo com estadias curtas depois dela.
+    """
+
+    def __init__(self):
+        self.periodos = []  # (inicio, fim, id_reserva)
+        self.maiores_fins = []  # maiores_fins[i] = maior fim entre periodos[0..i]
+
+    def adicionar(self, inicio, fim, id_reserva):
+        periodo = (inicio, fim or _SEM_FIM, id_reserva)
+        insort(self.periodos, periodo)
+        self._recalcular(self.periodos.index(periodo))
+
+    def remover(self, id_reserva):
+        self.periodos = [p for p in self.periodos if p[2] != id_reserva]
+        self._recalcular(0)
+
+    def _recalcular(self, desde):
+        del self.maiores_fins[desde:]
+        maior = self.maiores_fins[-1] if self.maiores_fins else None
+        for _, p_fim, _ in self.periodos[desde:]:
+            maior = p_fim if maior is None or p_fim > maior else maior
+            self.maiores_fins.append(maior)
+
+    def conflito(self, inicio, fim, ignorar=None):
+        """
+        Devolve o id da reserva que ocupa [inicio, fim) ou None.
+        Os que começam dentro do intervalo são achados por busca binária; para os que
+        começaram antes, voltamos só enquanto o maior fim acumulado ainda passa do início.
+        """
+        fim = fim or _SEM_FIM
+        posicao = bisect_left(self.periodos, (inicio,))
+
+        for anterior in range(posicao - 1, -1, -1):
+            if self.maiores_fins[anterior] <= inicio:
+                break
+            p_inicio, p_fim, id_reserva = self.periodos[anterior]
+            if id_reserva != ignorar and inicio < p_fim:
+                return id_reserva
+
+        for p_inicio, p_fim, id_reserva in self.periodos[posicao:]:
+            if p_inicio >= fim:
+                break
+            if id_reserva != ignorar:
+                return id_reserva
+        return None
+
+
+class Disponibilidade:
+    """
+    Índice de ocupação de quartos e vagas montado a partir das reservas ATIVAS.
+    É atualizado a cada commit de Reserva neste processo e relido do banco
+    a cada DISPONIBILIDADE_RECARREGAR segundos.
+    """
+
+    def __init__(self):
+        self._trava = threading.RLock()
+        self._geracao = 0
+        self.invalidar()
+
+    def invalidar(self):
+        """Faz a próxima consulta reconstruir o índice a partir do banco."""
+        self._geracao += 1
+        self._validade = 0
+
+    def _garantir_carregado(self):
+        if time.monotonic() < self._validade:
+            return
+        geracao = self._geracao
+        agendas = {}
+        donos = {}
+        linhas = db.session.query(
+            Reserva.id, Reserva.tipo_servico, Reserva.numero_quarto, Reserva.numero_vaga,
+            Reserva.data_entrada, Reserva.data_saida_prevista
+        ).filter(
+            Reserva.status == 'ATIVA',
+            or_(Reserva.numero_quarto.isnot(None), Reserva.numero_vaga.isnot(None))
+        ).all()
+
+        for id_reserva, tipo, quarto, vaga, entrada, saida in linhas:
+            recurso = recurso_da_reserva(tipo, quarto, vaga)
+            if recurso:
+                agendas.setdefault(recurso, _Agenda()).adicionar(entrada, saida, id_reserva)
+                donos[id_reserva] = recurso
+
+        self._agendas = agendas
+        self._donos = donos
+        if geracao == self._geracao:
+            self._validade = time.monotonic() + current_app.config.get('DISPONIBILIDADE_RECARREGAR', 60)
+
+    def inventario(self, tipo_servico):
+        """Quartos/vagas cadastrados na configuração para o tipo de serviço."""
+        chave = 'QUARTOS_HOTEL' if tipo_servico == 'HOTEL' else 'VAGAS_GARAGEM'
+        return list(current_app.config.get(chave, []))
+
+    def conflito(self, recurso, inicio, fim, ignorar=None):
+        """Id da reserva ativa que já ocupa o recurso no período (ou None)."""
+        with self._trava:
+            self._garantir_carregado()
+            agenda = self._agendas.get(recurso)
+            return agenda.conflito(inicio, fim, ignorar) if agenda else None
+
+    def livres(self, tipo_servico, inicio, fim=None):
+        """
+        Lista os quartos/vagas do inventário sem nenhuma reserva ativa no período.
+        Sem inventário configurado, usa os números que já aparecem nas reservas.
+        """
+        with self._trava:
+            self._garantir_carregado()
+            candidatos = self.inventario(tipo_servico) or sorted(
+                numero for tipo, numero in self._agendas if tipo == tipo_servico
+            )
+            return [
+                numero for numero in candidatos
+                if self.conflito((tipo_servico, numero), inicio, fim) is None
+            ]
+
+    def atualizar(self, alteracoes):
+        """Aplica no índice as reservas criadas, alteradas ou removidas em um commit."""
+        with self._trava:
+            if time.monotonic() >= self._validade:
+                # Índice ainda não carregado (ou vencido): a próxima consulta já lê tudo
+                return
+            campos = ('status', 'tipo_servico', 'numero_quarto', 'numero_vaga', 'data_entrada', 'data_saida_prevista')
+
+            for alteracao in alteracoes:
+                if alteracao.acao == 'alterado' and not any(c in alteracao.anteriores for c in campos):
+                    continue
+
+                recurso_antigo = self._donos.pop(alteracao.id, None)
+                if recurso_antigo in self._agendas:
+                    self._agendas[recurso_antigo].remover(alteracao.id)
+
+                if alteracao.acao == 'removido':
+                    continue
+
+                valores = alteracao.valores
+                if any(valores.get(c, DESCONHECIDO) is DESCONHECIDO for c in campos):
+                    # Não temos os dados completos na memória: relemos tudo do banco
+                    self.invalidar()
+                    return
+
+                recurso = recurso_da_reserva(valores['tipo_servico'], valores['numero_quarto'], valores['numero_vaga'])
+                if valores['status'] == 'ATIVA' and recurso:
+                    self._agendas.setdefault(recurso, _Agenda()).adicionar(
+                        valores['data_entrada'], valores['data_saida_prevista'], alteracao.id
+                    )
+                    self._donos[alteracao.id] = recurso
+
+
+# Instância única usada pela aplicação
+disponibilidade = Disponibilidade()
+
+
+def consulta_ocupacao(recurso, inicio, fim=None, ignorar=None):
+    """Id de uma reserva ativa que ocupa o quarto/vaga em [inicio, fim), direto no banco."""
+    coluna = Reserva.numero_quarto if recurso[0] == 'HOTEL' else Reserva.numero_vaga
+    consulta = select(Reserva.id).where(
+        Reserva.status == 'ATIVA',
+        Reserva.tipo_servico == recurso[0],
+        coluna == recurso[1],
+        or_(Reserva.data_saida_prevista.is_(None), Reserva.data_saida_prevista > inicio)
+    )
+    if fim:
+        consulta = consulta.where(Reserva.data_entrada < fim)
+    if ignorar:
+        consulta = consulta.where(Reserva.id != ignorar)
+    return consulta.limit(1)
+
+
+def verificar_reserva(reserva):
+    """
+    Confere se o quarto/vaga da reserva está livre no período.
+    Devolve uma mensagem de erro ou None se estiver tudo certo.
+    """
+    recurso = recurso_da_reserva(reserva.tipo_servico, reserva.numero_quarto, reserva.numero_vaga)
+    if not recurso:
+        return None
+
+    inicio = reserva.data_entrada or datetime.utcnow()
+    fim = reserva.data_saida_prevista
+    if fim and fim <= inicio:
+        return 'A saída prevista deve ser depois da entrada'
+
+    # O índice na memória pode estar velho (outro processo criou, finalizou ou cancelou uma
+    # reserva): quem decide é o banco. Travamos o recurso até o commit e conferimos só ele
+    travar_recursos([recurso])
+    # Leitura com trava (FOR SHARE): no MySQL ela enxerga o último commit, não a foto do início da transação
+    ocupado = db.session.execute(
+        consulta_ocupacao(recurso, inicio, fim, ignorar=reserva.id).with_for_update(read=True)
+    ).scalar()
+
+    if (ocupado is None) != (disponibilidade.conflito(recurso, inicio, fim, ignorar=reserva.id) is None):
+        # O índice discorda do banco: relemos tudo na próxima consulta (ex: livres())
+        disponibilidade.invalidar()
+    if ocupado is not None:
+        return _mensagem_ocupado(recurso)
+    return None
+
+
+def verificar_reservas(reservas):
+    """
+    verificar_reserva para um lote de reservas novas (ex: grupo de turismo, frota de carros).
+    Devolve uma lista com a mensagem de erro (ou None) de cada reserva, na mesma ordem.
+    Faz uma única consulta ao banco para todos os quartos/vagas do lote e também
+    recusa reservas do lote que disputam o mesmo quarto/vaga entre si (vale a primeira).
+    """
+    erros = [None] * len(reservas)
+    periodos = {}
+    for posicao, reserva in enumerate(reservas):
+        recurso = recurso_da_reserva(reserva.tipo_servico, reserva.numero_quarto, reserva.numero_vaga)
+        if not recurso:
+            continue
+        inicio = reserva.data_entrada or datetime.utcnow()
+        fim = reserva.data_saida_prevista
+        if fim and fim <= inicio:
+            erros[posicao] = 'A saída prevista deve ser depois da entrada'
+        else:
+            periodos[posicao] = (recurso, inicio, fim)
+    if not periodos:
+        return erros
+
+    # Uma consulta só: reservas ativas de qualquer quarto/vaga do lote que terminam depois do início mais cedo
+    recursos = {recurso for recurso, _, _ in periodos.values()}
+    travar_recursos(recursos)
+    filtros_recurso = [
+        and_(Reserva.tipo_servico == tipo, (Reserva.numero_quarto if tipo == 'HOTEL' else Reserva.numero_vaga) == numero)
+        for tipo, numero in recursos
+    ]
+    mais_cedo = min(inicio for _, inicio, _ in periodos.values())
+    no_banco = {}
+    for tipo, quarto, vaga, entrada, saida, id_reserva in db.session.query(
+        Reserva.tipo_servico, Reserva.numero_quarto, Reserva.numero_vaga,
+        Reserva.data_entrada, Reserva.data_saida_prevista, Reserva.id
+    ).filter(
+        Reserva.status == 'ATIVA',
+        or_(*filtros_recurso),
+        or_(Reserva.data_saida_prevista.is_(None), Reserva.data_saida_prevista > mais_cedo)
+    ).with_for_update(read=True):
+        no_banco.setdefault(recurso_da_reserva(tipo, quarto, vaga), _Agenda()).adicionar(entrada, saida, id_reserva)
+
+    # Como em verificar_reserva, quem decide é o banco; o índice na memória pode estar velho
+    do_lote = {}
+    indice_velho = False
+    for posicao, (recurso, inicio, fim) in sorted(periodos.items()):
+        no_banco_ocupado = recurso in no_banco and no_banco[recurso].conflito(inicio, fim) is not None
+        indice_velho |= no_banco_ocupado != (disponibilidade.conflito(recurso, inicio, fim) is not None)
+        ocupado = no_banco_ocupado or (recurso in do_lote and do_lote[recurso].conflito(inicio, fim) is not None)
+        if ocupado:
+            erros[posicao] = _mensagem_ocupado(recurso)
+        else:
+            do_lote.setdefault(recurso, _Agenda()).adicionar(inicio, fim, -1 - posicao)
+    if indice_velho:
+        disponibilidade.invalidar()
+    return erros
+
+
+def travar_recursos(recursos):
+    """
+    Trava os quartos/vagas até o fim da transação: uma segunda reserva do mesmo quarto
+    espera o commit (ou rollback) da primeira e só então confere o banco, já enxergando
+    a reserva nova. Sem isso, duas reservas ao mesmo tempo poderiam pegar o mesmo quarto.
+    Um UPDATE só para o lote inteiro: o banco trava as linhas sempre na ordem da chave,
+    então dois lotes não ficam esperando um pelo outro.
+    """
+    recursos = sorted(recursos)
+    if not recursos:
+        return
+    tabela = TravaRecurso.__table__
+    marcar = update(tabela).where(or_(*(
+        and_(tabela.c.tipo_servico == tipo, tabela.c.numero == numero) for tipo, numero in recursos
+    ))).values(usos=tabela.c.usos + 1)
+    if db.session.execute(marcar).rowcount == len(recursos):
+        return
+    # Primeira reserva de algum desses quartos/vagas: cria as linhas que faltam
+    # (ignorando as que já existem ou que outra transação criou junto) e trava de novo
+    valores = [{'tipo_servico': tipo, 'numero': numero, 'usos': 0} for tipo, numero in recursos]
+    dialeto = db.session.get_bind().dialect.name
+    if dialeto in ('sqlite', 'postgresql'):
+        comando = (sqlite if dialeto == 'sqlite' else postgresql).insert(tabela).values(valores).on_conflict_do_nothing()
+    else:
+        comando = insert(tabela).values(valores).prefix_with('IGNORE', dialect='mysql')
+    db.session.execute(comando)
+    db.session.execute(marcar)
+
+
+def _mensagem_ocupado(recurso):
+    nome = 'Quarto' if recurso[0] == 'HOTEL' else 'Vaga'
+    return f'{nome} {recurso[1]} já está reservado(a) nesse período'
+
+
+@ao_confirmar(Reserva)
+def _reservas_alteradas(alteracoes):
+    disponibilidade.atualizar(alteracoes)
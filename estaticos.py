@@ -0,0 +1,225 @@
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from flask import current_app, request, send_from_directory
+
+# Dependências opcionais: sem elas o pipeline só não gera as cópias .br e as variantes WebP
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+PASTA_SAIDA = 'dist'
+MANIFESTO = 'manifesto.json'
+# Arquivos de texto que valem a pena compactar
+COMPACTAVEIS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+IMAGENS = ('.png', '.jpg', '.jpeg')
+# Larguras (px) das variantes WebP; a imagem inteira também ganha uma versão WebP
+LARGURAS_WEBP = (640, 1280)
+UM_ANO = 365 * 24 * 3600
+
+_URL_CSS = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+_FUNDO_CSS = re.compile(r"""^([ \t]*)background-image:\s*url\(\s*['"]?([^'")]+)['"]?\s*\)\s*;""", re.MULTILINE)
+
+
+def _resumo(dados):
+    return hashlib.sha256(dados).hexdigest()[:12]
+
+
+def _com_hash(caminho, dados, sufixo=''):
+    """'css/style.css' -> 'css/style.<hash>.css' (sufixo antes do hash, ex: '.640')"""
+    raiz, extensao = posixpath.splitext(caminho)
+    return f'{raiz}{sufixo}.{_resumo(dados)}{extensao}'
+
+
+class PipelineEstaticos:
+    """
+    Prepara os arquivos de static/ para produção (flask construir-estaticos):
+    - cada arquivo ganha uma cópia com o hash do conteúdo no nome (static/dist/css/style.<hash>.css),
+      que pode ficar em cache por um ano: quando o arquivo muda, o nome muda junto;
+    - CSS/JS ganham cópias já compactadas (.gz e, com o pacote brotli, .br);
+    - PNG/JPG ganham versões WebP menores (com o Pillow), usadas pelo CSS via image-set().
+    O manifesto (static/dist/manifesto.json) liga o nome original ao nome com hash.
+
+    No app, init_app() faz o url_for('static', ...) devolver o nome com hash e troca a rota
+    /static para entregar a cópia compactada com cache longo (immutable).
+    Arquivos fora do manifesto, ou alterados depois do último build, saem como antes.
+    """
+
+    def __init__(self):
+        self._arquivos = {}
+        self.versao = None
+
+    # ---------- build ----------
+
+    def construir(self, origem, destino=None, mostrar=print):
+        """Gera static/dist e o manifesto. Cópias antigas ficam (páginas em cache ainda apontam para elas)."""
+        destino = destino or os.path.join(origem, PASTA_SAIDA)
+        fontes = []
+        for pasta, subpastas, nomes in os.walk(origem):
+            if os.path.abspath(pasta) == os.path.abspath(destino):
+                subpastas[:] = []
+                continue
+            subpastas[:] = [s for s in subpastas if os.path.abspath(os.path.join(pasta, s)) != os.path.abspath(destino)]
+            for nome in nomes:
+                fontes.append(os.path.relpath(os.path.join(pasta, nome), origem).replace(os.sep, '/'))
+
+        manifesto = {}
+        # CSS por último: ele aponta para as imagens, que precisam estar com o nome novo
+        for caminho in sorted(fontes, key=lambda c: (c.endswith('.css'), c)):
+            with open(os.path.join(origem, caminho), 'rb') as arquivo:
+                original = arquivo.read()
+            dados = self._reescrever_css(caminho, original, manifesto) if caminho.endswith('.css') else original
+            item = {'arquivo': _com_hash(caminho, dados), 'origem': _resumo(original)}
+            self._gravar(destino, item['arquivo'], dados)
+            if caminho.lower().endswith(IMAGENS):
+                item['webp'] = self._variantes_webp(destino, caminho, original)
+            manifesto[caminho] = item
+
+        versao = _resumo(json.dumps(manifesto, sort_keys=True).encode())
+        os.makedirs(destino, exist_ok=True)
+        temporario = os.path.join(destino, MANIFESTO + '.tmp')
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump({'versao': versao, 'arquivos': manifesto}, arquivo, indent=2, sort_keys=True)
+        os.replace(temporario, os.path.join(destino, MANIFESTO))
+
+        mostrar(f'{len(manifesto)} arquivos em {destino} (versão {versao}).')
+        if brotli is None:
+            mostrar('Pacote brotli não instalado: só cópias .gz foram geradas.')
+        if Image is None:
+            mostrar('Pillow não instalado: variantes WebP não foram geradas.')
+        return manifesto
+
+    def _gravar(self, destino, caminho, dados):
+        completo = os.path.join(destino, *caminho.split('/'))
+        os.makedirs(os.path.dirname(completo), exist_ok=True)
+        with open(completo, 'wb') as arquivo:
+            arquivo.write(dados)
+        if not caminho.endswith(COMPACTAVEIS):
+            return
+        # mtime=0 deixa o .gz igual a cada build (mesmo conteúdo, mesmos bytes)
+        compactados = [('.gz', gzip.compress(dados, 9, mtime=0))]
+        if brotli is not None:
+            compactados.append(('.br', brotli.compress(dados, quality=11)))
+        for extensao, compactado in compactados:
+            if len(compactado) < len(dados):
+                with open(completo + extensao, 'wb') as arquivo:
+                    arquivo.write(compactado)
+
+    def _variantes_webp(self, destino, caminho, dados):
+        """{largura: arquivo} das versões WebP ('original' é a imagem no tamanho de origem)."""
+        if Image is None:
+            return {}
+        variantes = {}
+        with Image.open(io.BytesIO(dados)) as imagem:
+            larguras = [l for l in LARGURAS_WEBP if l < imagem.width] + ['original']
+            for largura in larguras:
+                copia = imagem.copy()
+                if largura != 'original':
+                    copia.thumbnail((largura, round(imagem.height * largura / imagem.width)))
+                saida = io.BytesIO()
+                copia.save(saida, 'WEBP', quality=80, method=6)
+                webp = saida.getvalue()
+                nome = _com_hash(posixpath.splitext(caminho)[0] + '.webp', webp, '' if largura == 'original' else f'.{largura}')
+                self._gravar(destino, nome, webp)
+                variantes[str(largura)] = nome
+        return variantes
+
+    def _reescrever_css(self, caminho, dados, manifesto):
+        """Troca url(...) relativos pelos nomes com hash e oferece o WebP com image-set()."""
+        texto = dados.decode('utf-8')
+        pasta = posixpath.dirname(caminho)
+
+        def alvo(url):
+            if re.match(r'^(?:[a-z]+:|/|#)', url):
+                return None
+            return manifesto.get(posixpath.normpath(posixpath.join(pasta, url)))
+
+        def relativo(arquivo):
+            return posixpath.relpath(arquivo, pasta or '.')
+
+        def fundo(encontrado):
+            item = alvo(encontrado.group(2))
+            if not item or not item.get('webp'):
+                return encontrado.group(0)
+            # Navegadores sem image-set() ficam com a primeira linha
+            return (f"{encontrado.group(0)}\n{encontrado.group(1)}background-image: image-set("
+                    f"url('{relativo(item['webp']['original'])}') type('image/webp'), "
+                    f"url('{relativo(item['arquivo'])}') type('{mimetypes.guess_type(item['arquivo'])[0]}'));")
+
+        def url(encontrado):
+            item = alvo(encontrado.group(2))
+            return f"url('{relativo(item['arquivo'])}')" if item else encontrado.group(0)
+
+        return _URL_CSS.sub(url, _FUNDO_CSS.sub(fundo, texto)).encode('utf-8')
+
+    # ---------- app ----------
+
+    def init_app(self, app):
+        self.carregar(app)
+        app.url_defaults(self._trocar_nome)
+        app.view_functions['static'] = self._servir
+
+    def carregar(self, app):
+        """Lê o manifesto (se o build já rodou). Arquivos alterados depois do build ficam de fora."""
+        self._arquivos, self.versao = {}, None
+        caminho = os.path.join(app.static_folder, PASTA_SAIDA, MANIFESTO)
+        if not app.config.get('ESTATICOS_COM_HASH', True) or not os.path.exists(caminho):
+            return
+        with open(caminho, encoding='utf-8') as arquivo:
+            manifesto = json.load(arquivo)
+
+        for original, item in manifesto['arquivos'].items():
+            try:
+                with open(os.path.join(app.static_folder, original), 'rb') as arquivo:
+                    atual = _resumo(arquivo.read())
+            except OSError:
+                continue
+            if atual != item['origem']:
+                app.logger.warning('%s mudou depois do último build (flask construir-estaticos)', original)
+                continue
+            self._arquivos[original] = f"{PASTA_SAIDA}/{item['arquivo']}"
+        self.versao = manifesto['versao']
+
+    def _trocar_nome(self, endpoint, valores):
+        if endpoint == 'static' and valores.get('filename') in self._arquivos:
+            valores['filename'] = self._arquivos[valores['filename']]
+
+    def _servir(self, filename):
+        """Rota /static: arquivos com hash saem compactados (se o navegador aceitar) e com cache de um ano."""
+        if not filename.startswith(PASTA_SAIDA + '/'):
+            return current_app.send_static_file(filename)
+
+        caminho = filename[len(PASTA_SAIDA) + 1:]
+        pasta = os.path.join(current_app.static_folder, PASTA_SAIDA)
+        codificacao, arquivo = None, caminho
+        if caminho.endswith(COMPACTAVEIS):
+            for nome, extensao in (('br', '.br'), ('gzip', '.gz')):
+                if request.accept_encodings[nome] and os.path.isfile(os.path.join(pasta, *(caminho + extensao).split('/'))):
+                    codificacao, arquivo = nome, caminho + extensao
+                    break
+
+        # Com hash no nome, o conteúdo nunca muda: cache de um ano sem precisar conferir
+        resposta = send_from_directory(pasta, arquivo, mimetype=mimetypes.guess_type(caminho)[0], max_age=UM_ANO)
+        if codificacao:
+            resposta.headers['Content-Encoding'] = codificacao
+            # Sem isso o navegador veria o nome do .gz ao salvar o arquivo
+            resposta.headers.pop('Content-Disposition', None)
+        if caminho.endswith(COMPACTAVEIS):
+            resposta.vary.add('Accept-Encoding')
+        if re.search(r'\.[0-9a-f]{12}\.\w+$', caminho):
+            resposta.headers['Cache-Control'] = f'public, max-age={UM_ANO}, immutable'
+        return resposta
+
+
+# Instância única usada pela aplicação
+estaticos = PipelineEstaticos()
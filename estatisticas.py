@@ -0,0 +1,89 @@
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, select
+from models import db, Usuario, Reserva, RegistroPonto, AgregadoDiario
+from eventos import ao_confirmar
+
+
+def consulta_reservas_ativas():
+    """Quantas reservas estão ativas."""
+    return select(func.count(Reserva.id)).where(Reserva.status == 'ATIVA')
+
+
+class EstatisticasAdmin:
+    """
+    Guarda os números do painel do Admin por alguns segundos (ESTATISTICAS_TTL).
+    Cada tabela é lida com uma única consulta agrupada e a receita total vem da soma
+    dos agregados diários, sem varrer 'reservas'.
+
+    O cache é de cada processo: um commit invalida só o do processo que gravou; nos outros
+    workers os números se atualizam quando o TTL vence.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.limpar()
+
+    def limpar(self):
+        """Esquece tudo o que foi guardado (a próxima leitura vai ao banco)."""
+        self._dados = None
+        self._validade = 0
+
+    def invalidar(self):
+        """Força a releitura na próxima chamada de obter()."""
+        self._validade = 0
+
+    def obter(self):
+        """Devolve o dicionário usado pela rota /api/admin/estatisticas."""
+        with self._trava:
+            agora = time.monotonic()
+            if self._dados is None or agora >= self._validade:
+                self._carregar(agora)
+            return dict(self._dados)
+
+    def _contar_usuarios(self):
+        # Uma consulta só: SELECT tipo_usuario, COUNT(*) ... GROUP BY tipo_usuario
+        por_tipo = dict(
+            db.session.query(Usuario.tipo_usuario, func.count(Usuario.id))
+            .group_by(Usuario.tipo_usuario)
+            .all()
+        )
+        return {
+            'clientes': por_tipo.get('CLIENTE', 0),
+            'funcionarios': por_tipo.get('FUNCIONARIO', 0),
+            'admins': por_tipo.get('ADM', 0)
+        }
+
+    def _contar_presentes(self):
+        hoje = datetime.utcnow().date()
+        return db.session.query(func.count(RegistroPonto.id)).filter(
+            RegistroPonto.data == hoje,
+            RegistroPonto.hora_saida.is_(None)
+        ).scalar()
+
+    def _somar_receita(self):
+        # Os agregados têm uma linha por dia e serviço: a soma é barata
+        receita = db.session.query(func.sum(AgregadoDiario.receita)).scalar()
+        return float(receita or 0)
+
+    def _carregar(self, agora):
+        reservas_ativas = db.session.execute(consulta_reservas_ativas()).scalar()
+
+        self._dados = {
+            'usuarios': self._contar_usuarios(),
+            'reservas_ativas': reservas_ativas,
+            'funcionarios_presentes': self._contar_presentes(),
+            'receita_total': self._somar_receita()
+        }
+        self._validade = agora + current_app.config.get('ESTATISTICAS_TTL', 15)
+
+
+# Instância única usada pela aplicação
+estatisticas = EstatisticasAdmin()
+
+
+@ao_confirmar(Reserva, Usuario, RegistroPonto)
+def _atualizar_estatisticas(alteracoes):
+    estatisticas.invalidar()
@@ -0,0 +1,123 @@
+from collections import defaultdict, namedtuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# Cada alteração guarda só dados simples (dicionários), assim quem recebe o aviso
+# não precisa ir ao banco de novo depois do commit
+Alteracao = namedtuple('Alteracao', ['acao', 'modelo', 'id', 'valores', 'anteriores'])
+
+# Marca um valor antigo que mudou mas não estava carregado na memória
+DESCONHECIDO = object()
+
+# Funções interessadas em cada modelo (ex: Reserva -> [atualizar_receita, ...])
+_ouvintes = defaultdict(list)
+# Funções que precisam gravar algo junto, na mesma transação (veja na_mesma_transacao)
+_ouvintes_flush = defaultdict(list)
+
+_CHAVE_PENDENTES = 'alteracoes_pendentes'
+
+
+def ao_confirmar(*modelos):
+    """
+    Registra uma função para ser chamada depois que um commit com alterações
+    nos modelos informados der certo. A função recebe a lista de Alteracao.
+
+        @ao_confirmar(Reserva)
+        def minha_funcao(alteracoes): ...
+    """
+    def registrar(funcao):
+        for modelo in modelos:
+            _ouvintes[modelo].append(funcao)
+        return funcao
+    return registrar
+
+
+def na_mesma_transacao(*modelos):
+    """
+    Como ao_confirmar, mas a função é chamada logo depois de cada flush, ainda dentro
+    da transação, e recebe (conexao, alteracoes). O que ela gravar pela conexão entra
+    no mesmo commit (ou é desfeito junto no rollback). Não use a sessão do ORM dentro dela.
+
+        @na_mesma_transacao(Reserva)
+        def minha_funcao(conexao, alteracoes): ...
+    """
+    def registrar(funcao):
+        for modelo in modelos:
+            _ouvintes_flush[modelo].append(funcao)
+        return funcao
+    return registrar
+
+
+def registrar_alteracao(session, acao, modelo, id, valores, anteriores=None):
+    """
+    Para gravações feitas direto em SQL (sem passar pelo flush do ORM): avisa os
+    ouvintes de ao_confirmar depois do commit da sessão, como se fosse um objeto salvo.
+    """
+    if modelo in _ouvintes:
+        session.info.setdefault(_CHAVE_PENDENTES, []).append(Alteracao(acao, modelo, id, valores, anteriores or {}))
+
+
+def _agrupar_por_funcao(alteracoes, ouvintes):
+    """Agrupamos por função para que cada uma seja chamada uma única vez."""
+    por_funcao = {}
+    for alteracao in alteracoes:
+        for funcao in ouvintes.get(alteracao.modelo, ()):
+            por_funcao.setdefault(funcao, []).append(alteracao)
+    return por_funcao
+
+
+def _fotografar(objeto, acao):
+    """Copia os valores das colunas do objeto no momento do flush."""
+    estado = inspect(objeto)
+    valores = {}
+    anteriores = {}
+    for coluna in estado.mapper.column_attrs:
+        # Usamos só o que já está carregado para não disparar consultas no meio do flush
+        if coluna.key in estado.dict:
+            valores[coluna.key] = estado.dict[coluna.key]
+        if acao == 'alterado':
+            historico = estado.attrs[coluna.key].history
+            if historico.has_changes():
+                anteriores[coluna.key] = historico.deleted[0] if historico.deleted else DESCONHECIDO
+    # Se o objeto estava expirado o id não está em estado.dict, mas a identidade sempre está
+    identidade = valores.get('id') or (estado.identity[0] if estado.identity else None)
+    return Alteracao(acao, type(objeto), identidade, valores, anteriores)
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_alteracoes(session, contexto_flush):
+    pendentes = session.info.setdefault(_CHAVE_PENDENTES, [])
+    deste_flush = []
+    for acao, objetos in (('criado', session.new), ('alterado', session.dirty), ('removido', session.deleted)):
+        for objeto in objetos:
+            if type(objeto) not in _ouvintes and type(objeto) not in _ouvintes_flush:
+                continue
+            if acao == 'alterado' and not session.is_modified(objeto, include_collections=False):
+                continue
+            alteracao = _fotografar(objeto, acao)
+            deste_flush.append(alteracao)
+            if type(objeto) in _ouvintes:
+                pendentes.append(alteracao)
+
+    # Aqui um erro precisa subir: ele desfaz a transação inteira
+    for funcao, alteracoes in _agrupar_por_funcao(deste_flush, _ouvintes_flush).items():
+        funcao(session.connection(), alteracoes)
+
+
+@event.listens_for(Session, 'after_commit')
+def _avisar_ouvintes(session):
+    pendentes = session.info.pop(_CHAVE_PENDENTES, None)
+    if not pendentes:
+        return
+
+    for funcao, alteracoes in _agrupar_por_funcao(pendentes, _ouvintes).items():
+        try:
+            funcao(alteracoes)
+        except Exception as erro:
+            # Um aviso com problema não pode desfazer um commit que já aconteceu
+            print(f"Erro ao processar alterações em {funcao.__name__}: {erro}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_alteracoes(session):
+    session.info.pop(_CHAVE_PENDENTES, None)
@@ -0,0 +1,146 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from models import db, Usuario, Reserva, RegistroPonto
+
+# Quantas linhas o cursor do servidor traz do banco por vez
+LINHAS_POR_BLOCO = 1000
+# Quantas linhas juntamos antes de entregar um pedaço da resposta
+LINHAS_POR_PEDACO = 500
+
+TABELAS = ('reservas', 'pontos')
+FORMATOS = ('csv', 'ndjson')
+
+
+def consulta_reservas(inicio=None, fim=None, tipo_servico=None, status=None):
+    """SELECT das reservas com o nome do cliente e do funcionário (um JOIN, sem ORM)."""
+    cliente = aliased(Usuario)
+    funcionario = aliased(Usuario)
+    consulta = select(
+        Reserva.id,
+        cliente.nome.label('cliente'),
+        cliente.cpf.label('cpf_cliente'),
+        funcionario.nome.label('funcionario'),
+        Reserva.tipo_servico,
+        Reserva.numero_quarto,
+        Reserva.numero_vaga,
+        Reserva.placa_veiculo,
+        Reserva.data_entrada,
+        Reserva.data_saida_prevista,
+        Reserva.data_saida_real,
+        Reserva.valor_base,
+        Reserva.desconto_percentual,
+        Reserva.valor_final,
+        Reserva.status
+    ).join(
+        cliente, Reserva.cliente_id == cliente.id
+    ).outerjoin(
+        funcionario, Reserva.funcionario_id == funcionario.id
+    ).order_by(Reserva.id)
+
+    if inicio:
+        consulta = consulta.where(Reserva.data_entrada >= inicio)
+    if fim:
+        # O dia final entra inteiro no filtro
+        consulta = consulta.where(Reserva.data_entrada < fim + timedelta(days=1))
+    if tipo_servico:
+        consulta = consulta.where(Reserva.tipo_servico == tipo_servico)
+    if status:
+        consulta = consulta.where(Reserva.status == status)
+    return consulta
+
+
+def consulta_pontos(inicio=None, fim=None, **_):
+    """SELECT dos registros de ponto com o nome do funcionário."""
+    consulta = select(
+        RegistroPonto.id,
+        Usuario.nome.label('funcionario'),
+        Usuario.cpf.label('cpf_funcionario'),
+        RegistroPonto.data,
+        RegistroPonto.hora_entrada,
+        RegistroPonto.hora_saida,
+        RegistroPonto.total_horas,
+        RegistroPonto.observacoes
+    ).join(
+        Usuario, RegistroPonto.funcionario_id == Usuario.id
+    ).order_by(RegistroPonto.id)
+
+    if inicio:
+        consulta = consulta.where(RegistroPonto.data >= inicio.date())
+    if fim:
+        consulta = consulta.where(RegistroPonto.data <= fim.date())
+    return consulta
+
+
+CONSULTAS = {'reservas': consulta_reservas, 'pontos': consulta_pontos}
+
+
+def ler_filtros(inicio=None, fim=None, tipo_servico=None, status=None):
+    """Confere os filtros vindos da URL ou do terminal (ValueError se algum for inválido)."""
+    filtros = {
+        'inicio': datetime.strptime(inicio, '%Y-%m-%d') if inicio else None,
+        'fim': datetime.strptime(fim, '%Y-%m-%d') if fim else None,
+        'tipo_servico': tipo_servico.upper() if tipo_servico else None,
+        'status': status.upper() if status else None
+    }
+    if filtros['tipo_servico'] and filtros['tipo_servico'] not in Reserva.tipo_servico.type.enums:
+        raise ValueError(f'tipo_servico inválido: {tipo_servico}')
+    if filtros['status'] and filtros['status'] not in Reserva.status.type.enums:
+        raise ValueError(f'status inválido: {status}')
+    return filtros
+
+
+def _texto(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def gerar_linhas(consulta, formato='csv'):
+    """
+    Executa a consulta com um cursor no servidor (stream_results) e devolve o arquivo
+    em pedaços de texto. Só um bloco de linhas fica na memória por vez,
+    então o uso de memória é o mesmo para mil ou para milhões de linhas.
+    """
+    resultado = db.session.execute(
+        consulta.execution_options(stream_results=True, yield_per=LINHAS_POR_BLOCO)
+    )
+    colunas = list(resultado.keys())
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    if formato == 'csv':
+        escritor.writerow(colunas)
+
+    for bloco in resultado.partitions(LINHAS_POR_PEDACO):
+        for linha in bloco:
+            valores = [_texto(valor) for valor in linha]
+            if formato == 'csv':
+                escritor.writerow(valores)
+            else:
+                buffer.write(json.dumps(dict(zip(colunas, valores)), ensure_ascii=False) + '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def comprimir(pedacos):
+    """Compacta os pedaços com gzip enquanto eles são gerados."""
+    compactador = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = formato gzip
+    for pedaco in pedacos:
+        dados = compactador.compress(pedaco.encode('utf-8'))
+        if dados:
+            yield dados
+    yield compactador.flush()
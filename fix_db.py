@@ -2,6 +2,7 @@
 from app import app, db
 from models import Usuario, Reserva, RegistroPonto, Promocao
 from sqlalchemy import inspect
+from migracoes import migrar
 
 def fix_db():
     with app.app_context():
@@ -9,16 +10,11 @@ def fix_db():
         tables = inspector.get_table_names()
         print(f"Tabelas existentes: {tables}")
         
-        if 'promocoes' not in tables:
-            print("Criando tabela 'promocoes'...")
-            try:
-                # Tenta criar apenas as tabelas que faltam
-                db.create_all()
-                print("db.create_all() executado.")
-            except Exception as e:
-                print(f"Erro ao criar tabelas: {e}")
-        else:
-            print("Tabela 'promocoes' já existe.")
+        try:
+            # Cria as tabelas e os índices que faltam (o mesmo que: flask migrar-banco)
+            migrar(db.engine)
+        except Exception as e:
+            print(f"Erro ao migrar o banco: {e}")
 
         # Verificar se está vazia
         try:
@@ -0,0 +1,102 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import and_, case, func, or_, select
+from models import db, Usuario, RegistroPonto
+
+COLUNAS = ('id', 'nome', 'cpf', 'dias_trabalhados', 'total_horas', 'horas_normais', 'horas_extras', 'saidas_faltando')
+
+
+def ler_mes(texto=None):
+    """'AAAA-MM' -> (primeiro dia, último dia) do mês. Sem texto, usa o mês atual."""
+    inicio = datetime.strptime(texto, '%Y-%m').date() if texto else datetime.utcnow().date().replace(day=1)
+    proximo = (inicio + timedelta(days=32)).replace(day=1)
+    return inicio, proximo - timedelta(days=1)
+
+
+def _horas(valor):
+    return float(Decimal(str(valor or 0)).quantize(Decimal('0.01')))
+
+
+def consulta_folha(inicio, fim, funcionario_id=None):
+    """
+    A consulta agrupada da folha (primeiro por funcionário e dia, depois por funcionário):
+    id, nome, cpf, dias, total de horas, horas extras e saídas faltando.
+    """
+    jornada = Decimal(str(current_app.config.get('JORNADA_DIARIA_HORAS', 8)))
+    hoje = datetime.utcnow().date()
+
+    por_dia = select(
+        RegistroPonto.funcionario_id,
+        RegistroPonto.data,
+        func.coalesce(func.sum(RegistroPonto.total_horas), 0).label('horas'),
+        func.sum(case(
+            (and_(RegistroPonto.hora_saida.is_(None), RegistroPonto.data < hoje), 1), else_=0
+        )).label('sem_saida')
+    ).where(
+        RegistroPonto.data.between(inicio, fim)
+    ).group_by(RegistroPonto.funcionario_id, RegistroPonto.data).subquery()
+
+    consulta = select(
+        Usuario.id,
+        Usuario.nome,
+        Usuario.cpf,
+        func.count(por_dia.c.data),
+        func.coalesce(func.sum(por_dia.c.horas), 0),
+        func.coalesce(func.sum(case((por_dia.c.horas > jornada, por_dia.c.horas - jornada), else_=0)), 0),
+        func.coalesce(func.sum(por_dia.c.sem_saida), 0)
+    ).outerjoin(
+        por_dia, por_dia.c.funcionario_id == Usuario.id
+    ).where(
+        Usuario.tipo_usuario == 'FUNCIONARIO',
+        # Funcionários desligados só aparecem se trabalharam no período
+        or_(Usuario.ativo == True, por_dia.c.funcionario_id.isnot(None))
+    ).group_by(Usuario.id, Usuario.nome, Usuario.cpf).order_by(Usuario.nome, Usuario.id)
+
+    if funcionario_id is not None:
+        consulta = consulta.where(Usuario.id == funcionario_id)
+    return consulta
+
+
+def relatorio_mensal(inicio, fim, funcionario_id=None):
+    """
+    Folha de ponto de todos os funcionários em um período, calculada pelo banco
+    em uma única consulta (consulta_folha).
+    Horas acima de JORNADA_DIARIA_HORAS em um dia contam como extras.
+    Saídas faltando são pontos sem hora de saída em dias que já terminaram.
+    """
+    relatorio = []
+    for id_funcionario, nome, cpf, dias, total, extras, sem_saida in db.session.execute(
+        consulta_folha(inicio, fim, funcionario_id)
+    ):
+        relatorio.append({
+            'id': id_funcionario,
+            'nome': nome,
+            'cpf': cpf,
+            'dias_trabalhados': dias,
+            'total_horas': _horas(total),
+            'horas_normais': _horas(Decimal(str(total)) - Decimal(str(extras))),
+            'horas_extras': _horas(extras),
+            'saidas_faltando': int(sem_saida)
+        })
+    return relatorio
+
+
+def totais(relatorio):
+    """Soma as colunas do relatório para o rodapé."""
+    return {
+        'funcionarios': len(relatorio),
+        'total_horas': round(sum(f['total_horas'] for f in relatorio), 2),
+        'horas_extras': round(sum(f['horas_extras'] for f in relatorio), 2),
+        'saidas_faltando': sum(f['saidas_faltando'] for f in relatorio)
+    }
+
+
+def para_csv(relatorio):
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=COLUNAS)
+    escritor.writeheader()
+    escritor.writerows(relatorio)
+    return buffer.getvalue()
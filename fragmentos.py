@@ -0,0 +1,131 @@
+import os
+import stat
+import threading
+from collections import OrderedDict
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from models import Promocao
+from eventos import ao_confirmar
+
+
+class CacheFragmentos:
+    """
+    Guarda pedaços de HTML já renderizados (ex: o conteúdo da página inicial),
+    que são iguais para todos os visitantes. O que muda por usuário (menu do topo,
+    avisos) continua sendo renderizado a cada requisição em volta deles.
+    A chave é uma tupla que começa pelo nome do fragmento e inclui a versão dos dados
+    usados (ex: versão das promoções). Acima de FRAGMENTOS_MAXIMO itens, o usado há
+    mais tempo sai primeiro (LRU).
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._itens = OrderedDict()
+        self._acertos = 0
+        self._faltas = 0
+
+    def obter(self, chave, gerar):
+        """HTML do fragmento 'chave', renderizado por gerar() só quando não estiver guardado."""
+        with self._trava:
+            html = self._itens.get(chave)
+            if html is not None:
+                self._itens.move_to_end(chave)
+                self._acertos += 1
+                return html
+            self._faltas += 1
+
+        # Renderiza fora da trava: duas requisições ao mesmo tempo podem renderizar o mesmo fragmento,
+        # o que só custa um pouco de CPU
+        html = Markup(gerar())
+        maximo = current_app.config.get('FRAGMENTOS_MAXIMO', 256)
+        with self._trava:
+            self._itens[chave] = html
+            self._itens.move_to_end(chave)
+            while len(self._itens) > maximo:
+                self._itens.popitem(last=False)
+        return html
+
+    def invalidar(self, nome=None):
+        """Apaga os fragmentos com esse nome (ou todos)."""
+        with self._trava:
+            for chave in [c for c in self._itens if nome is None or c[0] == nome]:
+                del self._itens[chave]
+
+    def metricas(self):
+        with self._trava:
+            return {'itens': len(self._itens), 'acertos': self._acertos, 'faltas': self._faltas}
+
+
+# Instância única usada pela aplicação
+cache_fragmentos = CacheFragmentos()
+
+
+@ao_confirmar(Promocao)
+def _promocoes_alteradas(alteracoes):
+    cache_fragmentos.invalidar('inicio')
+
+
+def configurar_templates(app):
+    """
+    Guarda os templates já compilados (bytecode do Jinja) em TEMPLATES_CACHE_PASTA
+    (padrão: instance/templates-cache): um processo novo lê o template compilado em vez de compilar de novo.
+    Importar o app não grava nada: a pasta só é criada quando o primeiro template é compilado.
+    Para compilar tudo antes da primeira visita, rode flask compilar-templates antes de subir os workers.
+    """
+    pasta = app.config.get('TEMPLATES_CACHE_PASTA')
+    if pasta is None:
+        pasta = os.path.join(app.instance_path, 'templates-cache')
+    if pasta:
+        app.jinja_env.bytecode_cache = CacheBytecodeSeguro(pasta, app.logger)
+
+
+class CacheBytecodeSeguro(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache que cria e confere a pasta (pasta_segura) só no primeiro uso."""
+
+    def __init__(self, pasta, log):
+        super().__init__(pasta)
+        self._log = log
+        self._trava = threading.Lock()
+        self._segura = None
+
+    def _pronta(self):
+        with self._trava:
+            if self._segura is None:
+                self._segura = pasta_segura(self.directory, self._log)
+            return self._segura
+
+    def load_bytecode(self, bucket):
+        if self._pronta():
+            super().load_bytecode(bucket)
+
+    def dump_bytecode(self, bucket):
+        if self._pronta():
+            super().dump_bytecode(bucket)
+
+    def clear(self):
+        if self._pronta():
+            super().clear()
+
+
+def pasta_segura(pasta, log):
+    """
+    Cria a pasta do bytecode só para o nosso usuário (0700) e recusa uma pasta de outro usuário
+    ou que outros possam gravar: o Jinja executa o bytecode que estiver lá dentro.
+    """
+    os.makedirs(pasta, mode=0o700, exist_ok=True)
+    if not hasattr(os, 'getuid'):
+        return True  # Windows: sem dono/permissões no estilo Unix
+    estado = os.lstat(pasta)
+    if not stat.S_ISDIR(estado.st_mode) or estado.st_uid != os.getuid() or estado.st_mode & 0o022:
+        log.warning('Cache de templates desligado: %s não é uma pasta só do usuário atual', pasta)
+        return False
+    return True
+
+
+def compilar_templates(app):
+    """Carrega (compila) todos os templates do app. Devolve quantos foram carregados."""
+    nomes = app.jinja_env.list_templates()
+    for nome in nomes:
+        app.jinja_env.get_template(nome)
+    return len(nomes)
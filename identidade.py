@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from flask_login import UserMixin
+from models import db, Usuario
+from eventos import ao_confirmar
+from visitas import acumulador_visitas
+
+
+class UsuarioLogado(UserMixin):
+    """
+    Cópia somente leitura de um Usuario, usada como current_user.
+    Não está ligada à sessão do banco: para alterar o usuário, busque o Usuario de verdade.
+    """
+
+    def __init__(self, dados):
+        object.__setattr__(self, '_dados', dados)
+
+    def __getattr__(self, nome):
+        if nome == '_dados':
+            raise AttributeError(nome)
+        try:
+            return self._dados[nome]
+        except KeyError:
+            raise AttributeError(nome)
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError('UsuarioLogado é somente leitura')
+
+    @property
+    def is_active(self):
+        return bool(self._dados['ativo'])
+
+    # Mesmos métodos de ajuda do modelo
+    is_admin = Usuario.is_admin
+    is_funcionario = Usuario.is_funcionario
+    is_cliente = Usuario.is_cliente
+    to_dict = Usuario.to_dict
+
+    def __repr__(self):
+        return f'<UsuarioLogado {self.nome} ({self.tipo_usuario})>'
+
+
+class CacheIdentidade:
+    """
+    Guarda os usuários logados na memória do processo para o Flask-Login não ir ao
+    banco em toda requisição. Cada item vale IDENTIDADE_CACHE_TTL segundos e, com mais de
+    IDENTIDADE_CACHE_MAXIMO itens, o usado há mais tempo sai primeiro (LRU).
+    Qualquer commit em um Usuario tira ele do cache na hora.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._itens = OrderedDict()  # id -> (validade, UsuarioLogado)
+        self.zerar_metricas()
+
+    def zerar_metricas(self):
+        self._metricas = {'acertos': 0, 'faltas': 0, 'descartes': 0, 'invalidacoes': 0}
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    def invalidar(self, *ids):
+        with self._trava:
+            for id_usuario in ids:
+                if self._itens.pop(id_usuario, None) is not None:
+                    self._metricas['invalidacoes'] += 1
+
+    def obter(self, id_usuario):
+        """UsuarioLogado do id (ou None se não existir ou estiver desativado)."""
+        agora = time.monotonic()
+        with self._trava:
+            item = self._itens.get(id_usuario)
+            if item and item[0] > agora:
+                self._itens.move_to_end(id_usuario)
+                self._metricas['acertos'] += 1
+                return item[1]
+            self._metricas['faltas'] += 1
+
+        usuario = db.session.get(Usuario, id_usuario)
+        if usuario is None or not usuario.ativo:
+            return None
+        copia = UsuarioLogado({coluna.key: getattr(usuario, coluna.key) for coluna in Usuario.__mapper__.column_attrs})
+
+        with self._trava:
+            self._itens[id_usuario] = (agora + current_app.config.get('IDENTIDADE_CACHE_TTL', 30), copia)
+            self._itens.move_to_end(id_usuario)
+            while len(self._itens) > current_app.config.get('IDENTIDADE_CACHE_MAXIMO', 10000):
+                self._itens.popitem(last=False)
+                self._metricas['descartes'] += 1
+        return copia
+
+    def metricas(self):
+        with self._trava:
+            return dict(self._metricas, itens=len(self._itens))
+
+
+# Instância única usada pela aplicação
+cache_identidade = CacheIdentidade()
+
+
+@ao_confirmar(Usuario)
+def _usuarios_alterados(alteracoes):
+    cache_identidade.invalidar(*(alteracao.id for alteracao in alteracoes))
+
+
+# As visitas são gravadas com UPDATE direto (sem ORM), então avisamos o cache também
+acumulador_visitas.ao_gravar.append(lambda ids: cache_identidade.invalidar(*ids))
@@ -0,0 +1,186 @@
+import csv
+import json
+import os
+import secrets
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from flask import current_app
+from sqlalchemy import func
+from werkzeug.security import generate_password_hash
+from models import db, Usuario
+from senhas import contexto_processos
+
+CAMPOS_OBRIGATORIOS = ('nome', 'email', 'cpf', 'telefone')
+
+# Tamanho máximo de cada coluna (igual ao models.py)
+TAMANHOS = {'nome': 100, 'email': 120, 'cpf': 14, 'telefone': 20}
+
+# Linha do NDJSON que não é um objeto JSON (numero = linha no arquivo, começando em 1)
+LinhaInvalida = namedtuple('LinhaInvalida', ['numero'])
+
+
+def ler_linhas(caminho, formato=None):
+    """
+    Lê o arquivo linha por linha (sem carregar tudo na memória).
+    Aceita CSV com cabeçalho ou NDJSON (um objeto JSON por linha).
+    Uma linha de NDJSON com defeito vira LinhaInvalida, sem parar a importação.
+    """
+    formato = formato or ('ndjson' if caminho.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(caminho, encoding='utf-8', newline='') as arquivo:
+        if formato == 'csv':
+            yield from csv.DictReader(arquivo)
+        else:
+            for numero, linha in enumerate(arquivo, start=1):
+                if not linha.strip():
+                    continue
+                try:
+                    dados = json.loads(linha)
+                except ValueError:
+                    dados = None
+                yield dados if isinstance(dados, dict) else LinhaInvalida(numero)
+
+
+def validar(linha, gerar_senha=False):
+    """
+    Limpa os campos da linha. Devolve (dados, None) ou (None, motivo do erro).
+    Linha sem senha só passa com gerar_senha=True (dados['senha_gerada'] fica True).
+    """
+    if isinstance(linha, LinhaInvalida):
+        return None, 'linha inválida'
+    dados = {campo: str(linha.get(campo) or '').strip() for campo in CAMPOS_OBRIGATORIOS}
+
+    for campo in CAMPOS_OBRIGATORIOS:
+        if not dados[campo]:
+            return None, f'{campo} vazio'
+        if len(dados[campo]) > TAMANHOS[campo]:
+            return None, f'{campo} muito longo'
+
+    dados['email'] = dados['email'].lower()
+    if '@' not in dados['email']:
+        return None, 'email inválido'
+
+    dados['senha'] = str(linha.get('senha') or '')
+    dados['senha_gerada'] = not dados['senha']
+    if dados['senha_gerada']:
+        if not gerar_senha:
+            return None, 'senha vazia'
+        dados['senha'] = secrets.token_urlsafe(8)
+    return dados, None
+
+
+def _ja_cadastrados(emails, cpfs):
+    """
+    Duas consultas com IN para descobrir quais emails/CPFs do lote já existem.
+    Os emails vêm em minúsculas; os do banco são comparados em minúsculas também
+    (contas antigas podem ter sido gravadas com maiúsculas).
+    """
+    email = func.lower(Usuario.email)
+    existentes_email = {e for (e,) in db.session.query(email).filter(email.in_(emails))}
+    existentes_cpf = {c for (c,) in db.session.query(Usuario.cpf).filter(Usuario.cpf.in_(cpfs))}
+    return existentes_email, existentes_cpf
+
+
+class ImportadorClientes:
+    """
+    Importa clientes em lotes: valida, remove repetidos (no arquivo e no banco),
+    gera as hashes das senhas em vários processos e grava com um INSERT por lote.
+
+    Linhas sem senha são ignoradas, a não ser que 'senhas_geradas' seja um arquivo aberto:
+    aí cada uma recebe uma senha aleatória, escrita no arquivo (email,senha) depois que o
+    lote é gravado, para que o cliente possa recebê-la.
+    """
+
+    def __init__(self, tamanho_lote=1000, processos=None, mostrar=print, senhas_geradas=None):
+        self.tamanho_lote = tamanho_lote
+        self.processos = processos or os.cpu_count() or 1
+        self.mostrar = mostrar
+        self.lidas = 0
+        self.inseridas = 0
+        self.ignoradas = {}
+        self.linhas_invalidas = []  # números das linhas com defeito, para o relatório
+        self.senhas_geradas = 0
+        self._relatorio_senhas = csv.writer(senhas_geradas) if senhas_geradas else None
+        self._emails_vistos = set()
+        self._cpfs_vistos = set()
+
+    def _ignorar(self, motivo):
+        self.ignoradas[motivo] = self.ignoradas.get(motivo, 0) + 1
+
+    def _filtrar_lote(self, linhas):
+        validas = []
+        for linha in linhas:
+            dados, erro = validar(linha, gerar_senha=self._relatorio_senhas is not None)
+            if erro:
+                self._ignorar(erro)
+                if isinstance(linha, LinhaInvalida):
+                    self.linhas_invalidas.append(linha.numero)
+                continue
+            if dados['email'] in self._emails_vistos or dados['cpf'] in self._cpfs_vistos:
+                self._ignorar('repetido no arquivo')
+                continue
+            self._emails_vistos.add(dados['email'])
+            self._cpfs_vistos.add(dados['cpf'])
+            validas.append(dados)
+
+        if not validas:
+            return []
+
+        emails, cpfs = _ja_cadastrados([d['email'] for d in validas], [d['cpf'] for d in validas])
+        novas = []
+        for dados in validas:
+            if dados['email'] in emails or dados['cpf'] in cpfs:
+                self._ignorar('já cadastrado')
+            else:
+                novas.append(dados)
+        return novas
+
+    def _gravar_lote(self, novas, hashes):
+        registros = [
+            {
+                'nome': dados['nome'],
+                'email': dados['email'],
+                'cpf': dados['cpf'],
+                'telefone': dados['telefone'],
+                'senha_hash': senha_hash,
+                'tipo_usuario': 'CLIENTE'
+            }
+            for dados, senha_hash in zip(novas, hashes)
+        ]
+        # Uma lista de dicionários vira um único executemany no banco
+        db.session.execute(Usuario.__table__.insert(), registros)
+        db.session.commit()
+        self.inseridas += len(registros)
+
+        geradas = [(dados['email'], dados['senha']) for dados in novas if dados['senha_gerada']]
+        if geradas:
+            self._relatorio_senhas.writerows(geradas)
+            self.senhas_geradas += len(geradas)
+
+    def importar(self, linhas):
+        inicio = time.perf_counter()
+        linhas = iter(linhas)
+        gerar_hash = partial(generate_password_hash, method=current_app.config['SENHAS_METODO'])
+
+        with ProcessPoolExecutor(max_workers=self.processos, mp_context=contexto_processos()) as processos:
+            while True:
+                lote = list(islice(linhas, self.tamanho_lote))
+                if not lote:
+                    break
+                self.lidas += len(lote)
+
+                novas = self._filtrar_lote(lote)
+                if novas:
+                    pedaco = max(1, len(novas) // (self.processos * 4))
+                    hashes = list(processos.map(gerar_hash, [d['senha'] for d in novas], chunksize=pedaco))
+                    self._gravar_lote(novas, hashes)
+
+                decorrido = time.perf_counter() - inicio
+                self.mostrar(
+                    f'{self.lidas} linhas lidas | {self.inseridas} inseridas | '
+                    f'{sum(self.ignoradas.values())} ignoradas | {self.lidas / decorrido:.0f} linhas/s'
+                )
+
+        return time.perf_counter() - inicio
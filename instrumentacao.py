@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Limites (em segundos) das faixas do histograma de duração das requisições
+FAIXAS_DURACAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Instrumentacao:
+    """
+    Mede cada requisição: quantas consultas SQL fez, quanto tempo passou no banco
+    e quanto tempo levou no total. Os números vão no cabeçalho Server-Timing
+    (aparecem na aba Rede do navegador) e são somados para a rota /metrics.
+    Consultas mais lentas que SQL_LENTA_MS são registradas no log com a rota que as fez.
+    Os totais são do processo: com vários workers, cada um tem os seus.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.zerar()
+
+    def zerar(self):
+        with self._trava:
+            # (endpoint, método, status) -> [quantidade, segundos, consultas, segundos no banco, faixas...]
+            self._rotas = {}
+            self._consultas_lentas = 0
+            self._consultas_fora = 0
+
+    def init_app(self, app):
+        app.before_request(self._iniciar_requisicao)
+        app.after_request(self._terminar_requisicao)
+
+    # ---------- banco (vale para todas as engines, inclusive réplicas) ----------
+
+    def antes_da_consulta(self, conexao, cursor, sql, parametros, contexto, varios):
+        conexao.info.setdefault('inicio_consulta', []).append(time.perf_counter())
+
+    def depois_da_consulta(self, conexao, cursor, sql, parametros, contexto, varios):
+        inicios = conexao.info.get('inicio_consulta')
+        if not inicios:
+            return
+        duracao = time.perf_counter() - inicios.pop()
+
+        medicao = g.get('_medicao') if has_request_context() else None
+        if medicao is not None:
+            medicao['consultas'] += 1
+            medicao['banco'] += duracao
+        else:
+            with self._trava:
+                self._consultas_fora += 1
+
+        limite = current_app.config.get('SQL_LENTA_MS', 200) if has_app_context() else 200
+        if limite and duracao * 1000 >= limite:
+            with self._trava:
+                self._consultas_lentas += 1
+            origem = f'{request.method} {request.path}' if has_request_context() else 'fora de requisição'
+            registro = current_app.logger if has_app_context() else logging.getLogger(__name__)
+            registro.warning(
+                'Consulta lenta (%.1f ms) em %s: %s', duracao * 1000, origem, ' '.join(sql.split())[:1000]
+            )
+
+    def erro_na_consulta(self, contexto):
+        # A consulta falhou: o after_cursor_execute não vai acontecer
+        if contexto.connection is not None and contexto.connection.info.get('inicio_consulta'):
+            contexto.connection.info['inicio_consulta'].pop()
+
+    # ---------- requisição ----------
+
+    def _iniciar_requisicao(self):
+        g._medicao = {'inicio': time.perf_counter(), 'consultas': 0, 'banco': 0.0}
+
+    def _terminar_requisicao(self, resposta):
+        medicao = g.pop('_medicao', None)
+        if medicao is None:
+            return resposta
+        total = time.perf_counter() - medicao['inicio']
+
+        # Em respostas enviadas aos poucos (streaming) o tempo é só até o início do envio
+        resposta.headers.add(
+            'Server-Timing',
+            f'db;dur={medicao["banco"] * 1000:.1f};desc="{medicao["consultas"]} consultas", '
+            f'app;dur={(total - medicao["banco"]) * 1000:.1f}, total;dur={total * 1000:.1f}'
+        )
+
+        chave = (request.endpoint or 'desconhecido', request.method, resposta.status_code)
+        with self._trava:
+            linha = self._rotas.setdefault(chave, [0, 0.0, 0, 0.0] + [0] * len(FAIXAS_DURACAO))
+            linha[0] += 1
+            linha[1] += total
+            linha[2] += medicao['consultas']
+            linha[3] += medicao['banco']
+            for posicao, limite in enumerate(FAIXAS_DURACAO):
+                if total <= limite:
+                    linha[4 + posicao] += 1
+        return resposta
+
+    # ---------- exportação ----------
+
+    def metricas_prometheus(self, extras=()):
+        """
+        Texto no formato do Prometheus (text/plain; version=0.0.4).
+        'extras' é uma lista de (nome, tipo, ajuda, valor) com números de outros módulos.
+        """
+        with self._trava:
+            rotas = {chave: list(linha) for chave, linha in self._rotas.items()}
+            lentas = self._consultas_lentas
+            fora = self._consultas_fora
+
+        linhas = []
+
+        def cabecalho(nome, tipo, ajuda):
+            linhas.append(f'# HELP {nome} {ajuda}')
+            linhas.append(f'# TYPE {nome} {tipo}')
+
+        def rotulos(endpoint, metodo, status, **outros):
+            pares = dict(endpoint=endpoint, method=metodo, status=status, **outros)
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pares.items()) + '}'
+
+        cabecalho('http_requisicao_duracao_segundos', 'histogram', 'Duração das requisições por rota.')
+        for (endpoint, metodo, status), linha in sorted(rotas.items()):
+            for posicao, limite in enumerate(FAIXAS_DURACAO):
+                linhas.append(f'http_requisicao_duracao_segundos_bucket{rotulos(endpoint, metodo, status, le=limite)} {linha[4 + posicao]}')
+            linhas.append(f'http_requisicao_duracao_segundos_bucket{rotulos(endpoint, metodo, status, le="+Inf")} {linha[0]}')
+            linhas.append(f'http_requisicao_duracao_segundos_sum{rotulos(endpoint, metodo, status)} {linha[1]:.6f}')
+            linhas.append(f'http_requisicao_duracao_segundos_count{rotulos(endpoint, metodo, status)} {linha[0]}')
+
+        cabecalho('http_requisicao_consultas_total', 'counter', 'Consultas SQL feitas pelas requisições de cada rota.')
+        for (endpoint, metodo, status), linha in sorted(rotas.items()):
+            linhas.append(f'http_requisicao_consultas_total{rotulos(endpoint, metodo, status)} {linha[2]}')
+
+        cabecalho('http_requisicao_banco_segundos_total', 'counter', 'Tempo gasto no banco pelas requisições de cada rota.')
+        for (endpoint, metodo, status), linha in sorted(rotas.items()):
+            linhas.append(f'http_requisicao_banco_segundos_total{rotulos(endpoint, metodo, status)} {linha[3]:.6f}')
+
+        cabecalho('sql_consultas_lentas_total', 'counter', 'Consultas acima de SQL_LENTA_MS.')
+        linhas.append(f'sql_consultas_lentas_total {lentas}')
+        cabecalho('sql_consultas_fora_de_requisicao_total', 'counter', 'Consultas de threads de fundo e comandos.')
+        linhas.append(f'sql_consultas_fora_de_requisicao_total {fora}')
+
+        for nome, tipo, ajuda, valor in extras:
+            cabecalho(nome, tipo, ajuda)
+            linhas.append(f'{nome} {valor}')
+        return '\n'.join(linhas) + '\n'
+
+
+# Instância única usada pela aplicação
+instrumentacao = Instrumentacao()
+
+event.listen(Engine, 'before_cursor_execute', instrumentacao.antes_da_consulta)
+event.listen(Engine, 'after_cursor_execute', instrumentacao.depois_da_consulta)
+event.listen(Engine, 'handle_error', instrumentacao.erro_na_consulta)
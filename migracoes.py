@@ -0,0 +1,101 @@
+from sqlalchemy import func, inspect, select
+from sqlalchemy.schema import CreateIndex
+from models import db, AgregadoDiario, Reserva
+from agregados import reconstruir
+
+# Índices que foram trocados por outros nos modelos: saem depois que o novo existir
+# (ex: o índice comum de registros_ponto virou o único uq_registros_ponto_funcionario_data)
+INDICES_ANTIGOS = {
+    'uq_registros_ponto_funcionario_data': ('registros_ponto', 'ix_registros_ponto_funcionario_data'),
+}
+
+
+def indices_faltando(engine):
+    """Índices declarados nos modelos que ainda não existem no banco."""
+    inspetor = inspect(engine)
+    tabelas = set(inspetor.get_table_names())
+    faltando = []
+    for tabela in db.metadata.sorted_tables:
+        if tabela.name not in tabelas:
+            continue  # a tabela inteira será criada pelo create_all, já com os índices
+        existentes = {indice['name'] for indice in inspetor.get_indexes(tabela.name)}
+        faltando += [indice for indice in sorted(tabela.indexes, key=lambda i: i.name) if indice.name not in existentes]
+    return faltando
+
+
+def comando_indice(indice, dialeto):
+    """
+    SQL para criar o índice. No MySQL usamos ALTER TABLE com ALGORITHM=INPLACE e LOCK=NONE,
+    que monta o índice sem bloquear gravações na tabela (importante em 'reservas' grande).
+    """
+    if dialeto.name == 'mysql':
+        colunas = ', '.join(f'`{coluna.name}`' for coluna in indice.columns)
+        unico = 'UNIQUE ' if indice.unique else ''
+        return (f'ALTER TABLE `{indice.table.name}` ADD {unico}INDEX `{indice.name}` ({colunas}), '
+                f'ALGORITHM=INPLACE, LOCK=NONE')
+    return str(CreateIndex(indice).compile(dialect=dialeto))
+
+
+def duplicados(engine, indice):
+    """Quantos grupos de linhas repetidas impedem a criação do índice único."""
+    colunas = list(indice.columns)
+    grupos = select(*colunas).group_by(*colunas).having(func.count() > 1).subquery()
+    with engine.connect() as conexao:
+        return conexao.execute(select(func.count()).select_from(grupos)).scalar()
+
+
+def comando_remover_indice(tabela, nome, dialeto):
+    if dialeto.name == 'mysql':
+        return f'ALTER TABLE `{tabela}` DROP INDEX `{nome}`, ALGORITHM=INPLACE, LOCK=NONE'
+    if dialeto.name in ('sqlite', 'postgresql'):
+        return f'DROP INDEX {nome}'
+    return f'DROP INDEX {nome} ON {tabela}'
+
+
+def migrar(engine, executar=True, mostrar=print):
+    """
+    Leva um banco já existente até o esquema atual dos modelos:
+    cria as tabelas que faltam e depois os índices que faltam nas tabelas antigas.
+    Se a tabela de agregados é nova num banco que já tinha reservas, ela já sai preenchida
+    (senão a receita do painel ficaria zerada).
+    Com executar=False só mostra os comandos (para um DBA rodar na janela de manutenção).
+    Devolve a lista de comandos.
+    """
+    inspetor = inspect(engine)
+    tabelas_novas = [t.name for t in db.metadata.sorted_tables if t.name not in inspetor.get_table_names()]
+    comandos = []
+    recusados = []
+    for indice in indices_faltando(engine):
+        # Um índice único não pode ser criado sobre linhas repetidas: quem decide o que fica é o RH/DBA
+        if indice.unique and duplicados(engine, indice):
+            recusados.append(indice)
+            continue
+        comandos.append(comando_indice(indice, engine.dialect))
+        antigo = INDICES_ANTIGOS.get(indice.name)
+        if antigo and antigo[1] in {i['name'] for i in inspetor.get_indexes(antigo[0])}:
+            comandos.append(comando_remover_indice(*antigo, engine.dialect))
+
+    if tabelas_novas:
+        mostrar(f"Tabelas novas: {', '.join(tabelas_novas)}")
+    for indice in recusados:
+        colunas = ', '.join(coluna.name for coluna in indice.columns)
+        mostrar(f'{indice.name} não foi criado: há linhas repetidas em {indice.table.name} ({colunas}). '
+                f'Resolva as repetições e rode o migrar de novo.')
+    for comando in comandos:
+        mostrar(f'{comando};')
+    preencher_agregados = (AgregadoDiario.__tablename__ in tabelas_novas
+                           and Reserva.__tablename__ not in tabelas_novas)
+    if preencher_agregados:
+        mostrar(f'{AgregadoDiario.__tablename__} será preenchida a partir das reservas existentes '
+                f'(o mesmo que flask reconstruir-agregados).')
+    if not tabelas_novas and not comandos and not recusados:
+        mostrar('O banco já está atualizado.')
+
+    if executar:
+        db.metadata.create_all(engine)
+        with engine.begin() as conexao:
+            for comando in comandos:
+                conexao.exec_driver_sql(comando)
+            if preencher_agregados:
+                reconstruir(conexao)
+    return comandos
@@ -2,10 +2,12 @@ from datetime import datetime
 from decimal import Decimal, InvalidOperation
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from senhas import servico_senhas
+from replicas import SessaoRoteada
 
 # Inicializamos o SQLAlchemy que cuidará de salvar tudo no banco de dados automaticamente
-db = SQLAlchemy()
+# (a sessão manda as leituras dos relatórios para a réplica, se houver uma: veja replicas.py)
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 
 class Usuario(UserMixin, db.Model):
     """
@@ -13,6 +15,10 @@ class Usuario(UserMixin, db.Model):
     Pode ser o Administrador (Donos), Funcionários ou Clientes.
     """
     __tablename__ = 'usuarios'
+    # Listas por tipo (ex: funcionários ativos na presença e na folha)
+    __table_args__ = (
+        db.Index('ix_usuarios_tipo_ativo', 'tipo_usuario', 'ativo'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
@@ -35,22 +41,30 @@ class Usuario(UserMixin, db.Model):
     def set_senha(self, senha):
         """
         Transforma a senha digitada em um código secreto embaralhado (Hash).
+        O cálculo roda nos processos auxiliares do servico_senhas (veja senhas.py).
         """
-        self.senha_hash = generate_password_hash(senha)
+        self.senha_hash = servico_senhas.gerar_hash(senha)
     
     def verificar_senha(self, senha):
         """
         Verifica se a senha que o usuário digitou confere com o código secreto do banco.
         """
-        return check_password_hash(self.senha_hash, senha)
+        return servico_senhas.verificar(self.senha_hash, senha)
+    
+    def senha_desatualizada(self):
+        """
+        Diz se a hash foi gerada com um método/custo diferente do configurado em SENHAS_METODO.
+        """
+        return servico_senhas.precisa_atualizar(self.senha_hash)
     
     def registrar_visita(self):
         """
         Atualiza a data da última vez que o usuário entrou e aumenta o contador de visitas.
+        A visita fica na memória e é gravada depois, junto com outras, em um UPDATE em lote
+        (veja visitas.py). Use acumulador_visitas.total_visitas(usuario) para ler o número atualizado.
         """
-        self.ultima_visita = datetime.utcnow()
-        self.total_visitas += 1
-        db.session.commit()
+        from visitas import acumulador_visitas
+        acumulador_visitas.registrar(self.id)
     
     # Funções de ajuda para saber o tipo do usuário rapidamente
     def is_admin(self):
@@ -86,6 +100,13 @@ class Reserva(db.Model):
     Representa uma vaga de garagem ou um quarto de hotel reservado.
     """
     __tablename__ = 'reservas'
+    # Índices para os filtros mais usados: reservas de um cliente por data,
+    # contagem por status e buscas por período (exportação, agregados, disponibilidade)
+    __table_args__ = (
+        db.Index('ix_reservas_cliente_data', 'cliente_id', 'data_entrada'),
+        db.Index('ix_reservas_status_tipo', 'status', 'tipo_servico'),
+        db.Index('ix_reservas_data_entrada', 'data_entrada'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     cliente_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
@@ -155,6 +176,12 @@ class RegistroPonto(db.Model):
     Cofre de registros de entrada e saída dos funcionários para o RH.
     """
     __tablename__ = 'registros_ponto'
+    # Ponto de um funcionário em um dia (bater ponto, presença) e o mês de todos (folha).
+    # Único: um registro por funcionário por dia, mesmo com duas batidas ao mesmo tempo
+    __table_args__ = (
+        db.Index('uq_registros_ponto_funcionario_data', 'funcionario_id', 'data', unique=True),
+        db.Index('ix_registros_ponto_data', 'data'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     funcionario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
@@ -191,11 +218,30 @@ class RegistroPonto(db.Model):
         return f'<RegistroPonto {self.funcionario.nome} - {self.data}>'
 
 
+class TravaRecurso(db.Model):
+    """
+    Uma linha por quarto/vaga, usada só como trava: quem vai reservar o quarto atualiza
+    a linha dele e, até o commit, outra reserva do mesmo quarto espera (veja disponibilidade.py).
+    """
+    __tablename__ = 'travas_recursos'
+    
+    tipo_servico = db.Column(db.Enum('HOTEL', 'GARAGEM'), primary_key=True)
+    numero = db.Column(db.String(10), primary_key=True)
+    usos = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<TravaRecurso {self.tipo_servico} {self.numero}>'
+
+
 class Promocao(db.Model):
     """
     Configurações de descontos especiais (ex: Natal, Cliente Fiel).
     """
     __tablename__ = 'promocoes'
+    # Promoções ativas dentro do prazo
+    __table_args__ = (
+        db.Index('ix_promocoes_ativa_periodo', 'ativa', 'data_inicio', 'data_fim'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100), nullable=False)
@@ -229,3 +275,70 @@ class Promocao(db.Model):
     
     def __repr__(self):
         return f'<Promocao {self.nome} - {self.desconto_percentual}%>'
+
+
+class AgregadoDiario(db.Model):
+    """
+    Resumo das reservas de um dia por tipo de serviço (pelo dia da data de entrada).
+    É atualizado junto com cada reserva (veja agregados.py), então os relatórios
+    de receita não precisam somar a tabela de reservas inteira.
+    """
+    __tablename__ = 'agregados_diarios'
+    
+    dia = db.Column(db.Date, primary_key=True)
+    tipo_servico = db.Column(db.Enum('HOTEL', 'GARAGEM'), primary_key=True)
+    reservas = db.Column(db.Integer, nullable=False, default=0)
+    finalizadas = db.Column(db.Integer, nullable=False, default=0)
+    canceladas = db.Column(db.Integer, nullable=False, default=0)
+    # Soma do valor_final das reservas FINALIZADAS
+    receita = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    # Soma do desconto_percentual de todas as reservas (dividida por 'reservas' dá a média)
+    soma_descontos = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<AgregadoDiario {self.dia} - {self.tipo_servico}>'
+
+
+class Tarefa(db.Model):
+    """
+    Trabalho para depois da resposta (ex: e-mails), gravado no banco
+    para não se perder se o servidor cair. Quem executa é o `flask worker` (veja tarefas.py).
+    """
+    __tablename__ = 'tarefas'
+    __table_args__ = (
+        # Próximas tarefas a executar
+        db.Index('ix_tarefas_status_executar_em', 'status', 'executar_em'),
+        # A mesma chave nunca entra duas vezes na fila (ex: 'email-reserva:42')
+        db.Index('uq_tarefas_chave', 'chave', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(80), nullable=False)
+    dados = db.Column(db.Text, nullable=False, default='{}')  # JSON com os argumentos
+    chave = db.Column(db.String(120), nullable=True)
+    status = db.Column(db.Enum('PENDENTE', 'EXECUTANDO', 'CONCLUIDA', 'FALHOU'), nullable=False, default='PENDENTE')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=5)
+    executar_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Qual trabalhador pegou a tarefa e quando (se ele morrer, outro pega depois de TAREFAS_TEMPO_LIMITE)
+    travada_por = db.Column(db.String(80), nullable=True)
+    travada_em = db.Column(db.DateTime, nullable=True)
+    ultimo_erro = db.Column(db.Text, nullable=True)
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    concluida_em = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'nome': self.nome,
+            'chave': self.chave,
+            'status': self.status,
+            'tentativas': self.tentativas,
+            'executar_em': self.executar_em.isoformat() if self.executar_em else None,
+            'ultimo_erro': self.ultimo_erro,
+            'criada_em': self.criada_em.isoformat() if self.criada_em else None,
+            'concluida_em': self.concluida_em.isoformat() if self.concluida_em else None
+        }
+    
+    def __repr__(self):
+        return f'<Tarefa {self.id} - {self.nome} - {self.status}>'
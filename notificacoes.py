@@ -0,0 +1,127 @@
+import json
+import queue
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from models import Usuario, Reserva, RegistroPonto, Promocao
+from eventos import ao_confirmar
+
+
+class Assinatura:
+    """Fila de avisos de um navegador conectado (tamanho limitado)."""
+
+    def __init__(self, canais, tamanho):
+        self.canais = canais
+        self.fila = queue.Queue(maxsize=tamanho)
+
+    def entregar(self, mensagem):
+        try:
+            self.fila.put_nowait(mensagem)
+        except queue.Full:
+            # Navegador lento: descartamos o aviso mais antigo para não travar quem publica
+            try:
+                self.fila.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self.fila.put_nowait(mensagem)
+            except queue.Full:
+                pass
+
+
+class CentralNotificacoes:
+    """
+    Publica/assina dentro do próprio processo.
+    Cada navegador conectado em /api/eventos vira uma Assinatura em um ou mais canais
+    (ex: 'admin', 'funcionario', 'usuario:7').
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._assinaturas = set()
+
+    def assinar(self, canais, tamanho=100):
+        assinatura = Assinatura(set(canais), tamanho)
+        with self._trava:
+            self._assinaturas.add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura):
+        with self._trava:
+            self._assinaturas.discard(assinatura)
+
+    def publicar(self, canais, evento, dados):
+        """Envia o evento para todas as assinaturas de qualquer um dos canais."""
+        mensagem = formatar_sse(evento, dados)
+        canais = set(canais)
+        with self._trava:
+            destinatarios = [a for a in self._assinaturas if a.canais & canais]
+        for assinatura in destinatarios:
+            assinatura.entregar(mensagem)
+
+    def total_assinaturas(self):
+        with self._trava:
+            return len(self._assinaturas)
+
+
+# Instância única usada pela aplicação
+central = CentralNotificacoes()
+
+
+def _para_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f'Tipo não suportado: {type(valor).__name__}')
+
+
+def formatar_sse(evento, dados):
+    """Monta uma mensagem no formato Server-Sent Events."""
+    return f'event: {evento}\ndata: {json.dumps(dados, default=_para_json, ensure_ascii=False)}\n\n'
+
+
+def canais_do_usuario(usuario):
+    """Canais que um usuário logado pode ouvir."""
+    papel = 'admin' if usuario.is_admin() else 'funcionario' if usuario.is_funcionario() else 'cliente'
+    return [papel, f'usuario:{usuario.id}']
+
+
+def _delta(alteracao, campos):
+    """Só os campos que interessam ao navegador (nada de senha, por exemplo)."""
+    dados = {campo: alteracao.valores.get(campo) for campo in campos}
+    dados['acao'] = alteracao.acao
+    return dados
+
+
+@ao_confirmar(Reserva)
+def _avisar_reservas(alteracoes):
+    for alteracao in alteracoes:
+        dados = _delta(alteracao, ('id', 'cliente_id', 'tipo_servico', 'status', 'data_entrada', 'data_saida_prevista'))
+        canais = ['admin', 'funcionario']
+        if dados['cliente_id']:
+            canais.append(f"usuario:{dados['cliente_id']}")
+        central.publicar(canais, 'reserva', dados)
+
+
+@ao_confirmar(RegistroPonto)
+def _avisar_pontos(alteracoes):
+    for alteracao in alteracoes:
+        dados = _delta(alteracao, ('id', 'funcionario_id', 'data', 'hora_entrada', 'hora_saida', 'total_horas'))
+        central.publicar(['admin', f"usuario:{dados['funcionario_id']}"], 'ponto', dados)
+
+
+@ao_confirmar(Promocao)
+def _avisar_promocoes(alteracoes):
+    for alteracao in alteracoes:
+        dados = _delta(alteracao, ('id', 'nome', 'ativa', 'data_inicio', 'data_fim'))
+        central.publicar(['admin', 'funcionario', 'cliente'], 'promocao', dados)
+
+
+@ao_confirmar(Usuario)
+def _avisar_usuarios(alteracoes):
+    for alteracao in alteracoes:
+        # Logins mexem só nos contadores de visita: isso não muda o painel
+        if alteracao.acao == 'alterado' and set(alteracao.anteriores) <= {'ultima_visita', 'total_visitas'}:
+            continue
+        central.publicar(['admin'], 'usuario', _delta(alteracao, ('id', 'tipo_usuario', 'ativo')))
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import Numeric, and_, cast, func, insert, literal_column, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models import db, RegistroPonto
+from eventos import DESCONHECIDO, registrar_alteracao
+
+CAMPOS = ('id', 'hora_entrada', 'hora_saida', 'total_horas')
+
+
+def horas_entre(dialeto, entrada, saida):
+    """Expressão SQL com as horas (2 casas) entre a coluna 'entrada' e o momento 'saida'."""
+    if dialeto == 'sqlite':
+        return func.round((func.julianday(saida) - func.julianday(entrada)) * 24, 2)
+    if dialeto == 'mysql':
+        return func.round(func.timestampdiff(literal_column('SECOND'), entrada, saida) / 3600, 2)
+    if dialeto == 'postgresql':
+        return func.round(cast(func.extract('epoch', saida - entrada) / 3600, Numeric), 2)
+    return None
+
+
+def consulta_do_dia(funcionario_id, dia):
+    """O ponto do funcionário no dia (no máximo um, pela chave única)."""
+    tabela = RegistroPonto.__table__
+    return select(*(tabela.c[c] for c in CAMPOS)).where(tabela.c.funcionario_id == funcionario_id, tabela.c.data == dia)
+
+
+def bater_ponto(funcionario_id, agora=None):
+    """
+    Registra a entrada (primeira batida do dia) ou a saída (segunda) do funcionário,
+    de forma atômica: a linha única por (funcionario_id, data) garante que duas batidas
+    ao mesmo tempo nunca criam dois pontos no mesmo dia. As horas são calculadas pelo banco.
+    Batidas repetidas em menos de PONTO_INTERVALO_MINIMO segundos (dedo duplo no relógio)
+    não fecham o ponto.
+
+    Devolve (tipo, registro) com tipo 'entrada', 'saida', 'repetido' ou 'completo'
+    e registro = {id, hora_entrada, hora_saida, total_horas}. Quem chama faz o commit.
+    """
+    agora = agora or datetime.utcnow()
+    dialeto = db.session.get_bind().dialect.name
+    if dialeto == 'mysql':
+        # DATETIME do MySQL guarda só segundos: comparamos com o que vai ficar gravado
+        agora = agora.replace(microsecond=0)
+    hoje = agora.date()
+    tabela = RegistroPonto.__table__
+    limite = agora - timedelta(seconds=current_app.config.get('PONTO_INTERVALO_MINIMO', 60))
+    pode_sair = and_(tabela.c.hora_saida.is_(None), tabela.c.hora_entrada <= limite)
+    horas = horas_entre(dialeto, tabela.c.hora_entrada, agora)
+
+    if dialeto in ('sqlite', 'postgresql') and horas is not None:
+        tipo, registro = _upsert(dialeto, tabela, funcionario_id, hoje, agora, pode_sair, horas)
+    else:
+        tipo, registro = _atualizar_ou_inserir(tabela, funcionario_id, hoje, agora, pode_sair, horas)
+
+    if tipo is None:
+        registro = db.session.execute(consulta_do_dia(funcionario_id, hoje)).mappings().one()
+        return ('completo' if registro['hora_saida'] else 'repetido'), dict(registro)
+
+    # Os avisos de ao_confirmar (painel, estatísticas) saem depois do commit, como num save do ORM
+    valores = dict(registro, funcionario_id=funcionario_id, data=hoje)
+    if tipo == 'entrada':
+        registrar_alteracao(db.session, 'criado', RegistroPonto, registro['id'], valores)
+    else:
+        registrar_alteracao(db.session, 'alterado', RegistroPonto, registro['id'], valores,
+                            {'hora_saida': None, 'total_horas': DESCONHECIDO})
+    return tipo, registro
+
+
+def _upsert(dialeto, tabela, funcionario_id, hoje, agora, pode_sair, horas):
+    """Um único comando: INSERT ... ON CONFLICT DO UPDATE (só se o ponto estiver aberto) ... RETURNING."""
+    comando = (sqlite if dialeto == 'sqlite' else postgresql).insert(tabela).values(
+        funcionario_id=funcionario_id, data=hoje, hora_entrada=agora
+    )
+    comando = comando.on_conflict_do_update(
+        index_elements=['funcionario_id', 'data'],
+        set_={'hora_saida': agora, 'total_horas': horas},
+        where=pode_sair
+    ).returning(*(tabela.c[c] for c in CAMPOS))
+
+    linha = db.session.execute(comando).mappings().first()
+    if linha is None:
+        # Conflito e a condição do UPDATE não valeu: nada mudou
+        return None, None
+    registro = dict(linha)
+    if registro['total_horas'] is not None:
+        registro['total_horas'] = Decimal(str(registro['total_horas'])).quantize(Decimal('0.01'))
+    return ('saida' if registro['hora_saida'] else 'entrada'), registro
+
+
+def _atualizar_ou_inserir(tabela, funcionario_id, hoje, agora, pode_sair, horas):
+    """
+    Bancos sem RETURNING no upsert (ex: MySQL): fecha o ponto aberto com um UPDATE;
+    se não havia ponto aberto, tenta o INSERT e a chave única recusa o segundo do dia.
+    """
+    filtro = and_(tabela.c.funcionario_id == funcionario_id, tabela.c.data == hoje)
+    if horas is None:
+        # Banco sem função de datas conhecida: as horas vêm do Python
+        entrada = db.session.execute(select(tabela.c.hora_entrada).where(filtro, pode_sair)).scalar()
+        horas = (Decimal(str((agora - entrada).total_seconds())) / 3600).quantize(Decimal('0.01')) if entrada else None
+
+    if horas is not None:
+        fechados = db.session.execute(
+            update(tabela).where(filtro, pode_sair).values(hora_saida=agora, total_horas=horas)
+        ).rowcount
+        if fechados:
+            registro = db.session.execute(consulta_do_dia(funcionario_id, hoje)).mappings().one()
+            return 'saida', dict(registro)
+
+    try:
+        # SAVEPOINT: o INSERT recusado não pode desfazer o resto da transação
+        with db.session.begin_nested():
+            resultado = db.session.execute(insert(tabela).values(funcionario_id=funcionario_id, data=hoje, hora_entrada=agora))
+    except IntegrityError:
+        return None, None
+    return 'entrada', {'id': resultado.inserted_primary_key[0], 'hora_entrada': agora, 'hora_saida': None, 'total_horas': None}
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select
+from models import db, Promocao
+from eventos import ao_confirmar
+from visitas import acumulador_visitas
+
+# Os períodos das promoções incluem o último instante (data_fim), por isso
+# cada intervalo é guardado como [data_inicio, data_fim + 1 microssegundo)
+_UM_INSTANTE = timedelta(microseconds=1)
+
+TIPOS_SERVICO = ('HOTEL', 'GARAGEM')
+
+
+class _IndiceIntervalos:
+    """
+    Divide a linha do tempo nos pontos em que alguma promoção começa ou termina.
+    Em cada pedaço guardamos as promoções vigentes ordenadas por minimo_visitas
+    e, para cada posição, qual é a de maior desconto até ali.
+    Assim uma consulta é só duas buscas binárias.
+    """
+
+    def __init__(self, promocoes):
+        pontos = sorted({p['data_inicio'] for p in promocoes} | {p['data_fim'] + _UM_INSTANTE for p in promocoes})
+        self.pontos = pontos
+        self.trechos = []
+
+        for i, inicio in enumerate(pontos):
+            vigentes = sorted(
+                (p for p in promocoes if p['data_inicio'] <= inicio <= p['data_fim']),
+                key=lambda p: (p['minimo_visitas'] or 0, p['id'])
+            )
+            minimos = [p['minimo_visitas'] or 0 for p in vigentes]
+
+            melhores = []
+            for p in vigentes:
+                if not melhores or p['desconto_percentual'] > melhores[-1]['desconto_percentual']:
+                    melhores.append(p)
+                else:
+                    melhores.append(melhores[-1])
+
+            self.trechos.append((minimos, vigentes, melhores))
+
+    def _trecho(self, momento):
+        posicao = bisect_right(self.pontos, momento) - 1
+        if posicao < 0:
+            return [], [], []
+        return self.trechos[posicao]
+
+    def vigentes(self, momento, visitas=None):
+        """Promoções válidas no momento (e, se informado, liberadas para esse número de visitas)."""
+        minimos, vigentes, melhores = self._trecho(momento)
+        if visitas is None:
+            return list(vigentes)
+        return vigentes[:bisect_right(minimos, visitas)]
+
+    def assinatura(self, momento, visitas=None):
+        """(trecho, quantidade) que identificam a resposta de vigentes(momento, visitas)."""
+        posicao = bisect_right(self.pontos, momento) - 1
+        if posicao < 0:
+            return posicao, 0
+        minimos = self.trechos[posicao][0]
+        quantidade = len(minimos) if visitas is None else bisect_right(minimos, visitas)
+        return posicao, quantidade
+
+    def melhor(self, momento, visitas):
+        """A promoção de maior desconto válida no momento para esse número de visitas."""
+        minimos, vigentes, melhores = self._trecho(momento)
+        quantidade = bisect_right(minimos, visitas)
+        return melhores[quantidade - 1] if quantidade else None
+
+
+def consulta_ativas():
+    """As promoções ligadas, que o MotorPromocoes guarda na memória."""
+    return select(Promocao).where(Promocao.ativa == True).order_by(Promocao.id)
+
+
+class MotorPromocoes:
+    """
+    Mantém as promoções ativas na memória com um índice de intervalos por tipo de serviço.
+    O índice é recriado quando alguma Promocao é salva (ou depois de PROMOCOES_RECARREGAR segundos,
+    para enxergar alterações feitas por outros processos).
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._geracao = 0
+        self._versao = None
+        self.invalidar()
+
+    def invalidar(self):
+        """Faz a próxima consulta recarregar as promoções do banco."""
+        self._geracao += 1
+        self._validade = 0
+
+    def _indices(self):
+        with self._trava:
+            if time.monotonic() >= self._validade:
+                self._recarregar()
+            return self._ativas, self._por_tipo, self._versao
+
+    def _recarregar(self):
+        geracao = self._geracao
+        promocoes = []
+        for p in db.session.scalars(consulta_ativas()):
+            dados = p.to_dict()
+            # Para o índice usamos os valores originais (datas e números), não o texto do JSON
+            dados.update(data_inicio=p.data_inicio, data_fim=p.data_fim, minimo_visitas=p.minimo_visitas or 0)
+            promocoes.append(dados)
+
+        # A versão é um resumo do conteúdo: igual em todos os processos que leram as mesmas promoções
+        self._versao = hashlib.sha1(json.dumps(promocoes, default=str, sort_keys=True).encode()).hexdigest()[:16]
+
+        self._ativas = promocoes
+        self._por_tipo = {
+            'TODOS': _IndiceIntervalos(promocoes),
+            **{
+                tipo: _IndiceIntervalos([p for p in promocoes if p['tipo_servico'] in (tipo, 'AMBOS')])
+                for tipo in TIPOS_SERVICO
+            }
+        }
+        # Se alguém alterou uma promoção enquanto líamos, recarregamos de novo na próxima vez
+        if geracao == self._geracao:
+            self._validade = time.monotonic() + current_app.config.get('PROMOCOES_RECARREGAR', 60)
+
+    def ativas(self):
+        """Todas as promoções ligadas (ativa=True), estejam ou não no prazo."""
+        ativas, _, _ = self._indices()
+        return [_para_json(p) for p in ativas]
+
+    def vigentes(self, momento=None, visitas=None, tipo_servico=None):
+        """Promoções ligadas e dentro do prazo, opcionalmente filtradas por visitas e serviço."""
+        _, por_tipo, _ = self._indices()
+        indice = por_tipo.get(tipo_servico or 'TODOS')
+        if indice is None:
+            return []
+        return [_para_json(p) for p in indice.vigentes(momento or datetime.utcnow(), visitas)]
+
+    def melhor_promocao(self, tipo_servico, visitas, momento=None):
+        """Maior desconto aplicável para esse serviço, número de visitas e momento (ou None)."""
+        _, por_tipo, _ = self._indices()
+        indice = por_tipo.get(tipo_servico)
+        if indice is None:
+            return None
+        promocao = indice.melhor(momento or datetime.utcnow(), visitas or 0)
+        return _para_json(promocao) if promocao else None
+
+    def versao(self):
+        """Versão das promoções ativas, para o ETag de ativas()."""
+        return self._indices()[2]
+
+    def versao_vigentes(self, momento=None, visitas=None, tipo_servico=None):
+        """
+        Versão da resposta de vigentes() com os mesmos parâmetros, sem montar a lista:
+        muda quando alguma promoção é salva, quando uma começa ou termina e quando
+        o cliente passa a ter visitas para mais uma.
+        """
+        _, por_tipo, versao = self._indices()
+        indice = por_tipo.get(tipo_servico or 'TODOS')
+        if indice is None:
+            return versao
+        trecho, quantidade = indice.assinatura(momento or datetime.utcnow(), visitas)
+        return f'{versao}-{trecho}-{quantidade}'
+
+
+def _para_json(promocao):
+    """Cópia da promoção no mesmo formato de Promocao.to_dict()."""
+    dados = dict(promocao)
+    dados['data_inicio'] = promocao['data_inicio'].isoformat()
+    dados['data_fim'] = promocao['data_fim'].isoformat()
+    return dados
+
+
+# Instância única usada pela aplicação
+motor_promocoes = MotorPromocoes()
+
+
+def aplicar_melhor_promocao(reserva, cliente):
+    """
+    Procura a melhor promoção para a reserva e já calcula o valor final com ela.
+    Devolve a promoção aplicada (ou None se nenhuma servir).
+    """
+    momento = reserva.data_entrada or datetime.utcnow()
+    visitas = acumulador_visitas.total_visitas(cliente)
+    promocao = motor_promocoes.melhor_promocao(reserva.tipo_servico, visitas, momento)
+
+    if promocao:
+        reserva.desconto_percentual = promocao['desconto_percentual']
+        nota = f"Promoção aplicada: {promocao['nome']}"
+        reserva.observacoes = f"{reserva.observacoes}\n{nota}" if reserva.observacoes else nota
+    else:
+        reserva.desconto_percentual = 0
+
+    reserva.calcular_valor_final()
+    return promocao
+
+
+@ao_confirmar(Promocao)
+def _promocao_alterada(alteracoes):
+    motor_promocoes.invalidar()
@@ -0,0 +1,134 @@
+import contextvars
+import threading
+import time
+from flask import current_app, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+BIND_REPLICA = 'replica'
+
+# Rotas marcadas com @leitura_na_replica (pelo nome do endpoint)
+_endpoints_replica = set()
+# Para uso fora de requisições (ex: comandos de exportação): with usando_replica(): ...
+_forcar_replica = contextvars.ContextVar('forcar_replica', default=False)
+
+
+def leitura_na_replica(funcao):
+    """
+    Marca uma rota só de leitura (relatórios, painéis) para consultar a réplica.
+    Vale também para o que a rota enviar aos poucos (stream_with_context).
+    Use embaixo do @app.route.
+    """
+    _endpoints_replica.add(funcao.__name__)
+    return funcao
+
+
+class usando_replica:
+    """Bloco em que as leituras vão para a réplica: with usando_replica(): ..."""
+
+    def __enter__(self):
+        self._token = _forcar_replica.set(True)
+        return self
+
+    def __exit__(self, *erro):
+        _forcar_replica.reset(self._token)
+
+
+class RoteadorReplica:
+    """
+    Decide se uma leitura pode ir para a réplica (bind 'replica' em SQLALCHEMY_BINDS).
+    A réplica é testada de REPLICA_VERIFICAR em REPLICA_VERIFICAR segundos: se não responder,
+    ou estiver mais de REPLICA_ATRASO_MAXIMO segundos atrás do primário, as leituras
+    voltam para o primário até o próximo teste dar certo.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._estado = {}  # engine -> (disponivel, validade)
+        self.zerar_metricas()
+
+    def zerar_metricas(self):
+        self._metricas = {'leituras_replica': 0, 'leituras_primario': 0, 'falhas_replica': 0}
+
+    def limpar(self):
+        with self._trava:
+            self._estado.clear()
+
+    def deve_usar(self):
+        if _forcar_replica.get():
+            return True
+        return has_request_context() and request.endpoint in _endpoints_replica
+
+    def medir_atraso(self, conexao):
+        """
+        Segundos de atraso da réplica. Só o MySQL informa; None = replicação parada
+        ou atraso desconhecido (aí as leituras ficam no primário).
+        """
+        if conexao.dialect.name != 'mysql':
+            return 0
+        for comando, coluna in (('SHOW REPLICA STATUS', 'Seconds_Behind_Source'),
+                                ('SHOW SLAVE STATUS', 'Seconds_Behind_Master')):
+            try:
+                linha = conexao.exec_driver_sql(comando).mappings().first()
+            except Exception:
+                continue  # versão do MySQL sem esse comando: tentamos o nome antigo
+            # Sem linha: o servidor não é uma réplica (ex: mesmo banco nos dois binds)
+            return linha[coluna] if linha else 0
+        # Nenhum dos comandos funcionou (ex: usuário sem permissão REPLICATION CLIENT)
+        return None
+
+    def disponivel(self, engine):
+        agora = time.monotonic()
+        with self._trava:
+            estado = self._estado.get(engine)
+            if estado and estado[1] > agora:
+                return estado[0]
+
+        try:
+            with engine.connect() as conexao:
+                conexao.exec_driver_sql('SELECT 1')
+                atraso = self.medir_atraso(conexao)
+            limite = current_app.config.get('REPLICA_ATRASO_MAXIMO', 30)
+            ok = atraso is not None and atraso <= limite
+        except Exception as erro:
+            current_app.logger.warning('Réplica indisponível, lendo do primário: %s', erro)
+            ok = False
+
+        with self._trava:
+            if not ok:
+                self._metricas['falhas_replica'] += 1
+            self._estado[engine] = (ok, agora + current_app.config.get('REPLICA_VERIFICAR', 5))
+        return ok
+
+    def escolher(self, engines):
+        """Engine da réplica, ou None para seguir com o primário."""
+        replica = engines.get(BIND_REPLICA)
+        usar = replica is not None and self.disponivel(replica)
+        with self._trava:
+            self._metricas['leituras_replica' if usar else 'leituras_primario'] += 1
+        return replica if usar else None
+
+    def metricas(self):
+        with self._trava:
+            return dict(self._metricas)
+
+
+# Instância única usada pela aplicação
+roteador_replica = RoteadorReplica()
+
+
+class SessaoRoteada(Session):
+    """
+    Sessão do Flask-SQLAlchemy que manda as leituras das rotas marcadas para a réplica.
+    Gravações (flush, INSERT/UPDATE/DELETE) sempre vão para o primário.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # Com objetos novos/alterados/removidos na sessão, é um flush (ou vem um logo antes da leitura)
+        pendente = bool(self.new or self.dirty or self.deleted)
+        if (bind is None and not pendente and not isinstance(clause, UpdateBase)
+                and has_app_context() and roteador_replica.deve_usar()):
+            replica = roteador_replica.escolher(self._db.engines)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
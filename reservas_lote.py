@@ -0,0 +1,125 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from models import db, Usuario, Reserva
+from promocoes import aplicar_melhor_promocao
+from disponibilidade import verificar_reservas
+
+
+class LoteInvalido(ValueError):
+    """O pedido inteiro está errado (ex: não é uma lista): nenhuma reserva é olhada."""
+
+
+# Erro dos itens certos que não foram gravados porque outro item do lote atômico falhou
+NAO_GRAVADA = 'não gravada: o lote tem itens com erro'
+
+
+def _decimal(valor, campo, maximo=None):
+    try:
+        numero = Decimal(str(valor))
+    except (InvalidOperation, TypeError):
+        raise ValueError(f'{campo} inválido')
+    if not numero.is_finite():
+        raise ValueError(f'{campo} inválido')
+    if maximo is not None and not 0 <= numero <= maximo:
+        raise ValueError(f'{campo} deve estar entre 0 e {maximo}')
+    if numero < 0:
+        raise ValueError(f'{campo} inválido')
+    return numero
+
+
+def montar_reserva(dados, cliente, funcionario, momento):
+    """
+    Reserva (ainda não salva) a partir de um item do lote, com o valor final já calculado.
+    ValueError com a mensagem para o funcionário se algum campo estiver errado.
+    """
+    if not isinstance(dados, dict):
+        raise ValueError('Item inválido')
+    if cliente is None:
+        raise ValueError('Cliente não encontrado')
+    if dados.get('tipo_servico') not in ('HOTEL', 'GARAGEM'):
+        raise ValueError('tipo_servico deve ser HOTEL ou GARAGEM')
+    if dados.get('valor_base') is None:
+        raise ValueError('valor_base é obrigatório')
+    try:
+        saida = datetime.fromisoformat(dados['data_saida_prevista']) if dados.get('data_saida_prevista') else None
+    except (TypeError, ValueError):
+        raise ValueError('data_saida_prevista inválida')
+
+    reserva = Reserva(
+        # Pelos ids: com os objetos, o SQLAlchemy também mexeria na lista cliente.reservas
+        # (e as reservas recusadas iriam junto para a sessão). O to_dict() acha os dois na sessão sem consultar.
+        cliente_id=cliente.id,
+        funcionario_id=funcionario.id,
+        tipo_servico=dados['tipo_servico'],
+        placa_veiculo=dados.get('placa_veiculo'),
+        numero_quarto=dados.get('numero_quarto'),
+        numero_vaga=dados.get('numero_vaga'),
+        # Todas as reservas do lote entram no mesmo instante
+        data_entrada=momento,
+        data_saida_prevista=saida,
+        valor_base=_decimal(dados['valor_base'], 'valor_base'),
+        desconto_percentual=_decimal(dados['desconto_percentual'], 'desconto_percentual', maximo=100)
+        if dados.get('desconto_percentual') is not None else None
+    )
+    # Sem desconto informado, vale a melhor promoção do cliente (como em criar-reserva)
+    if reserva.desconto_percentual is None:
+        aplicar_melhor_promocao(reserva, cliente)
+    else:
+        reserva.calcular_valor_final()
+    return reserva
+
+
+def criar_reservas_lote(itens, funcionario_id, atomico=True, maximo=500):
+    """
+    Cria várias reservas de uma vez (check-in de grupos e frotas) em uma única transação.
+    - Os clientes de todos os itens são buscados com uma só consulta (cpf IN (...)).
+    - Os quartos/vagas de todo o lote são conferidos com uma só consulta.
+    - atomico=True: se algum item tiver erro, nada é gravado (os itens certos voltam com
+      o erro NAO_GRAVADA); atomico=False: grava os itens certos e devolve o erro dos outros.
+    Devolve (resultados, criadas): um resultado por item, na ordem recebida.
+    """
+    if not isinstance(itens, list) or not itens:
+        raise LoteInvalido('Envie uma lista de reservas em "reservas"')
+    if len(itens) > maximo:
+        raise LoteInvalido(f'No máximo {maximo} reservas por lote')
+
+    cpfs = {str(item['cpf_cliente']) for item in itens if isinstance(item, dict) and item.get('cpf_cliente')}
+    clientes = {c.cpf: c for c in Usuario.query.filter(Usuario.cpf.in_(cpfs))} if cpfs else {}
+    # O funcionário é o mesmo em todas: carregado uma vez para o to_dict() não buscar de novo
+    funcionario = db.session.get(Usuario, funcionario_id)
+    momento = datetime.utcnow()
+
+    reservas, erros = [], []
+    for item in itens:
+        cpf = str(item.get('cpf_cliente')) if isinstance(item, dict) else None
+        try:
+            reservas.append(montar_reserva(item, clientes.get(cpf), funcionario, momento))
+            erros.append(None)
+        except ValueError as erro:
+            reservas.append(None)
+            erros.append(str(erro))
+
+    validas = [posicao for posicao, reserva in enumerate(reservas) if reserva is not None]
+    for posicao, erro in zip(validas, verificar_reservas([reservas[p] for p in validas])):
+        erros[posicao] = erro
+
+    gravar = [] if atomico and any(erros) else [p for p in validas if erros[p] is None]
+    resultados = []
+    try:
+        if gravar:
+            db.session.add_all(reservas[p] for p in gravar)
+            # Um flush só (o SQLAlchemy junta os INSERTs quando o banco devolve os ids de um lote);
+            # os ids já existem para a resposta, antes do commit
+            # (depois do commit os objetos expiram e o to_dict() consultaria cada reserva de novo)
+            db.session.flush()
+        gravadas = set(gravar)
+        for posicao, erro in enumerate(erros):
+            if posicao in gravadas:
+                resultados.append({'indice': posicao, 'criada': True, 'reserva': reservas[posicao].to_dict()})
+            else:
+                resultados.append({'indice': posicao, 'criada': False, 'erro': erro or NAO_GRAVADA})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return resultados, len(gravar)
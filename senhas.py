@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TempoEsgotado
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Valores usados quando não há aplicação Flask ativa (ex: scripts soltos)
+PADROES = {
+    'SENHAS_METODO': 'scrypt',
+    'SENHAS_PROCESSOS': 2,
+    'SENHAS_FILA_MAXIMA': 32,
+    'SENHAS_TIMEOUT': 10
+}
+
+
+def contexto_processos():
+    """
+    Como criar os processos auxiliares: o fork copiaria um processo que já tem outras threads
+    (gravação das visitas, filas de avisos) e o filho poderia herdar uma trava presa e parar.
+    O forkserver (ou o spawn, onde ele não existe) começa de um processo limpo.
+    """
+    metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(metodo)
+
+
+# Hash com que nenhuma senha confere: conta criada sem senha (ex: convidado do checkout).
+# Fica assim até o próprio cliente definir uma senha; ninguém entra nessa conta antes disso
+SENHA_PENDENTE = '!'
+
+
+class SistemaOcupado(Exception):
+    """Todos os processos de senha estão ocupados e a fila de espera está cheia."""
+
+
+def _configuracao(chave):
+    if has_app_context():
+        return current_app.config.get(chave, PADROES[chave])
+    return PADROES[chave]
+
+
+def _executar(funcao, *argumentos):
+    """Roda dentro do processo auxiliar e devolve também quando começou e terminou."""
+    inicio = time.time()
+    resultado = funcao(*argumentos)
+    return resultado, inicio, time.time()
+
+
+class ServicoSenhas:
+    """
+    Gera e confere hashes de senha em um grupo pequeno de processos separados,
+    para que os logins não ocupem as threads que atendem as requisições.
+    Quando há mais pedidos esperando do que SENHAS_FILA_MAXIMA, recusamos na hora
+    com SistemaOcupado (a rota responde 503) em vez de deixar tudo lento.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._processos = None
+        self._pid = None
+        self._vagas = None
+        self._prefixos = {}
+        self.zerar_metricas()
+
+    def zerar_metricas(self):
+        self._metricas = {
+            'total': 0,
+            'recusadas': 0,
+            'em_andamento': 0,
+            'espera_total_s': 0.0,
+            'hash_total_s': 0.0,
+            'espera_maxima_s': 0.0,
+            'hash_maximo_s': 0.0
+        }
+
+    def _grupo(self):
+        with self._trava:
+            # Depois de um fork (ex: gunicorn) o grupo de processos do pai não serve
+            if self._processos is None or self._pid != os.getpid():
+                self._processos = ProcessPoolExecutor(max_workers=_configuracao('SENHAS_PROCESSOS'),
+                                                      mp_context=contexto_processos())
+                self._vagas = threading.BoundedSemaphore(
+                    _configuracao('SENHAS_PROCESSOS') + _configuracao('SENHAS_FILA_MAXIMA')
+                )
+                self._pid = os.getpid()
+            return self._processos, self._vagas
+
+    def _rodar(self, funcao, *argumentos):
+        if not _configuracao('SENHAS_PROCESSOS'):
+            # SENHAS_PROCESSOS = 0 desliga os processos auxiliares (útil em desenvolvimento)
+            resultado, inicio, fim = _executar(funcao, *argumentos)
+            self._registrar(inicio, inicio, fim)
+            return resultado
+
+        processos, vagas = self._grupo()
+        if not vagas.acquire(blocking=False):
+            with self._trava:
+                self._metricas['recusadas'] += 1
+            raise SistemaOcupado()
+
+        enviado = time.time()
+        with self._trava:
+            self._metricas['em_andamento'] += 1
+        try:
+            try:
+                futuro = processos.submit(_executar, funcao, *argumentos)
+            except Exception:
+                vagas.release()
+                raise
+            # A vaga só é devolvida quando o processo termina, mesmo se desistirmos de esperar
+            futuro.add_done_callback(lambda _: vagas.release())
+            resultado, inicio, fim = futuro.result(timeout=_configuracao('SENHAS_TIMEOUT'))
+        except TempoEsgotado:
+            raise SistemaOcupado()
+        finally:
+            with self._trava:
+                self._metricas['em_andamento'] -= 1
+
+        self._registrar(enviado, inicio, fim)
+        return resultado
+
+    def _registrar(self, enviado, inicio, fim):
+        espera = max(0.0, inicio - enviado)
+        duracao = fim - inicio
+        with self._trava:
+            m = self._metricas
+            m['total'] += 1
+            m['espera_total_s'] += espera
+            m['hash_total_s'] += duracao
+            m['espera_maxima_s'] = max(m['espera_maxima_s'], espera)
+            m['hash_maximo_s'] = max(m['hash_maximo_s'], duracao)
+
+    def gerar_hash(self, senha):
+        return self._rodar(generate_password_hash, senha, _configuracao('SENHAS_METODO'))
+
+    def verificar(self, senha_hash, senha):
+        return self._rodar(check_password_hash, senha_hash, senha)
+
+    def precisa_atualizar(self, senha_hash):
+        """True quando a hash guardada usa um método/custo diferente do configurado."""
+        metodo = _configuracao('SENHAS_METODO')
+        if metodo not in self._prefixos:
+            # O werkzeug completa os parâmetros padrão (ex: 'scrypt' -> 'scrypt:32768:8:1'),
+            # então geramos uma hash de exemplo uma vez para saber o prefixo exato
+            self._prefixos[metodo] = generate_password_hash('exemplo', metodo).split('$', 1)[0]
+        return senha_hash.split('$', 1)[0] != self._prefixos[metodo]
+
+    def metricas(self):
+        with self._trava:
+            m = dict(self._metricas)
+        concluidas = m['total'] or 1
+        m['espera_media_s'] = m['espera_total_s'] / concluidas
+        m['hash_medio_s'] = m['hash_total_s'] / concluidas
+        return m
+
+
+# Instância única usada pela aplicação
+servico_senhas = ServicoSenhas()
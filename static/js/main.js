@@ -186,6 +186,24 @@ async function fetchWithErrorHandling(url, options = {}) {
     }
 }
 
+/**
+ * Conecta no canal de avisos em tempo real (/api/eventos).
+ * Recebe um objeto { nomeDoEvento: funcao(dados) }.
+ * Se o navegador não suportar Server-Sent Events, chama semSuporte() (ex: voltar a consultar por tempo).
+ */
+function ouvirEventos(tratadores, semSuporte) {
+    if (typeof EventSource === 'undefined') {
+        if (semSuporte) semSuporte();
+        return null;
+    }
+
+    const fonte = new EventSource('/api/eventos');
+    Object.entries(tratadores).forEach(([evento, tratador]) => {
+        fonte.addEventListener(evento, e => tratador(JSON.parse(e.data)));
+    });
+    return fonte;
+}
+
 /**
  * Cria um elemento de loading
  */
@@ -405,6 +423,7 @@ if (typeof module !== 'undefined' && module.exports) {
         mascaraPlaca,
         debounce,
         fetchWithErrorHandling,
+        ouvirEventos,
         confirmar,
         copiarParaClipboard,
         diferencaEmDias,
@@ -0,0 +1,235 @@
+import json
+import os
+import random
+import signal
+import socket
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Tarefa
+
+# O que o trabalhador precisa de uma tarefa reservada (dados simples: a sessão é fechada antes de executar)
+Reservada = namedtuple('Reservada', ['id', 'nome', 'dados', 'tentativas', 'max_tentativas', 'travada_por'])
+
+
+class FilaTarefas:
+    """
+    Fila de tarefas gravada no banco (tabela 'tarefas'), para o trabalho que não precisa
+    atrasar a resposta: e-mails de boas-vindas, de confirmação da reserva etc.
+
+    - enfileirar() grava a tarefa na mesma transação da requisição: se o commit falhar,
+      a tarefa some junto; se der certo, ela não se perde mesmo que o servidor caia.
+    - Uma chave (ex: 'email-reserva:42') faz a tarefa entrar na fila uma vez só.
+    - O `flask worker` pega as tarefas vencidas e executa cada uma; se der erro,
+      ela volta para a fila com espera dobrando a cada tentativa, até TAREFAS_TENTATIVAS.
+
+    Uma tarefa pode rodar mais de uma vez (ex: o trabalhador cai no meio), então as funções
+    devem conferir se o trabalho já foi feito. O que elas gravam pela sessão entra no mesmo
+    commit que marca a tarefa como concluída; elas não devem fazer commit.
+
+        @fila_tarefas.tarefa('email_reserva')
+        def email_reserva(reserva_id): ...
+
+        fila_tarefas.enfileirar('email_reserva', {'reserva_id': reserva.id}, chave=f'email-reserva:{reserva.id}')
+    """
+
+    def __init__(self):
+        self._funcoes = {}  # nome -> (funcao, tentativas)
+        self._parar = threading.Event()
+
+    def tarefa(self, nome=None, tentativas=None):
+        """Registra a função que executa as tarefas com esse nome (padrão: o nome da função)."""
+        def registrar(funcao):
+            self._funcoes[nome or funcao.__name__] = (funcao, tentativas)
+            return funcao
+        return registrar
+
+    # ---------- na requisição ----------
+
+    def enfileirar(self, nome, dados=None, chave=None, atraso=0):
+        """
+        Põe a tarefa na fila dentro da transação atual (quem chama faz o commit).
+        Devolve o id da tarefa; com uma chave já usada, devolve o id da tarefa que já existia.
+        """
+        if nome not in self._funcoes:
+            raise ValueError(f'Tarefa desconhecida: {nome}')
+        tentativas = self._funcoes[nome][1] or current_app.config.get('TAREFAS_TENTATIVAS', 5)
+        valores = {
+            'nome': nome,
+            'dados': json.dumps(dados or {}, default=str),
+            'chave': chave,
+            'status': 'PENDENTE',
+            'tentativas': 0,
+            'max_tentativas': tentativas,
+            'executar_em': datetime.utcnow() + timedelta(seconds=atraso),
+            'criada_em': datetime.utcnow()
+        }
+        tabela = Tarefa.__table__
+        if chave is None:
+            return db.session.execute(insert(tabela).values(**valores)).inserted_primary_key[0]
+
+        # Duas requisições com a mesma chave ao mesmo tempo: a chave única recusa a segunda
+        # sem erro (e sem desfazer o resto da transação)
+        dialeto = db.session.get_bind().dialect.name
+        if dialeto in ('sqlite', 'postgresql'):
+            comando = (sqlite if dialeto == 'sqlite' else postgresql).insert(tabela).values(**valores)
+            comando = comando.on_conflict_do_nothing(index_elements=['chave'])
+        else:
+            comando = insert(tabela).values(**valores).prefix_with('IGNORE', dialect='mysql')
+        db.session.execute(comando)
+        return db.session.execute(select(tabela.c.id).where(tabela.c.chave == chave)).scalar()
+
+    # ---------- no trabalhador ----------
+
+    def espera(self, tentativa):
+        """Segundos até a próxima tentativa: dobra a cada falha, com um pouco de sorteio
+        para que tarefas que falharam juntas não voltem todas no mesmo instante."""
+        base = current_app.config.get('TAREFAS_ESPERA_BASE', 10)
+        maxima = current_app.config.get('TAREFAS_ESPERA_MAXIMA', 3600)
+        return min(maxima, base * 2 ** (tentativa - 1)) * random.uniform(0.5, 1.0)
+
+    def reservar(self, trabalhador, quantidade=1):
+        """
+        Marca até 'quantidade' tarefas vencidas como EXECUTANDO por este trabalhador e as devolve.
+        Tarefas presas há mais de TAREFAS_TEMPO_LIMITE (trabalhador que caiu) também entram.
+        """
+        agora = datetime.utcnow()
+        presa = agora - timedelta(seconds=current_app.config.get('TAREFAS_TEMPO_LIMITE', 300))
+        # Presa e sem tentativas sobrando: desiste dela
+        db.session.execute(
+            update(Tarefa).where(Tarefa.status == 'EXECUTANDO', Tarefa.travada_em < presa,
+                                 Tarefa.tentativas >= Tarefa.max_tentativas)
+            .values(status='FALHOU', ultimo_erro='Tempo esgotado', travada_por=None, travada_em=None)
+        )
+        prontas = or_(
+            and_(Tarefa.status == 'PENDENTE', Tarefa.executar_em <= agora),
+            and_(Tarefa.status == 'EXECUTANDO', Tarefa.travada_em < presa)
+        )
+        candidatas = select(Tarefa.id).where(prontas).order_by(Tarefa.executar_em).limit(quantidade)
+        if db.session.get_bind().dialect.name == 'sqlite':
+            # Um UPDATE só: o SQLite trava o banco inteiro para gravar, então dois
+            # trabalhadores nunca pegam a mesma tarefa
+            ids = candidatas.scalar_subquery()
+        else:
+            # MySQL/PostgreSQL: cada trabalhador pula as linhas que outro já travou
+            ids = db.session.execute(candidatas.with_for_update(skip_locked=True)).scalars().all()
+            if not ids:
+                db.session.commit()
+                return []
+
+        marca = f'{trabalhador}:{uuid.uuid4().hex[:8]}'
+        db.session.execute(
+            update(Tarefa).where(Tarefa.id.in_(ids), prontas)
+            .values(status='EXECUTANDO', travada_por=marca, travada_em=agora, tentativas=Tarefa.tentativas + 1)
+            .execution_options(synchronize_session=False)
+        )
+        reservadas = [Reservada(*linha) for linha in db.session.execute(
+            select(Tarefa.id, Tarefa.nome, Tarefa.dados, Tarefa.tentativas, Tarefa.max_tentativas, Tarefa.travada_por)
+            .where(Tarefa.travada_por == marca).order_by(Tarefa.executar_em)
+        )]
+        db.session.commit()
+        return reservadas
+
+    def executar(self, tarefa):
+        """Executa uma tarefa reservada e grava o resultado. True se deu certo."""
+        ainda_minha = and_(Tarefa.id == tarefa.id, Tarefa.travada_por == tarefa.travada_por)
+        try:
+            funcao = self._funcoes.get(tarefa.nome, (None,))[0]
+            if funcao is None:
+                raise LookupError(f'Tarefa desconhecida: {tarefa.nome}')
+            funcao(**json.loads(tarefa.dados))
+            concluida = db.session.execute(update(Tarefa).where(ainda_minha).values(
+                status='CONCLUIDA', concluida_em=datetime.utcnow(), travada_por=None, travada_em=None, ultimo_erro=None
+            ))
+            if not concluida.rowcount:
+                # A reserva venceu e outro trabalhador pegou a tarefa: o que a função gravou é desfeito
+                db.session.rollback()
+                current_app.logger.warning('Tarefa %s (%s) foi reservada por outro trabalhador; resultado descartado',
+                                           tarefa.id, tarefa.nome)
+                return False
+            db.session.commit()
+            return True
+        except Exception as erro:
+            db.session.rollback()
+            desistir = tarefa.tentativas >= tarefa.max_tentativas
+            current_app.logger.warning('Tarefa %s (%s) falhou na tentativa %s: %s',
+                                       tarefa.id, tarefa.nome, tarefa.tentativas, erro)
+            db.session.execute(update(Tarefa).where(ainda_minha).values(
+                status='FALHOU' if desistir else 'PENDENTE',
+                executar_em=datetime.utcnow() + timedelta(seconds=self.espera(tarefa.tentativas)),
+                ultimo_erro=f'{type(erro).__name__}: {erro}'[:2000],
+                travada_por=None,
+                travada_em=None
+            ))
+            db.session.commit()
+            return False
+
+    def processar(self, trabalhador='principal', quantidade=None):
+        """Reserva e executa um lote de tarefas vencidas. Devolve quantas foram executadas."""
+        reservadas = self.reservar(trabalhador, quantidade or current_app.config.get('TAREFAS_LOTE', 10))
+        for tarefa in reservadas:
+            self.executar(tarefa)
+        return len(reservadas)
+
+    # ---------- flask worker ----------
+
+    def parar(self, *argumentos):
+        self._parar.set()
+
+    def trabalhar(self, app, threads=None, uma_vez=False, mostrar=print):
+        """
+        Roda os trabalhadores até receber Ctrl+C/SIGTERM (cada thread termina a tarefa atual).
+        Com uma_vez=True, executa o que está vencido e volta (ex: para rodar pelo cron).
+        """
+        self._parar.clear()
+        if uma_vez:
+            total = 0
+            with app.app_context():
+                while True:
+                    feitas = self.processar(self._nome(0))
+                    if not feitas:
+                        break
+                    total += feitas
+                db.session.remove()
+            mostrar(f'{total} tarefas executadas.')
+            return total
+
+        threads = threads or app.config.get('TAREFAS_TRABALHADORES', 2)
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.parar)
+            signal.signal(signal.SIGINT, self.parar)
+        trabalhadores = [threading.Thread(target=self._laco, args=(app, numero), name=f'tarefas-{numero}')
+                         for numero in range(threads)]
+        for trabalhador in trabalhadores:
+            trabalhador.start()
+        mostrar(f'{threads} trabalhadores esperando tarefas (Ctrl+C para parar).')
+        for trabalhador in trabalhadores:
+            trabalhador.join()
+        mostrar('Trabalhadores parados.')
+
+    def _nome(self, numero):
+        return f'{socket.gethostname()}-{os.getpid()}-{numero}'
+
+    def _laco(self, app, numero):
+        nome = self._nome(numero)
+        while not self._parar.is_set():
+            with app.app_context():
+                try:
+                    feitas = self.processar(nome)
+                except Exception as erro:
+                    # Ex: banco fora do ar ou ocupado: tenta de novo depois do intervalo
+                    db.session.rollback()
+                    app.logger.warning('Erro ao buscar tarefas: %s', erro)
+                    feitas = 0
+                finally:
+                    db.session.remove()
+            if not feitas:
+                self._parar.wait(app.config.get('TAREFAS_INTERVALO', 1.0))
+
+
+# Instância única usada pela aplicação
+fila_tarefas = FilaTarefas()
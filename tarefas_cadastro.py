@@ -0,0 +1,47 @@
+import smtplib
+from email.message import EmailMessage
+from flask import current_app
+from models import db, Usuario, Reserva
+from tarefas import fila_tarefas
+
+
+def enviar_email(destino, assunto, texto):
+    """Envia pelo EMAIL_SERVIDOR configurado; sem servidor, o e-mail só vai para o log."""
+    config = current_app.config
+    if not config.get('EMAIL_SERVIDOR'):
+        current_app.logger.info('E-mail para %s (sem EMAIL_SERVIDOR): %s', destino, assunto)
+        return
+    mensagem = EmailMessage()
+    mensagem['From'] = config['EMAIL_REMETENTE']
+    mensagem['To'] = destino
+    mensagem['Subject'] = assunto
+    mensagem.set_content(texto)
+    with smtplib.SMTP(config['EMAIL_SERVIDOR'], config.get('EMAIL_PORTA', 587), timeout=30) as servidor:
+        servidor.starttls()
+        if config.get('EMAIL_USUARIO'):
+            servidor.login(config['EMAIL_USUARIO'], config['EMAIL_SENHA'])
+        servidor.send_message(mensagem)
+
+
+@fila_tarefas.tarefa('email_boas_vindas')
+def email_boas_vindas(usuario_id):
+    usuario = db.session.get(Usuario, usuario_id)
+    if usuario is None:
+        return
+    enviar_email(usuario.email, 'Bem-vindo!',
+                 f'Olá, {usuario.nome}!\n\nSua conta foi criada com sucesso. Você já pode entrar no sistema.')
+
+
+@fila_tarefas.tarefa('email_reserva')
+def email_reserva(reserva_id):
+    reserva = db.session.get(Reserva, reserva_id)
+    if reserva is None:
+        return
+    local = reserva.numero_quarto or reserva.numero_vaga or '-'
+    saida = reserva.data_saida_prevista.strftime('%d/%m/%Y %H:%M') if reserva.data_saida_prevista else 'a combinar'
+    enviar_email(reserva.cliente.email, f'Reserva {reserva.id} confirmada',
+                 f'Olá, {reserva.cliente.nome}!\n\n'
+                 f'Sua reserva de {reserva.tipo_servico} ({local}) está confirmada.\n'
+                 f"Entrada: {reserva.data_entrada.strftime('%d/%m/%Y %H:%M')}\n"
+                 f'Saída prevista: {saida}\n'
+                 f'Valor: R$ {reserva.valor_final:.2f}')
@@ -1,5 +1,12 @@
 import unittest
+import unittest.mock
+import csv
 import os
+import shutil
+import json
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
 # 1. Configura ambiente de TESTE antes de importar o app
 # Isso força o sistema a usar um banco na memória (SQLite) em vez do MySQL real
@@ -8,7 +15,38 @@ os.environ['FLASK_ENV'] = 'testing'
 
 try:
     from app import app, db
-    from models import Usuario
+    from models import Usuario, Reserva, RegistroPonto, Promocao, AgregadoDiario
+    from sqlalchemy import event, inspect
+    from flask import g
+    from estatisticas import estatisticas
+    from promocoes import motor_promocoes
+    from disponibilidade import disponibilidade, verificar_reserva, _Agenda
+    from notificacoes import central
+    from senhas import ServicoSenhas, SistemaOcupado, contexto_processos
+    from werkzeug.security import generate_password_hash
+    from visitas import acumulador_visitas, AcumuladorVisitas
+    from identidade import cache_identidade
+    from agregados import reconstruir
+    from folha import relatorio_mensal, ler_mes
+    from migracoes import migrar, indices_faltando
+    from auditoria import auditar, _plano
+    from dados_sinteticos import GeradorDados
+    from benchmark import medir_rotas, medir_modelos
+    from instrumentacao import instrumentacao
+    from fragmentos import cache_fragmentos, pasta_segura, configurar_templates
+    from estaticos import PipelineEstaticos
+    from flask import url_for
+    from replicas import roteador_replica, usando_replica, leitura_na_replica
+    from ponto import bater_ponto
+    from tarefas import fila_tarefas
+    from models import Tarefa
+    from senhas import SENHA_PENDENTE
+    from flask import Flask
+    import csv
+    import gzip
+    import threading
+    import zlib
+    import io
 except ImportError as e:
     print(f"\n[ERRO CRITICO] Falha ao importar a aplicacao: {e}")
     exit(1)
@@ -59,5 +97,1403 @@ class BasicTests(unittest.TestCase):
         self.assertEqual(user_db.nome, "Teste")
         print("  [OK] Modelos e Banco de Dados funcionando (em memoria).")
 
+
+def criar_usuario(nome, email, cpf, tipo='CLIENTE', senha='123'):
+    """Cria e salva um usuário de teste"""
+    u = Usuario(nome=nome, email=email, cpf=cpf, telefone="000", tipo_usuario=tipo)
+    u.set_senha(senha)
+    db.session.add(u)
+    db.session.commit()
+    return u
+
+
+@contextmanager
+def contar_consultas():
+    """Conta quantos comandos SQL foram enviados ao banco dentro do bloco"""
+    contagem = {'total': 0}
+
+    def contar(*args):
+        contagem['total'] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', contar)
+    try:
+        yield contagem
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', contar)
+
+
+class BancoTestCase(unittest.TestCase):
+    """Base para os testes que precisam de banco limpo e de um usuário logado"""
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        # As visitas são gravadas pelos próprios testes (descarregar), não pela thread de fundo
+        app.config['VISITAS_INTERVALO'] = 3600
+        self.app = app.test_client()
+        self.context = app.app_context()
+        self.context.push()
+        db.create_all()
+        estatisticas.limpar()
+        motor_promocoes.invalidar()
+        disponibilidade.invalidar()
+        cache_identidade.limpar()
+        cache_fragmentos.invalidar()
+
+    def tearDown(self):
+        acumulador_visitas.descarregar()
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def entrar(self, email, senha='123'):
+        return self.app.post('/login', data={'email': email, 'senha': senha})
+
+
+class EstatisticasTests(BancoTestCase):
+
+    def test_receita_pelos_agregados(self):
+        """A receita vem dos agregados e acompanha reservas finalizadas"""
+        criar_usuario("Admin", "adm@teste.com", "1", tipo='ADM')
+        cliente = criar_usuario("Cliente", "cli@teste.com", "2")
+        reserva = Reserva(cliente_id=cliente.id, tipo_servico='HOTEL', valor_base=100, desconto_percentual=0)
+        reserva.calcular_valor_final()
+        db.session.add(reserva)
+        db.session.commit()
+
+        self.entrar("adm@teste.com")
+        dados = self.app.get('/api/admin/estatisticas').get_json()
+        self.assertEqual(dados['usuarios'], {'clientes': 1, 'funcionarios': 0, 'admins': 1})
+        self.assertEqual(dados['reservas_ativas'], 1)
+        self.assertEqual(dados['receita_total'], 0)
+
+        reserva = db.session.get(Reserva, reserva.id)
+        reserva.status = 'FINALIZADA'
+        db.session.commit()
+
+        dados = self.app.get('/api/admin/estatisticas').get_json()
+        self.assertEqual(dados['reservas_ativas'], 0)
+        self.assertEqual(dados['receita_total'], 100.0)
+
+
+class PresencaTests(BancoTestCase):
+
+    def criar_funcionarios(self, inicio, quantidade):
+        for i in range(inicio, inicio + quantidade):
+            f = criar_usuario(f"Func {i}", f"f{i}@teste.com", f"f{i}", tipo='FUNCIONARIO')
+            if i % 2 == 0:
+                db.session.add(RegistroPonto(funcionario_id=f.id, data=datetime.utcnow().date(),
+                                             hora_entrada=datetime.utcnow().replace(hour=8)))
+        db.session.commit()
+
+    def test_quantidade_de_consultas_constante(self):
+        """A presença usa o mesmo número de consultas com 2 ou 30 funcionários"""
+        criar_usuario("Admin", "adm@teste.com", "1", tipo='ADM')
+        self.entrar("adm@teste.com")
+
+        self.criar_funcionarios(0, 2)
+        with contar_consultas() as poucos:
+            resposta = self.app.get('/api/admin/funcionarios-presenca')
+        self.assertEqual(len(resposta.get_json()['funcionarios']), 2)
+
+        self.criar_funcionarios(2, 28)
+        with contar_consultas() as muitos:
+            resposta = self.app.get('/api/admin/funcionarios-presenca?agrupar=turno')
+        dados = resposta.get_json()
+        self.assertEqual(len(dados['funcionarios']), 30)
+        self.assertEqual(dados['grupos']['MANHA']['presentes'], 15)
+        self.assertEqual(poucos['total'], muitos['total'])
+
+
+class UsuariosPaginadosTests(BancoTestCase):
+
+    def test_paginacao_por_cursor_e_ndjson(self):
+        """A listagem de usuários anda por páginas e também sai em NDJSON"""
+        criar_usuario("Admin", "adm@teste.com", "1", tipo='ADM')
+        for i in range(4):
+            criar_usuario(f"Cliente {i}", f"c{i}@teste.com", f"c{i}")
+        self.entrar("adm@teste.com")
+
+        pagina = self.app.get('/api/admin/usuarios?limit=3').get_json()
+        self.assertEqual(len(pagina['usuarios']), 3)
+        self.assertIsNotNone(pagina['proximo'])
+
+        pagina = self.app.get(f"/api/admin/usuarios?limit=3&after={pagina['proximo']}").get_json()
+        self.assertEqual(len(pagina['usuarios']), 2)
+        self.assertIsNone(pagina['proximo'])
+
+        resposta = self.app.get('/api/admin/usuarios?tipo=CLIENTE&formato=ndjson')
+        self.assertEqual(resposta.mimetype, 'application/x-ndjson')
+        linhas = [json.loads(l) for l in resposta.get_data(as_text=True).splitlines()]
+        self.assertEqual([u['nome'] for u in linhas], [f"Cliente {i}" for i in range(4)])
+
+
+class MinhasReservasTests(BancoTestCase):
+
+    def test_historico_paginado_sem_consultas_por_reserva(self):
+        """O histórico vem em páginas e o nome do atendente não gera consulta extra"""
+        cliente = criar_usuario("Cliente", "cli@teste.com", "2")
+        for dia in range(1, 6):
+            funcionario = criar_usuario(f"Func {dia}", f"f{dia}@teste.com", f"f{dia}", tipo='FUNCIONARIO')
+            r = Reserva(cliente_id=cliente.id, funcionario_id=funcionario.id, tipo_servico='GARAGEM',
+                        valor_base=35, data_entrada=datetime(2026, 1, dia))
+            r.calcular_valor_final()
+            db.session.add(r)
+        db.session.commit()
+        self.entrar("cli@teste.com")
+
+        with contar_consultas() as uma:
+            self.app.get('/api/cliente/minhas-reservas?limit=1')
+        with contar_consultas() as tres:
+            pagina = self.app.get('/api/cliente/minhas-reservas?limit=3').get_json()
+        # Cliente e funcionário vêm no mesmo SELECT da listagem
+        self.assertEqual(uma['total'], tres['total'])
+        self.assertEqual(pagina['reservas'][0]['funcionario'], "Func 5")
+        self.assertEqual(len(pagina['reservas']), 3)
+
+        resto = self.app.get(f"/api/cliente/minhas-reservas?limit=3&after={pagina['proximo']}").get_json()
+        self.assertEqual([r['data_entrada'][:10] for r in resto['reservas']], ['2026-01-02', '2026-01-01'])
+        self.assertIsNone(resto['proximo'])
+
+        filtradas = self.app.get('/api/cliente/minhas-reservas?inicio=2026-01-02&fim=2026-01-03').get_json()
+        self.assertEqual(len(filtradas['reservas']), 2)
+
+
+class PromocoesTests(BancoTestCase):
+
+    def criar_promocao(self, nome, desconto, tipo='AMBOS', minimo=0, dias=(-1, 1)):
+        agora = datetime.utcnow()
+        db.session.add(Promocao(nome=nome, desconto_percentual=desconto, tipo_servico=tipo, minimo_visitas=minimo,
+                                data_inicio=agora + timedelta(days=dias[0]), data_fim=agora + timedelta(days=dias[1])))
+        db.session.commit()
+
+    def test_melhor_promocao(self):
+        """O motor escolhe o maior desconto válido para serviço, visitas e data"""
+        self.criar_promocao("Geral", 5)
+        self.criar_promocao("Hotel Fiel", 20, tipo='HOTEL', minimo=3)
+        self.criar_promocao("Garagem", 10, tipo='GARAGEM')
+        self.criar_promocao("Vencida", 50, dias=(-10, -5))
+        agora = datetime.utcnow()
+
+        self.assertEqual(motor_promocoes.melhor_promocao('HOTEL', 1, agora)['nome'], "Geral")
+        self.assertEqual(motor_promocoes.melhor_promocao('HOTEL', 3, agora)['nome'], "Hotel Fiel")
+        self.assertEqual(motor_promocoes.melhor_promocao('GARAGEM', 10, agora)['nome'], "Garagem")
+        self.assertEqual(motor_promocoes.melhor_promocao('HOTEL', 1, agora - timedelta(days=7))['nome'], "Vencida")
+        self.assertIsNone(motor_promocoes.melhor_promocao('HOTEL', 1, agora + timedelta(days=3)))
+
+        # Salvar uma promoção nova recarrega o índice
+        self.criar_promocao("Relâmpago", 30, tipo='GARAGEM')
+        self.assertEqual(motor_promocoes.melhor_promocao('GARAGEM', 0, agora)['nome'], "Relâmpago")
+
+    def test_reserva_recebe_desconto(self):
+        """A reserva do cliente já sai com a promoção aplicada"""
+        self.criar_promocao("Geral", 10)
+        criar_usuario("Cliente", "cli@teste.com", "2")
+        self.entrar("cli@teste.com")
+
+        resposta = self.app.post('/api/cliente/nova-reserva', json={'tipo_servico': 'HOTEL', 'valor_base': 250})
+        reserva = resposta.get_json()['reserva']
+        self.assertEqual(reserva['desconto_percentual'], 10.0)
+        self.assertEqual(reserva['valor_final'], 225.0)
+
+    def test_etag_responde_304_sem_consultar_o_banco(self):
+        """Com o ETag atual a resposta é 304 sem SQL; salvar uma promoção muda o ETag"""
+        self.criar_promocao("Geral", 10)
+        criar_usuario("Func", "func@teste.com", "3", "FUNCIONARIO")
+        self.entrar("func@teste.com")
+        g.pop('_login_user', None)
+
+        resposta = self.app.get('/api/funcionario/promocoes')
+        etag = resposta.headers['ETag']
+        self.assertIn('no-cache', resposta.headers['Cache-Control'])
+        # A data de carga muda de processo para processo: só o ETag (do conteúdo) vale
+        self.assertNotIn('Last-Modified', resposta.headers)
+
+        g.pop('_login_user', None)
+        with contar_consultas() as consultas:
+            resposta = self.app.get('/api/funcionario/promocoes', headers={'If-None-Match': etag})
+        self.assertEqual(resposta.status_code, 304)
+        self.assertEqual(consultas['total'], 0)
+
+        self.criar_promocao("Nova", 20)
+        g.pop('_login_user', None)
+        resposta = self.app.get('/api/funcionario/promocoes', headers={'If-None-Match': etag})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta.headers['ETag'], etag)
+        self.assertEqual(len(resposta.get_json()['promocoes']), 2)
+
+    def test_pagina_inicial_guarda_o_conteudo_renderizado(self):
+        """O conteúdo da página inicial é renderizado uma vez; o menu continua sendo de cada usuário"""
+        self.criar_promocao("Geral", 10)
+        antes = cache_fragmentos.metricas()
+        self.assertIn('Geral', self.app.get('/').get_data(as_text=True))
+
+        criar_usuario("Cliente", "cli@teste.com", "2")
+        self.entrar("cli@teste.com")
+        g.pop('_login_user', None)
+        html = self.app.get('/').get_data(as_text=True)
+        self.assertIn('Geral', html)
+        self.assertIn('Cliente', html)
+        depois = cache_fragmentos.metricas()
+        self.assertEqual(depois['faltas'] - antes['faltas'], 1)
+        self.assertEqual(depois['acertos'] - antes['acertos'], 1)
+
+        # Salvar uma promoção apaga o conteúdo guardado
+        self.criar_promocao("Relâmpago", 30)
+        g.pop('_login_user', None)
+        self.assertIn('Relâmpago', self.app.get('/').get_data(as_text=True))
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), 'permissões no estilo Unix')
+    def test_cache_de_templates_recusa_pasta_aberta(self):
+        """O bytecode só é lido de uma pasta 0700 do próprio usuário"""
+        with tempfile.TemporaryDirectory() as raiz:
+            propria = os.path.join(raiz, 'propria')
+            self.assertTrue(pasta_segura(propria, app.logger))
+            self.assertEqual(os.stat(propria).st_mode & 0o777, 0o700)
+            aberta = os.path.join(raiz, 'aberta')
+            os.mkdir(aberta)
+            os.chmod(aberta, 0o777)
+            with self.assertLogs(app.logger, level='WARNING'):
+                self.assertFalse(pasta_segura(aberta, app.logger))
+
+    def test_configurar_templates_nao_grava_nada(self):
+        """Configurar o cache (na importação do app) não cria a pasta nem compila templates"""
+        with tempfile.TemporaryDirectory() as raiz:
+            pasta = os.path.join(raiz, 'templates-cache')
+            outro = Flask(__name__, template_folder=app.template_folder)
+            outro.config['TEMPLATES_CACHE_PASTA'] = pasta
+            configurar_templates(outro)
+            self.assertFalse(os.path.exists(pasta))
+            self.assertEqual(len(outro.jinja_env.cache), 0)
+            # A pasta aparece quando o primeiro template é compilado
+            outro.jinja_env.get_template('base.html')
+            self.assertTrue(os.listdir(pasta))
+
+    def test_pagina_inicial_publica_com_etag(self):
+        """A página inicial de visitantes pode ficar em proxies e aceita If-None-Match"""
+        self.criar_promocao("Geral", 10)
+        resposta = self.app.get('/')
+        self.assertTrue(resposta.headers['Cache-Control'].startswith('public'))
+        resposta = self.app.get('/', headers={'If-None-Match': resposta.headers['ETag']})
+        self.assertEqual(resposta.status_code, 304)
+
+
+class ReservasLoteTests(BancoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        criar_usuario("Func", "func@teste.com", "9", "FUNCIONARIO")
+        for i in range(3):
+            criar_usuario(f"Cliente {i}", f"c{i}@teste.com", f"c{i}")
+        self.entrar("func@teste.com")
+
+    def enviar(self, reservas, atomico=True):
+        g.pop('_login_user', None)
+        return self.app.post('/api/funcionario/criar-reservas-lote', json={'reservas': reservas, 'atomico': atomico})
+
+    def lote_com_erros(self):
+        saida = (datetime.utcnow() + timedelta(days=2)).isoformat()
+        return [
+            {'cpf_cliente': 'c0', 'tipo_servico': 'HOTEL', 'numero_quarto': '101', 'valor_base': 200, 'data_saida_prevista': saida},
+            {'cpf_cliente': 'c1', 'tipo_servico': 'HOTEL', 'numero_quarto': '101', 'valor_base': 200, 'data_saida_prevista': saida},
+            {'cpf_cliente': 'nao-existe', 'tipo_servico': 'GARAGEM', 'valor_base': 30},
+        ]
+
+    def test_atomico_nao_grava_nada_se_um_falhar(self):
+        resposta = self.enviar(self.lote_com_erros())
+        self.assertEqual(resposta.status_code, 422)
+        resultados = resposta.get_json()['resultados']
+        self.assertEqual([r['criada'] for r in resultados], [False, False, False])
+        self.assertEqual(resultados[0]['erro'], 'não gravada: o lote tem itens com erro')
+        self.assertIn('101', resultados[1]['erro'])
+        self.assertEqual(resultados[2]['erro'], 'Cliente não encontrado')
+        self.assertEqual(Reserva.query.count(), 0)
+
+    def test_parcial_grava_os_itens_certos(self):
+        resposta = self.enviar(self.lote_com_erros(), atomico=False)
+        dados = resposta.get_json()
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual((dados['criadas'], dados['falhas']), (1, 2))
+        self.assertEqual(dados['resultados'][0]['reserva']['valor_final'], 200.0)
+        self.assertEqual(Reserva.query.count(), 1)
+
+        # O quarto agora está ocupado também para o próximo lote
+        resposta = self.enviar(self.lote_com_erros()[:1])
+        self.assertEqual(resposta.status_code, 422)
+
+    def test_desconto_fora_de_0_a_100(self):
+        """Desconto negativo ou acima de 100% é erro do item, não um valor final absurdo"""
+        itens = [{'cpf_cliente': 'c0', 'tipo_servico': 'GARAGEM', 'valor_base': 30, 'desconto_percentual': d}
+                 for d in (150, -5, 100)]
+        resultados = self.enviar(itens, atomico=False).get_json()['resultados']
+        self.assertEqual(resultados[0]['erro'], 'desconto_percentual deve estar entre 0 e 100')
+        self.assertEqual(resultados[1]['erro'], 'desconto_percentual deve estar entre 0 e 100')
+        self.assertEqual(resultados[2]['reserva']['valor_final'], 0.0)
+
+    def test_indice_velho_nao_recusa_o_lote(self):
+        """Reserva cancelada por outro processo não bloqueia o quarto no lote"""
+        self.assertEqual(self.enviar(self.lote_com_erros()[:1]).status_code, 200)
+        db.session.execute(Reserva.__table__.update().values(status='CANCELADA'))
+        db.session.commit()
+        self.assertEqual(self.enviar(self.lote_com_erros()[1:2]).status_code, 200)
+
+    def test_consultas_nao_crescem_com_o_lote(self):
+        """Clientes e vagas são conferidos com uma consulta cada, qualquer que seja o tamanho do lote"""
+        def lote(quantidade):
+            return [{'cpf_cliente': f'c{i % 3}', 'tipo_servico': 'GARAGEM', 'numero_vaga': f'A-{i + 1:02d}',
+                     'valor_base': 35} for i in range(quantidade)]
+
+        with contar_consultas() as pequeno:
+            self.assertEqual(self.enviar(lote(2)).get_json()['criadas'], 2)
+        Reserva.query.delete()
+        db.session.commit()
+        disponibilidade.invalidar()
+        with contar_consultas() as grande:
+            self.assertEqual(self.enviar(lote(30)).get_json()['criadas'], 30)
+        # Só os INSERTs crescem (um por reserva no SQLite, que não devolve os ids de um INSERT em lote)
+        self.assertLessEqual(grande['total'] - pequeno['total'], 30 - 2)
+
+
+class DisponibilidadeTests(BancoTestCase):
+
+    def reservar(self, quarto, saida):
+        return self.app.post('/api/cliente/nova-reserva', json={
+            'tipo_servico': 'HOTEL', 'valor_base': 250, 'numero_quarto': quarto,
+            'data_saida_prevista': saida
+        })
+
+    def test_recusa_quarto_ocupado(self):
+        """Dois clientes não podem reservar o mesmo quarto no mesmo período"""
+        criar_usuario("Cliente", "cli@teste.com", "2")
+        self.entrar("cli@teste.com")
+        saida = (datetime.utcnow() + timedelta(days=2)).isoformat()
+
+        self.assertEqual(self.reservar('101', saida).status_code, 200)
+        self.assertEqual(self.reservar('101', saida).status_code, 409)
+        self.assertEqual(self.reservar('102', saida).status_code, 200)
+
+        livres = self.app.get('/api/disponibilidade?tipo=HOTEL').get_json()['livres']
+        self.assertNotIn('101', livres)
+        self.assertNotIn('102', livres)
+        self.assertIn('103', livres)
+
+        # Depois de finalizada, a reserva libera o quarto
+        reserva = Reserva.query.filter_by(numero_quarto='101').first()
+        reserva.status = 'FINALIZADA'
+        db.session.commit()
+        livres = self.app.get('/api/disponibilidade?tipo=HOTEL').get_json()['livres']
+        self.assertIn('101', livres)
+
+    def test_indice_velho_nao_recusa_reserva(self):
+        """Reserva cancelada por outro processo: o índice ainda a vê, mas o banco decide"""
+        criar_usuario("Cliente", "cli@teste.com", "2")
+        self.entrar("cli@teste.com")
+        saida = (datetime.utcnow() + timedelta(days=2)).isoformat()
+        self.assertEqual(self.reservar('101', saida).status_code, 200)
+        self.assertNotIn('101', disponibilidade.livres('HOTEL', datetime.utcnow()))
+
+        # Como outro worker faria: o aviso de commit não chega a este processo
+        db.session.execute(Reserva.__table__.update().values(status='CANCELADA'))
+        db.session.commit()
+        g.pop('_login_user', None)
+        self.assertEqual(self.reservar('101', saida).status_code, 200)
+        self.assertEqual(Reserva.query.filter_by(numero_quarto='101', status='ATIVA').count(), 1)
+
+    def test_checkout_passa_para_o_proximo_livre(self):
+        """Se outro checkout levou o primeiro quarto livre, a reserva fica com o seguinte"""
+        cliente = criar_usuario("Cliente", "cli@teste.com", "2")
+        self.entrar("cli@teste.com")
+        entrada = datetime.utcnow() + timedelta(days=1)
+        saida = entrada + timedelta(days=2)
+        self.assertEqual(disponibilidade.livres('HOTEL', entrada, saida)[0], '101')
+
+        # Gravado por outro worker: este processo ainda vê o 101 livre
+        db.session.execute(Reserva.__table__.insert().values(
+            cliente_id=cliente.id, tipo_servico='HOTEL', numero_quarto='101', valor_base=250,
+            desconto_percentual=0, valor_final=250, data_entrada=entrada, data_saida_prevista=saida, status='ATIVA'
+        ))
+        db.session.commit()
+        g.pop('_login_user', None)
+        resposta = self.app.post('/checkout/processar', data={
+            'tipo_servico': 'HOTEL', 'valor_base': '250',
+            'data_entrada': entrada.isoformat(timespec='minutes'), 'data_saida': saida.isoformat(timespec='minutes')
+        })
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(sorted(r.numero_quarto for r in Reserva.query), ['101', '102'])
+
+    def test_estadia_longa_atras_de_uma_curta(self):
+        """Períodos sobrepostos (dados antigos): a estadia longa continua ocupando o quarto"""
+        agenda = _Agenda()
+        dia = datetime(2026, 5, 1)
+        agenda.adicionar(dia, dia + timedelta(days=10), 1)
+        agenda.adicionar(dia + timedelta(days=1), dia + timedelta(days=2), 2)
+        self.assertEqual(agenda.conflito(dia + timedelta(days=5), dia + timedelta(days=6)), 1)
+        self.assertIsNone(agenda.conflito(dia + timedelta(days=5), dia + timedelta(days=6), ignorar=1))
+        agenda.remover(1)
+        self.assertIsNone(agenda.conflito(dia + timedelta(days=5), dia + timedelta(days=6)))
+
+    def test_reservas_simultaneas_do_mesmo_quarto(self):
+        """Várias threads reservando o mesmo quarto em um SQLite de verdade: só uma consegue"""
+        with tempfile.TemporaryDirectory() as pasta:
+            app_teste = Flask('disponibilidade_teste')
+            app_teste.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{pasta}/reservas.db'
+            app_teste.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+            db.init_app(app_teste)
+            with app_teste.app_context():
+                db.create_all()
+                cliente = Usuario(nome='C', email='c@teste.com', cpf='c', telefone='0', senha_hash='x')
+                db.session.add(cliente)
+                db.session.commit()
+                cliente_id = cliente.id
+            disponibilidade.invalidar()
+            entrada = datetime(2026, 5, 1, 14)
+            largada = threading.Barrier(8)
+            aceitas = []
+
+            def reservar():
+                with app_teste.app_context():
+                    try:
+                        largada.wait()
+                        reserva = Reserva(cliente_id=cliente_id, tipo_servico='HOTEL', numero_quarto='101',
+                                          valor_base=100, valor_final=100, data_entrada=entrada,
+                                          data_saida_prevista=entrada + timedelta(days=2))
+                        if verificar_reserva(reserva) is None:
+                            db.session.add(reserva)
+                            db.session.commit()
+                            aceitas.append(reserva.id)
+                        else:
+                            db.session.rollback()
+                    except Exception:
+                        # "database is locked": a concorrente foi recusada, nada foi gravado
+                        db.session.rollback()
+                    finally:
+                        db.session.remove()
+
+            threads = [threading.Thread(target=reservar) for _ in range(8)]
+            try:
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                with app_teste.app_context():
+                    self.assertEqual(len(aceitas), 1)
+                    self.assertEqual(Reserva.query.filter_by(numero_quarto='101', status='ATIVA').count(), 1)
+            finally:
+                with app_teste.app_context():
+                    db.session.remove()
+                    db.engine.dispose()
+                disponibilidade.invalidar()
+
+
+class NotificacoesTests(BancoTestCase):
+
+    def test_commit_publica_evento(self):
+        """Salvar um ponto avisa o admin e o próprio funcionário, e a fila tem limite"""
+        funcionario = criar_usuario("Func", "f@teste.com", "f", tipo='FUNCIONARIO')
+        admin = central.assinar(['admin'], tamanho=2)
+        proprio = central.assinar([f'usuario:{funcionario.id}'])
+        outro = central.assinar(['cliente'])
+        try:
+            for dia in (1, 2, 3):
+                db.session.add(RegistroPonto(funcionario_id=funcionario.id, data=datetime(2026, 1, dia).date(),
+                                             hora_entrada=datetime(2026, 1, dia, 8)))
+                db.session.commit()
+
+            self.assertEqual(proprio.fila.qsize(), 3)
+            self.assertTrue(outro.fila.empty())
+            # A fila do admin guarda só os 2 avisos mais recentes
+            self.assertEqual(admin.fila.qsize(), 2)
+            mensagem = admin.fila.get_nowait()
+            self.assertTrue(mensagem.startswith('event: ponto\n'))
+            self.assertEqual(json.loads(mensagem.split('data: ')[1])['data'], '2026-01-02')
+        finally:
+            for assinatura in (admin, proprio, outro):
+                central.cancelar(assinatura)
+
+
+class ImportacaoTests(BancoTestCase):
+
+    def test_importar_clientes_csv(self):
+        """O comando importa o CSV em lotes, ignorando repetidos e inválidos"""
+        criar_usuario("Já Existe", "existe@teste.com", "100")
+        criar_usuario("Antiga", "Antiga@Teste.com", "99")
+        pasta = tempfile.mkdtemp()
+        caminho = os.path.join(pasta, 'clientes.csv')
+        senhas = os.path.join(pasta, 'senhas.csv')
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write("nome,email,cpf,telefone,senha\n")
+            arquivo.write("Ana,ana@teste.com,101,1,abc\n")
+            arquivo.write("Bia,BIA@teste.com,102,2,\n")
+            arquivo.write("Ana de novo,ana@teste.com,103,3,\n")
+            arquivo.write("Existe,existe@teste.com,104,4,\n")
+            arquivo.write("Sem email,,105,5,\n")
+            arquivo.write("Caio,caio@teste.com,106,6,\n")
+            arquivo.write("Antiga,antiga@teste.com,107,7,xyz\n")
+        try:
+            # Sem --senhas-geradas, quem não tem senha fica de fora
+            resultado = app.test_cli_runner().invoke(args=['importar-clientes', caminho, '--processos', '1'])
+            self.assertIn('Clientes inseridos: 1', resultado.output)
+            self.assertIn('Ignoradas (senha vazia): 4', resultado.output)
+            self.assertIn('Ignoradas (já cadastrado): 1', resultado.output)
+            self.assertIsNone(Usuario.query.filter_by(email='bia@teste.com').first())
+            Usuario.query.filter_by(email='ana@teste.com').delete()
+            db.session.commit()
+
+            resultado = app.test_cli_runner().invoke(
+                args=['importar-clientes', caminho, '--lote', '2', '--processos', '2', '--senhas-geradas', senhas]
+            )
+            with open(senhas, encoding='utf-8') as arquivo:
+                geradas = dict(csv.reader(arquivo))
+            self.assertEqual(os.stat(senhas).st_mode & 0o077, 0)
+        finally:
+            shutil.rmtree(pasta)
+
+        self.assertEqual(resultado.exit_code, 0, resultado.output)
+        self.assertIn('Clientes inseridos: 3', resultado.output)
+        self.assertIn('Senhas geradas: 2', resultado.output)
+        ana = Usuario.query.filter_by(email='ana@teste.com').first()
+        self.assertTrue(ana.verificar_senha('abc'))
+        self.assertEqual(ana.tipo_usuario, 'CLIENTE')
+        # O email com maiúsculas já cadastrado não é duplicado
+        self.assertEqual(Usuario.query.filter(db.func.lower(Usuario.email) == 'antiga@teste.com').count(), 1)
+        self.assertEqual(sorted(geradas), ['bia@teste.com', 'caio@teste.com'])
+        for email, senha in geradas.items():
+            self.assertTrue(Usuario.query.filter_by(email=email).first().verificar_senha(senha))
+
+    def test_ndjson_com_linha_quebrada(self):
+        """Uma linha de NDJSON com defeito é ignorada e o resto do lote é gravado"""
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False, encoding='utf-8') as arquivo:
+            arquivo.write('{"nome": "Ana", "email": "ana@teste.com", "cpf": "1", "telefone": "1", "senha": "a"}\n')
+            arquivo.write('{"nome": "Bia", "email": \n')
+            arquivo.write('[1, 2]\n')
+            arquivo.write('{"nome": "Caio", "email": "caio@teste.com", "cpf": "3", "telefone": "3", "senha": "c"}\n')
+        try:
+            resultado = app.test_cli_runner().invoke(args=['importar-clientes', arquivo.name, '--processos', '1'])
+        finally:
+            os.remove(arquivo.name)
+
+        self.assertEqual(resultado.exit_code, 0, resultado.output)
+        self.assertIn('Clientes inseridos: 2', resultado.output)
+        self.assertIn('Ignoradas (linha inválida): 2', resultado.output)
+        self.assertIn('Linhas inválidas: 2, 3', resultado.output)
+
+
+class ExportacaoTests(BancoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        criar_usuario("Admin", "adm@teste.com", "1", "ADM")
+        cliente = criar_usuario("Cliente", "cli@teste.com", "2")
+        funcionario = criar_usuario("Func", "func@teste.com", "3", "FUNCIONARIO")
+        for dia, tipo, status in ((1, 'HOTEL', 'FINALIZADA'), (2, 'GARAGEM', 'FINALIZADA'),
+                                  (3, 'HOTEL', 'CANCELADA'), (20, 'HOTEL', 'FINALIZADA')):
+            r = Reserva(cliente_id=cliente.id, tipo_servico=tipo, status=status, valor_base=100,
+                        desconto_percentual=10, data_entrada=datetime(2024, 3, dia, 10))
+            r.calcular_valor_final()
+            db.session.add(r)
+        db.session.add(RegistroPonto(funcionario_id=funcionario.id, data=datetime(2024, 3, 1).date(),
+                                     hora_entrada=datetime(2024, 3, 1, 8), hora_saida=datetime(2024, 3, 1, 17),
+                                     total_horas=9))
+        db.session.commit()
+
+    def test_exporta_reservas_filtradas_em_gzip(self):
+        """O CSV vem compactado e só com as reservas dos filtros"""
+        self.entrar("adm@teste.com")
+        resposta = self.app.get(
+            '/api/admin/exportar/reservas?inicio=2024-03-01&fim=2024-03-10&tipo_servico=hotel&status=FINALIZADA',
+            headers={'Accept-Encoding': 'gzip'}
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.headers['Content-Encoding'], 'gzip')
+        linhas = list(csv.DictReader(io.StringIO(gzip.decompress(resposta.data).decode('utf-8'))))
+        self.assertEqual(len(linhas), 1)
+        self.assertEqual(linhas[0]['cliente'], 'Cliente')
+        self.assertEqual(linhas[0]['valor_final'], '90.00')
+
+        # gzip;q=0 recusa o gzip
+        recusado = self.app.get('/api/admin/exportar/reservas', headers={'Accept-Encoding': 'gzip;q=0'})
+        self.assertNotIn('Content-Encoding', recusado.headers)
+        self.assertIn('valor_final', recusado.get_data(as_text=True))
+
+        self.assertEqual(self.app.get('/api/admin/exportar/reservas?status=PERDIDA').status_code, 400)
+
+    def test_exporta_pontos_em_ndjson_pelo_terminal(self):
+        """O comando flask exportar grava uma linha JSON por registro de ponto"""
+        with tempfile.NamedTemporaryFile(suffix='.ndjson', delete=False) as arquivo:
+            pass
+        try:
+            resultado = app.test_cli_runner().invoke(
+                args=['exportar', 'pontos', arquivo.name, '--formato', 'ndjson', '--inicio', '2024-03-01']
+            )
+            with open(arquivo.name, encoding='utf-8') as saida:
+                linhas = [json.loads(linha) for linha in saida]
+        finally:
+            os.remove(arquivo.name)
+
+        self.assertEqual(resultado.exit_code, 0, resultado.output)
+        self.assertEqual(len(linhas), 1)
+        self.assertEqual(linhas[0]['funcionario'], 'Func')
+        self.assertEqual(linhas[0]['total_horas'], '9.00')
+
+
+class AgregadosTests(BancoTestCase):
+
+    def linhas_agregadas(self):
+        return sorted(
+            (a.dia, a.tipo_servico, a.reservas, a.finalizadas, a.canceladas, float(a.receita), float(a.soma_descontos))
+            for a in AgregadoDiario.query.all()
+        )
+
+    def test_agregados_acompanham_as_reservas(self):
+        """Criar, finalizar, cancelar e mudar a data mantêm os agregados iguais a uma reconstrução"""
+        cliente = criar_usuario("Cliente", "cli@teste.com", "2")
+        reservas = []
+        for dia, tipo, desconto in ((1, 'HOTEL', 10), (1, 'HOTEL', 0), (1, 'GARAGEM', 5), (2, 'HOTEL', 20)):
+            r = Reserva(cliente_id=cliente.id, tipo_servico=tipo, valor_base=100,
+                        desconto_percentual=desconto, data_entrada=datetime(2024, 3, dia, 10))
+            r.calcular_valor_final()
+            reservas.append(r)
+        db.session.add_all(reservas)
+        db.session.commit()
+
+        reservas[0].status = 'FINALIZADA'     # objeto expirado depois do commit
+        reservas[2].status = 'CANCELADA'
+        db.session.commit()
+        r = db.session.get(Reserva, reservas[3].id)
+        r.status = 'FINALIZADA'
+        r.data_entrada = datetime(2024, 4, 5, 9)
+        db.session.commit()
+
+        incremental = self.linhas_agregadas()
+        self.assertIn((datetime(2024, 3, 1).date(), 'HOTEL', 2, 1, 0, 90.0, 10.0), incremental)
+        self.assertIn((datetime(2024, 4, 5).date(), 'HOTEL', 1, 1, 0, 80.0, 20.0), incremental)
+        self.assertFalse(any(linha[0] == datetime(2024, 3, 2).date() for linha in incremental))
+
+        reconstruir(db.session.connection())
+        db.session.commit()
+        self.assertEqual(incremental, self.linhas_agregadas())
+
+    def test_serie_de_receita_por_mes(self):
+        """A rota /api/admin/receita soma os agregados por mês"""
+        criar_usuario("Admin", "adm@teste.com", "1", "ADM")
+        cliente = criar_usuario("Cliente", "cli@teste.com", "2")
+        for mes, valor in ((1, 100), (1, 50), (2, 30), (3, 70)):
+            r = Reserva(cliente_id=cliente.id, tipo_servico='GARAGEM', valor_base=valor, desconto_percentual=0,
+                        status='FINALIZADA', data_entrada=datetime(2024, mes, 10))
+            r.calcular_valor_final()
+            db.session.add(r)
+        db.session.commit()
+
+        self.entrar("adm@teste.com")
+        dados = self.app.get('/api/admin/receita?agrupar=mes&inicio=2024-01&fim=2024-02').get_json()
+        self.assertEqual([(s['periodo'], s['receita']) for s in dados['serie']], [('2024-01', 150.0), ('2024-02', 30.0)])
+        self.assertEqual(dados['receita_total'], 180.0)
+        self.assertEqual(self.app.get('/api/admin/receita?agrupar=semana').status_code, 400)
+        self.assertEqual(self.app.get('/api/admin/estatisticas').get_json()['receita_total'], 250.0)
+
+
+class FolhaTests(BancoTestCase):
+
+    def test_folha_do_mes(self):
+        """Horas, extras e saídas faltando por funcionário, em uma consulta"""
+        criar_usuario("Admin", "adm@teste.com", "1", "ADM")
+        ana = criar_usuario("Ana", "ana@teste.com", "2", "FUNCIONARIO")
+        criar_usuario("Bruno", "bruno@teste.com", "3", "FUNCIONARIO")
+        for dia, horas in ((4, 8), (5, 10), (6, None)):
+            entrada = datetime(2024, 3, dia, 8)
+            db.session.add(RegistroPonto(
+                funcionario_id=ana.id, data=entrada.date(), hora_entrada=entrada,
+                hora_saida=entrada + timedelta(hours=horas) if horas else None, total_horas=horas
+            ))
+        # Fora do mês pedido
+        db.session.add(RegistroPonto(funcionario_id=ana.id, data=datetime(2024, 4, 1).date(),
+                                     hora_entrada=datetime(2024, 4, 1, 8)))
+        db.session.commit()
+
+        with contar_consultas() as consultas:
+            relatorio = relatorio_mensal(*ler_mes('2024-03'))
+        self.assertEqual(consultas['total'], 1)
+        self.assertEqual([f['nome'] for f in relatorio], ['Ana', 'Bruno'])
+        self.assertEqual(relatorio[0]['dias_trabalhados'], 3)
+        self.assertEqual(relatorio[0]['total_horas'], 18.0)
+        self.assertEqual(relatorio[0]['horas_extras'], 2.0)
+        self.assertEqual(relatorio[0]['saidas_faltando'], 1)
+        self.assertEqual(relatorio[1]['total_horas'], 0.0)
+
+        self.entrar("adm@teste.com")
+        resposta = self.app.get('/api/admin/folha?mes=2024-03&formato=csv')
+        self.assertIn('Ana,2,3,18.0,16.0,2.0,1', resposta.get_data(as_text=True))
+        self.assertEqual(self.app.get('/api/admin/folha?mes=03-2024').status_code, 400)
+
+
+class PontoTests(BancoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.funcionario = criar_usuario("Func", "func@teste.com", "9", "FUNCIONARIO")
+        self.entrar("func@teste.com")
+        self.intervalo = app.config['PONTO_INTERVALO_MINIMO']
+
+    def tearDown(self):
+        app.config['PONTO_INTERVALO_MINIMO'] = self.intervalo
+        super().tearDown()
+
+    def bater(self):
+        g.pop('_login_user', None)
+        return self.app.post('/api/funcionario/bater-ponto')
+
+    def test_entrada_saida_e_ponto_completo(self):
+        """Cada batida é um comando só; a saída vem com as horas calculadas pelo banco"""
+        painel = central.assinar([f'usuario:{self.funcionario.id}'])
+        try:
+            with contar_consultas() as entrada:
+                resposta = self.bater()
+            self.assertEqual(resposta.get_json()['tipo'], 'entrada')
+            # Dedo duplo no relógio: a entrada continua e nada muda no banco
+            self.assertEqual(self.bater().status_code, 409)
+
+            app.config['PONTO_INTERVALO_MINIMO'] = 0
+            with contar_consultas() as saida:
+                dados = self.bater().get_json()
+            self.assertEqual(dados['tipo'], 'saida')
+            self.assertEqual(dados['total_horas'], 0.0)
+            self.assertEqual(self.bater().status_code, 400)
+            self.assertEqual(entrada['total'], saida['total'])
+
+            # Os avisos de commit valem também para o comando feito direto em SQL
+            self.assertEqual(painel.fila.qsize(), 2)
+        finally:
+            central.cancelar(painel)
+        self.assertEqual(RegistroPonto.query.count(), 1)
+
+    def test_saida_soma_as_horas_no_banco(self):
+        entrada = datetime(2026, 3, 2, 8, 0)
+        self.assertEqual(bater_ponto(self.funcionario.id, entrada)[0], 'entrada')
+        tipo, ponto = bater_ponto(self.funcionario.id, entrada + timedelta(hours=8, minutes=45))
+        db.session.commit()
+        self.assertEqual(tipo, 'saida')
+        self.assertEqual(float(ponto['total_horas']), 8.75)
+        self.assertEqual(float(db.session.get(RegistroPonto, ponto['id']).total_horas), 8.75)
+
+    def test_batidas_simultaneas_criam_um_ponto_por_dia(self):
+        """Muitas threads batendo o ponto ao mesmo tempo em um SQLite de verdade (arquivo)"""
+        with tempfile.TemporaryDirectory() as pasta:
+            app_teste = Flask('ponto_teste')
+            app_teste.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{pasta}/ponto.db'
+            app_teste.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+            db.init_app(app_teste)
+            with app_teste.app_context():
+                db.create_all()
+                ids = []
+                for i in range(3):
+                    funcionario = Usuario(nome=f'F{i}', email=f'f{i}@teste.com', cpf=f'f{i}', telefone='0',
+                                          senha_hash='x', tipo_usuario='FUNCIONARIO')
+                    db.session.add(funcionario)
+                    db.session.flush()
+                    ids.append(funcionario.id)
+                db.session.commit()
+
+            inicio = datetime(2026, 3, 2, 8, 0)
+            resultados, erros = [], []
+
+            def onda(momento):
+                largada = threading.Barrier(8 * len(ids))
+
+                def bater(funcionario_id):
+                    try:
+                        with app_teste.app_context():
+                            largada.wait()
+                            tipo, _ = bater_ponto(funcionario_id, momento)
+                            db.session.commit()
+                            resultados.append((funcionario_id, tipo))
+                    except Exception as erro:
+                        erros.append(erro)
+
+                threads = [threading.Thread(target=bater, args=(f,)) for f in ids for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            try:
+                onda(inicio)
+                onda(inicio + timedelta(hours=8))
+                with app_teste.app_context():
+                    pontos = RegistroPonto.query.all()
+                    self.assertEqual(erros, [])
+                    self.assertEqual(len(pontos), len(ids))
+                    self.assertEqual({float(p.total_horas) for p in pontos}, {8.0})
+                    for funcionario_id in ids:
+                        tipos = sorted(tipo for f, tipo in resultados if f == funcionario_id)
+                        self.assertEqual(tipos, ['completo'] * 7 + ['entrada'] + ['repetido'] * 7 + ['saida'])
+            finally:
+                with app_teste.app_context():
+                    db.session.remove()
+                    db.engine.dispose()
+
+
+class TarefasTests(BancoTestCase):
+
+    def test_checkout_e_registro_deixam_o_resto_para_a_fila(self):
+        """A conta do convidado fica sem senha; os e-mails saem pelo flask worker"""
+        saida = (datetime.utcnow() + timedelta(days=1)).isoformat(timespec='minutes')
+        resposta = self.app.post('/checkout/processar', data={
+            'guest_mode': 'true', 'nome': 'Convidado', 'email': 'conv@teste.com', 'cpf': '55',
+            'telefone': '0', 'tipo_servico': 'GARAGEM', 'valor_base': '35', 'data_saida': saida
+        })
+        self.assertEqual(resposta.status_code, 302)
+        self.app.post('/logout')
+        self.app.post('/registro', data={'nome': 'Nova', 'email': 'nova@teste.com', 'cpf': '56',
+                                         'telefone': '0', 'senha': 'segredo'})
+
+        convidado = Usuario.query.filter_by(email='conv@teste.com').one()
+        self.assertEqual(convidado.senha_hash, SENHA_PENDENTE)
+        self.assertEqual(sorted(t.nome for t in Tarefa.query.filter_by(status='PENDENTE')),
+                         ['email_boas_vindas', 'email_reserva'])
+
+        with self.assertLogs(app.logger, level='INFO') as log:
+            resultado = app.test_cli_runner().invoke(args=['worker', '--uma-vez'])
+        self.assertEqual(resultado.exit_code, 0, resultado.output)
+        self.assertIn('2 tarefas executadas', resultado.output)
+        self.assertTrue(any('conv@teste.com' in linha for linha in log.output))
+        self.assertEqual({t.status for t in Tarefa.query}, {'CONCLUIDA'})
+        db.session.expire_all()
+        # Ninguém entra na conta do convidado até ele definir uma senha
+        self.assertEqual(db.session.get(Usuario, convidado.id).senha_hash, SENHA_PENDENTE)
+        self.assertFalse(db.session.get(Usuario, convidado.id).verificar_senha(''))
+
+    def test_chave_repetida_e_novas_tentativas(self):
+        """A mesma chave entra uma vez; cada falha espera mais, até desistir"""
+        chamadas = []
+
+        @fila_tarefas.tarefa('teste_instavel', tentativas=2)
+        def instavel(numero):
+            chamadas.append(numero)
+            raise RuntimeError('servidor fora do ar')
+        self.addCleanup(fila_tarefas._funcoes.pop, 'teste_instavel')
+
+        primeira = fila_tarefas.enfileirar('teste_instavel', {'numero': 7}, chave='instavel:7')
+        segunda = fila_tarefas.enfileirar('teste_instavel', {'numero': 7}, chave='instavel:7')
+        db.session.commit()
+        self.assertEqual(primeira, segunda)
+        self.assertEqual(Tarefa.query.count(), 1)
+
+        with self.assertLogs(app.logger, level='WARNING'):
+            self.assertEqual(fila_tarefas.processar(), 1)
+        tarefa = db.session.get(Tarefa, primeira)
+        self.assertEqual((tarefa.status, tarefa.tentativas), ('PENDENTE', 1))
+        self.assertIn('servidor fora do ar', tarefa.ultimo_erro)
+        self.assertGreater(tarefa.executar_em, datetime.utcnow() + timedelta(seconds=4))
+        # Ainda esperando a próxima tentativa
+        self.assertEqual(fila_tarefas.processar(), 0)
+
+        tarefa.executar_em = datetime.utcnow()
+        db.session.commit()
+        with self.assertLogs(app.logger, level='WARNING'):
+            fila_tarefas.processar()
+        db.session.expire_all()
+        self.assertEqual(db.session.get(Tarefa, primeira).status, 'FALHOU')
+        self.assertEqual(chamadas, [7, 7])
+        self.assertEqual(fila_tarefas.processar(), 0)
+
+    def test_tarefa_presa_volta_para_a_fila(self):
+        """Se o trabalhador cair no meio, outro pega a tarefa depois de TAREFAS_TEMPO_LIMITE"""
+        feitas = []
+        fila_tarefas.tarefa('teste_ok')(lambda: feitas.append(1))
+        self.addCleanup(fila_tarefas._funcoes.pop, 'teste_ok')
+        fila_tarefas.enfileirar('teste_ok')
+        db.session.commit()
+
+        antiga, = fila_tarefas.reservar('caiu')
+        self.assertEqual(fila_tarefas.processar(), 0)
+        Tarefa.query.update({'travada_em': datetime.utcnow() - timedelta(hours=1)})
+        db.session.commit()
+        self.assertEqual(fila_tarefas.processar(), 1)
+        self.assertEqual((feitas, Tarefa.query.one().tentativas), ([1], 2))
+
+        # O primeiro trabalhador volta e termina: a tarefa já não é dele
+        with self.assertLogs(app.logger, level='WARNING'):
+            self.assertFalse(fila_tarefas.executar(antiga))
+        db.session.expire_all()
+        self.assertEqual(Tarefa.query.one().status, 'CONCLUIDA')
+
+
+class MigracoesTests(BancoTestCase):
+
+    def test_migrar_cria_indices_faltando(self):
+        """Um banco antigo (sem os índices novos) é atualizado pelo migrar"""
+        with db.engine.begin() as conexao:
+            conexao.exec_driver_sql('DROP INDEX ix_reservas_cliente_data')
+            conexao.exec_driver_sql('DROP INDEX uq_registros_ponto_funcionario_data')
+
+        mensagens = []
+        comandos = migrar(db.engine, executar=False, mostrar=mensagens.append)
+        self.assertEqual(len(comandos), 2)
+        self.assertTrue(any('ix_reservas_cliente_data' in comando for comando in comandos))
+
+        migrar(db.engine, mostrar=mensagens.append)
+        self.assertEqual(indices_faltando(db.engine), [])
+
+    def test_ponto_unico_troca_o_indice_antigo(self):
+        """O índice único só é criado sem pontos repetidos, e o índice comum antigo sai"""
+        funcionario = criar_usuario("Func", "func@teste.com", "9", "FUNCIONARIO")
+        with db.engine.begin() as conexao:
+            conexao.exec_driver_sql('DROP INDEX uq_registros_ponto_funcionario_data')
+            conexao.exec_driver_sql('CREATE INDEX ix_registros_ponto_funcionario_data ON registros_ponto (funcionario_id, data)')
+        for _ in range(2):
+            db.session.add(RegistroPonto(funcionario_id=funcionario.id, data=datetime(2026, 3, 2).date(),
+                                         hora_entrada=datetime(2026, 3, 2, 8)))
+        db.session.commit()
+
+        mensagens = []
+        self.assertEqual(migrar(db.engine, mostrar=mensagens.append), [])
+        self.assertIn('linhas repetidas', mensagens[0])
+
+        RegistroPonto.query.filter(RegistroPonto.id > 1).delete()
+        db.session.commit()
+        comandos = migrar(db.engine, mostrar=mensagens.append)
+        self.assertEqual(comandos[-1], 'DROP INDEX ix_registros_ponto_funcionario_data')
+        nomes = {indice['name'] for indice in inspect(db.engine).get_indexes('registros_ponto')}
+        self.assertIn('uq_registros_ponto_funcionario_data', nomes)
+        self.assertNotIn('ix_registros_ponto_funcionario_data', nomes)
+
+    def test_migrar_preenche_os_agregados(self):
+        """Banco antigo sem agregados: o migrar já calcula a receita das reservas existentes"""
+        cliente = criar_usuario("Cliente", "cli@teste.com", "2")
+        reserva = Reserva(cliente_id=cliente.id, tipo_servico='GARAGEM', valor_base=80, desconto_percentual=0,
+                          status='FINALIZADA')
+        reserva.calcular_valor_final()
+        db.session.add(reserva)
+        db.session.commit()
+        AgregadoDiario.__table__.drop(db.engine)
+
+        mensagens = []
+        migrar(db.engine, mostrar=mensagens.append)
+        self.assertTrue(any('reconstruir-agregados' in mensagem for mensagem in mensagens))
+        estatisticas.limpar()
+        self.assertEqual(estatisticas.obter()['receita_total'], 80.0)
+
+    def test_auditoria_sem_varreduras(self):
+        """Com os índices dos modelos nenhuma consulta quente lê a tabela inteira"""
+        resultado = auditar(db.engine)
+        varreduras = [nome for nome, _, varredura in resultado if varredura]
+        self.assertEqual(varreduras, [])
+        # O SQL é o das rotas: minhas-reservas traz cliente e funcionário no mesmo SELECT
+        planos = {nome: plano for nome, plano, _ in resultado}
+        self.assertEqual(sum('usuarios' in linha for linha in planos['minhas-reservas (cliente por data)']), 2)
+
+    def test_auditoria_conta_scan_de_indice_como_varredura(self):
+        """Percorrer um índice inteiro (SCAN ... USING COVERING INDEX) também é ler a tabela toda"""
+        with db.engine.connect() as conexao:
+            plano, varredura = _plano(conexao, 'SELECT COUNT(status) FROM reservas')
+        self.assertTrue(any('COVERING INDEX' in linha for linha in plano), plano)
+        self.assertTrue(varredura)
+
+
+class BenchmarkTests(BancoTestCase):
+
+    def test_dados_sinteticos_e_rotas(self):
+        """O gerador cria a quantidade pedida e todas as rotas /api/* respondem sem erro"""
+        ids = GeradorDados(semente=7, mostrar=lambda _: None).gerar(usuarios=40, reservas=300, pontos=100)
+        self.assertEqual(Usuario.query.count(), 40)
+        self.assertEqual(Reserva.query.count(), 300)
+        self.assertEqual(RegistroPonto.query.count(), 100)
+        self.assertEqual(len(ids['funcionarios']) + len(ids['clientes']) + 1, 40)
+        # Reservas ativas do mesmo quarto/vaga nunca se sobrepõem
+        ativas = {}
+        for reserva in Reserva.query.filter_by(status='ATIVA').order_by(Reserva.data_entrada):
+            recurso = (reserva.tipo_servico, reserva.numero_quarto or reserva.numero_vaga)
+            self.assertLessEqual(ativas.get(recurso, reserva.data_entrada), reserva.data_entrada)
+            ativas[recurso] = max(ativas.get(recurso, reserva.data_saida_prevista), reserva.data_saida_prevista)
+
+        resultados = medir_rotas(ids, repeticoes=1)
+        self.assertTrue(any(r['rota'] == '/api/admin/estatisticas' for r in resultados))
+        self.assertEqual([r['rota'] for r in resultados if r['status'] >= 500 or r['status'] == 403], [])
+        self.assertEqual(len(medir_modelos(repeticoes=1, amostra=10)), 5)
+        g.pop('_login_user', None)
+
+    def test_dados_sinteticos_com_poucos_quartos(self):
+        """Com um quarto e uma vaga só, as reservas ativas que não cabem saem canceladas"""
+        antes = app.config['QUARTOS_HOTEL'], app.config['VAGAS_GARAGEM']
+        app.config['QUARTOS_HOTEL'], app.config['VAGAS_GARAGEM'] = ['101'], ['A-01']
+        try:
+            GeradorDados(semente=3, mostrar=lambda _: None).gerar(usuarios=20, reservas=1500, pontos=0)
+        finally:
+            app.config['QUARTOS_HOTEL'], app.config['VAGAS_GARAGEM'] = antes
+        ativas = Reserva.query.filter_by(status='ATIVA').order_by(Reserva.data_entrada).all()
+        for tipo in ('HOTEL', 'GARAGEM'):
+            do_tipo = [r for r in ativas if r.tipo_servico == tipo]
+            for anterior, seguinte in zip(do_tipo, do_tipo[1:]):
+                self.assertLessEqual(anterior.data_saida_prevista, seguinte.data_entrada)
+
+
+class InstrumentacaoTests(BancoTestCase):
+
+    def test_server_timing_e_metrics(self):
+        """Cada resposta traz o Server-Timing e /metrics soma as requisições por rota"""
+        criar_usuario("Admin", "adm@teste.com", "1", "ADM")
+        instrumentacao.zerar()
+        self.entrar("adm@teste.com")
+        g.pop('_login_user', None)
+
+        resposta = self.app.get('/api/admin/usuarios')
+        self.assertRegex(resposta.headers['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ consultas", app;dur=')
+
+        texto = self.app.get('/metrics').get_data(as_text=True)
+        self.assertIn('http_requisicao_duracao_segundos_count{endpoint="api_admin_usuarios",method="GET",status="200"} 1', texto)
+        self.assertIn('identidade_cache_faltas_total', texto)
+
+    def test_metrics_exige_admin_ou_token(self):
+        """Sem login de Admin nem token, /metrics recusa, a menos que METRICAS_PUBLICAS esteja ligado"""
+        criar_usuario("Cliente", "cli@teste.com", "2")
+        self.assertEqual(self.app.get('/metrics').status_code, 403)
+        self.entrar("cli@teste.com")
+        g.pop('_login_user', None)
+        self.assertEqual(self.app.get('/metrics').status_code, 403)
+        self.app.get('/logout')
+        g.pop('_login_user', None)
+
+        app.config['METRICAS_TOKEN'] = 'segredo'
+        try:
+            self.assertEqual(self.app.get('/metrics', headers={'Authorization': 'Bearer errado'}).status_code, 403)
+            self.assertEqual(self.app.get('/metrics', headers={'Authorization': 'Bearer segredo'}).status_code, 200)
+        finally:
+            app.config['METRICAS_TOKEN'] = None
+
+        app.config['METRICAS_PUBLICAS'] = True
+        try:
+            self.assertEqual(self.app.get('/metrics').status_code, 200)
+        finally:
+            app.config['METRICAS_PUBLICAS'] = False
+
+    def test_consulta_lenta_vai_para_o_log(self):
+        """Com um limite minúsculo toda consulta é registrada como lenta, com a rota; 0 desliga"""
+        app.config['SQL_LENTA_MS'] = 0.000001
+        try:
+            with self.assertLogs(app.logger, level='WARNING') as log:
+                self.app.get('/')
+            app.config['SQL_LENTA_MS'] = 0
+            with self.assertNoLogs(app.logger, level='WARNING'):
+                self.app.get('/')
+        finally:
+            app.config['SQL_LENTA_MS'] = 200
+        self.assertIn('GET /', log.output[0])
+
+
+class ReplicaTests(unittest.TestCase):
+    """Dois arquivos SQLite fazem o papel do primário e da réplica"""
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        roteador_replica.limpar()
+        roteador_replica.zerar_metricas()
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    @contextmanager
+    def app_com_replica(self, url_replica=None):
+        app_teste = Flask('replica_teste')
+        app_teste.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{self.pasta.name}/primario.db'
+        app_teste.config['SQLALCHEMY_BINDS'] = {
+            'replica': url_replica or f'sqlite:///{self.pasta.name}/replica.db'
+        }
+        db.init_app(app_teste)
+
+        @app_teste.route('/relatorio')
+        @leitura_na_replica
+        def relatorio_teste_replica():
+            return {'usuarios': Usuario.query.count()}
+
+        with app_teste.app_context():
+            db.create_all(bind_key=None)
+            if url_replica is None:
+                db.metadata.create_all(db.engines['replica'])
+                # A réplica "atrasada" tem um usuário que o primário não tem mais
+                with db.engines['replica'].begin() as conexao:
+                    conexao.execute(Usuario.__table__.insert(), [
+                        {'nome': 'Antigo', 'email': 'antigo@teste.com', 'cpf': '9', 'telefone': '0', 'senha_hash': 'x', 'tipo_usuario': 'CLIENTE'}
+                    ])
+            try:
+                yield app_teste
+            finally:
+                db.session.remove()
+                for engine in db.engines.values():
+                    engine.dispose()
+                # O init_app registra o bind 'replica' no db compartilhado com os outros testes
+                db.metadatas.pop('replica', None)
+
+    def test_leituras_marcadas_vao_para_a_replica(self):
+        """Rotas marcadas e blocos usando_replica leem da réplica; gravações ficam no primário"""
+        with self.app_com_replica() as app_teste:
+            db.session.add(Usuario(nome='Novo', email='novo@teste.com', cpf='1', telefone='0', senha_hash='x'))
+            db.session.add(Usuario(nome='Outro', email='outro@teste.com', cpf='2', telefone='0', senha_hash='x'))
+            db.session.commit()
+
+            self.assertEqual(Usuario.query.count(), 2)
+            with usando_replica():
+                self.assertEqual(Usuario.query.count(), 1)
+                # Mesmo dentro do bloco, o que é gravado vai para o primário
+                db.session.add(Usuario(nome='Terceiro', email='terceiro@teste.com', cpf='3', telefone='0', senha_hash='x'))
+                db.session.commit()
+                self.assertEqual(Usuario.query.count(), 1)
+            self.assertEqual(Usuario.query.count(), 3)
+
+            self.assertEqual(app_teste.test_client().get('/relatorio').get_json(), {'usuarios': 1})
+            self.assertGreaterEqual(roteador_replica.metricas()['leituras_replica'], 2)
+
+    def test_volta_para_o_primario_se_a_replica_cair_ou_atrasar(self):
+        """Réplica fora do ar ou atrasada demais: as leituras continuam, no primário"""
+        with self.app_com_replica(f'sqlite:///{self.pasta.name}/nao/existe/replica.db') as app_teste:
+            with self.assertLogs(app_teste.logger, level='WARNING'):
+                self.assertEqual(app_teste.test_client().get('/relatorio').get_json(), {'usuarios': 0})
+            self.assertEqual(roteador_replica.metricas()['falhas_replica'], 1)
+
+        roteador_replica.limpar()
+        medir_atraso = roteador_replica.medir_atraso
+        roteador_replica.medir_atraso = lambda conexao: 3600
+        try:
+            with self.app_com_replica():
+                with usando_replica():
+                    self.assertEqual(Usuario.query.count(), 0)
+        finally:
+            roteador_replica.medir_atraso = medir_atraso
+        self.assertEqual(roteador_replica.metricas()['falhas_replica'], 2)
+
+    def test_atraso_desconhecido_le_do_primario(self):
+        """Se o MySQL não informa o atraso (ex: sem permissão), a réplica não é usada"""
+        conexao = unittest.mock.Mock()
+        conexao.dialect.name = 'mysql'
+        conexao.exec_driver_sql.side_effect = Exception('Access denied')
+        self.assertIsNone(roteador_replica.medir_atraso(conexao))
+
+        roteador_replica.limpar()
+        medir_atraso = roteador_replica.medir_atraso
+        roteador_replica.medir_atraso = lambda conexao: None
+        try:
+            with self.app_com_replica():
+                with usando_replica():
+                    self.assertEqual(Usuario.query.count(), 0)
+        finally:
+            roteador_replica.medir_atraso = medir_atraso
+        self.assertEqual(roteador_replica.metricas()['falhas_replica'], 1)
+
+
+class EstaticosTests(unittest.TestCase):
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.pasta.name, 'static')
+        arquivos = {
+            'css/site.css': ".capa {\n    background-image: url('../images/capa.png');\n}\n" * 20,
+            'js/site.js': 'console.log("ola");\n' * 50,
+            'images/capa.png': 'nao e um png de verdade'
+        }
+        for caminho, conteudo in arquivos.items():
+            os.makedirs(os.path.dirname(os.path.join(self.static, caminho)), exist_ok=True)
+            with open(os.path.join(self.static, caminho), 'w') as arquivo:
+                arquivo.write(conteudo)
+        self.pipeline = PipelineEstaticos()
+        self.pipeline.construir(self.static, mostrar=lambda texto: None)
+        self.app_teste = Flask('estaticos_teste', static_folder=self.static)
+        self.pipeline.init_app(self.app_teste)
+
+    def tearDown(self):
+        self.pasta.cleanup()
+
+    def test_url_com_hash_compactada_e_imutavel(self):
+        """url_for aponta para o arquivo com hash, que sai em gzip com cache de um ano"""
+        with self.app_teste.test_request_context():
+            url = url_for('static', filename='css/site.css')
+        self.assertRegex(url, r'^/static/dist/css/site\.[0-9a-f]{12}\.css$')
+
+        resposta = self.app_teste.test_client().get(url, headers={'Accept-Encoding': 'gzip, br;q=0'})
+        self.assertEqual(resposta.headers['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', resposta.headers['Cache-Control'])
+        css = gzip.decompress(resposta.get_data()).decode()
+        self.assertRegex(css, r"url\('\.\./images/capa\.[0-9a-f]{12}\.png'\)")
+
+        # Sem o build (ou arquivo fora dele) a rota /static continua como antes
+        self.assertEqual(self.app_teste.test_client().get('/static/js/site.js').status_code, 200)
+
+    def test_arquivo_alterado_depois_do_build_sai_sem_hash(self):
+        with open(os.path.join(self.static, 'js', 'site.js'), 'a') as arquivo:
+            arquivo.write('// mudou\n')
+        with self.assertLogs(self.app_teste.logger, level='WARNING'):
+            self.pipeline.carregar(self.app_teste)
+        with self.app_teste.test_request_context():
+            self.assertEqual(url_for('static', filename='js/site.js'), '/static/js/site.js')
+
+    def test_css_oferece_webp_com_image_set(self):
+        manifesto = {'images/capa.png': {'arquivo': 'images/capa.abc.png', 'webp': {'original': 'images/capa.def.webp'}}}
+        css = self.pipeline._reescrever_css('css/site.css', b".capa {\n    background-image: url('../images/capa.png');\n}", manifesto).decode()
+        self.assertIn("background-image: url('../images/capa.abc.png');", css)
+        self.assertIn("image-set(url('../images/capa.def.webp') type('image/webp'), url('../images/capa.abc.png') type('image/png'))", css)
+
+
+class CompactacaoTests(BancoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        criar_usuario("Admin", "adm@teste.com", "1", "ADM")
+        for i in range(30):
+            db.session.add(Usuario(nome=f"Cliente {i}", email=f"c{i}@teste.com", cpf=f"c{i}", telefone="000", senha_hash="x"))
+        db.session.commit()
+        self.entrar("adm@teste.com")
+
+    def obter(self, url, codificacao):
+        g.pop('_login_user', None)
+        return self.app.get(url, headers={'Accept-Encoding': codificacao})
+
+    def test_gzip_acima_do_minimo(self):
+        """Listas grandes saem em gzip; respostas pequenas e sem Accept-Encoding saem como estão"""
+        normal = self.obter('/api/admin/usuarios', '')
+        self.assertNotIn('Content-Encoding', normal.headers)
+
+        compactada = self.obter('/api/admin/usuarios', 'gzip, deflate')
+        self.assertEqual(compactada.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compactada.headers['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(compactada.get_data())), normal.get_json())
+        self.assertLess(len(compactada.get_data()), len(normal.get_data()))
+
+        self.assertNotIn('Content-Encoding', self.obter('/api/admin/estatisticas', 'gzip').headers)
+
+    def test_deflate_em_resposta_enviada_aos_poucos(self):
+        resposta = self.obter('/api/admin/usuarios?formato=ndjson', 'deflate')
+        self.assertEqual(resposta.headers['Content-Encoding'], 'deflate')
+        linhas = zlib.decompress(resposta.get_data()).decode().splitlines()
+        self.assertEqual(len(linhas), 31)
+
+    def test_formato_colunar(self):
+        """Com ?formato=colunar os nomes dos campos vêm uma vez só"""
+        dados = self.obter('/api/admin/usuarios?limit=5&formato=colunar', '').get_json()
+        usuarios = dados['usuarios']
+        self.assertIn('email', usuarios['colunas'])
+        self.assertEqual(len(usuarios['linhas']), 5)
+        self.assertEqual(usuarios['linhas'][0][usuarios['colunas'].index('email')], 'adm@teste.com')
+        self.assertIsNotNone(dados['proximo'])
+
+
+class SenhasTests(BancoTestCase):
+
+    def test_refaz_hash_antiga_no_login(self):
+        """Uma senha guardada com método antigo é refeita no login"""
+        u = criar_usuario("Cliente", "cli@teste.com", "2")
+        u.senha_hash = generate_password_hash("123", "pbkdf2:sha256:1000")
+        db.session.commit()
+
+        self.entrar("cli@teste.com")
+        # A hash nova precisa ter sido gravada (commit), não só alterada na sessão
+        db.session.rollback()
+        u = Usuario.query.filter_by(email="cli@teste.com").first()
+        self.assertTrue(u.senha_hash.startswith("scrypt:"))
+        self.assertTrue(u.verificar_senha("123"))
+
+    def test_processos_nao_usam_fork(self):
+        """Os processos auxiliares começam limpos, sem herdar as threads do servidor"""
+        self.assertIn(contexto_processos().get_start_method(), ('forkserver', 'spawn'))
+
+    def test_fila_cheia_recusa_na_hora(self):
+        """Com todas as vagas ocupadas o serviço recusa em vez de esperar"""
+        servico = ServicoSenhas()
+        _, vagas = servico._grupo()
+        total = app.config['SENHAS_PROCESSOS'] + app.config['SENHAS_FILA_MAXIMA']
+        for _ in range(total):
+            vagas.acquire()
+        try:
+            with self.assertRaises(SistemaOcupado):
+                servico.gerar_hash("123")
+            self.assertEqual(servico.metricas()['recusadas'], 1)
+        finally:
+            for _ in range(total):
+                vagas.release()
+        self.assertTrue(servico.verificar(servico.gerar_hash("123"), "123"))
+        self.assertEqual(servico.metricas()['total'], 2)
+
+
+class VisitasTests(BancoTestCase):
+
+    def test_visitas_gravadas_em_lote(self):
+        """Logins contam visitas na memória e a fidelidade já enxerga o número novo"""
+        cliente = criar_usuario("Cliente", "cli@teste.com", "2")
+        agora = datetime.utcnow()
+        db.session.add(Promocao(nome="Fiel", desconto_percentual=15, minimo_visitas=3,
+                                data_inicio=agora - timedelta(days=1), data_fim=agora + timedelta(days=1)))
+        db.session.commit()
+
+        self.entrar("cli@teste.com")
+        self.app.get('/logout')
+        self.entrar("cli@teste.com")
+
+        # Nada foi gravado ainda, mas a promoção de 3 visitas já aparece
+        self.assertEqual(db.session.query(Usuario.total_visitas).filter_by(id=cliente.id).scalar(), 1)
+        promocoes = self.app.get('/api/cliente/promocoes-disponiveis').get_json()['promocoes']
+        self.assertEqual([p['nome'] for p in promocoes], ["Fiel"])
+
+        self.assertEqual(acumulador_visitas.descarregar(), 1)
+        self.assertEqual(db.session.query(Usuario.total_visitas).filter_by(id=cliente.id).scalar(), 3)
+        self.assertEqual(acumulador_visitas.pendentes(cliente.id), (0, None))
+
+    def test_diario_sobrevive_a_queda_do_processo(self):
+        """Visitas anotadas em disco voltam se o processo morrer antes do commit"""
+        cliente = criar_usuario("Cliente", "cli@teste.com", "2")
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'visitas.diario')
+            antes = app.config.get('VISITAS_DIARIO')
+            app.config['VISITAS_DIARIO'] = caminho
+            self.addCleanup(app.config.__setitem__, 'VISITAS_DIARIO', antes)
+
+            primeiro = AcumuladorVisitas()
+            primeiro.registrar(cliente.id)
+            primeiro.registrar(cliente.id)
+            # O commit falha: as visitas continuam no disco (segmento fechado) e na memória
+            with unittest.mock.patch.object(db.session, 'commit', side_effect=RuntimeError('banco fora')):
+                with self.assertRaises(RuntimeError):
+                    primeiro.descarregar()
+            self.assertEqual(primeiro.pendentes(cliente.id)[0], 2)
+            primeiro.registrar(cliente.id)
+            # "Morre" sem gravar: a trava do processo é solta pelo sistema
+            primeiro._trava_processo.close()
+            primeiro._diario.close()
+
+            segundo = AcumuladorVisitas()
+            segundo._app = app
+            segundo._abrir_diario(caminho)
+            self.assertEqual(segundo.pendentes(cliente.id)[0], 3)
+            self.assertEqual(segundo.descarregar(), 1)
+            self.assertEqual(db.session.query(Usuario.total_visitas).filter_by(id=cliente.id).scalar(), 4)
+            # Depois do commit só sobra o segmento novo (vazio) e as travas
+            sobrando = sorted(os.path.basename(nome) for nome in os.listdir(pasta))
+            self.assertEqual(len([nome for nome in sobrando if not nome.endswith('.lock')]), 1)
+            segundo._trava_processo.close()
+            segundo._diario.close()
+
+
+class IdentidadeTests(BancoTestCase):
+
+    def test_cache_do_usuario_logado(self):
+        """O usuário logado vem do cache e sai dele quando é desativado"""
+        cliente = criar_usuario("Cliente", "cli@teste.com", "2")
+        self.entrar("cli@teste.com")
+        cache_identidade.zerar_metricas()
+
+        for _ in range(3):
+            # O contexto do teste fica aberto; tiramos o usuário do 'g' como aconteceria a cada requisição real
+            g.pop('_login_user', None)
+            self.assertEqual(self.app.get('/api/cliente/minhas-reservas').status_code, 200)
+        metricas = cache_identidade.metricas()
+        self.assertEqual(metricas['faltas'], 1)
+        self.assertEqual(metricas['acertos'], 2)
+
+        with self.assertRaises(AttributeError):
+            cache_identidade.obter(cliente.id).nome = "Outro"
+
+        cliente = db.session.get(Usuario, cliente.id)
+        cliente.ativo = False
+        db.session.commit()
+        # Desativado: o cache foi limpo e a sessão não vale mais
+        g.pop('_login_user', None)
+        self.assertEqual(self.app.get('/api/cliente/minhas-reservas').status_code, 302)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,249 @@
+import atexit
+import glob
+import os
+import re
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam, case, update
+from models import db, Usuario
+
+# Trava de arquivo que o sistema solta sozinho quando o processo morre
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _travar(arquivo, esperar=True):
+    """Trava exclusiva no arquivo aberto. False se outro processo já tem a trava (e esperar=False)."""
+    try:
+        if fcntl:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | (0 if esperar else fcntl.LOCK_NB))
+        else:
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_LOCK if esperar else msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+class AcumuladorVisitas:
+    """
+    Guarda as visitas (logins) na memória e grava tudo de uma vez no banco,
+    com um UPDATE em lote, a cada VISITAS_INTERVALO segundos ou quando
+    VISITAS_LOTE_MAXIMO usuários estão esperando.
+    Se VISITAS_DIARIO tiver um caminho de arquivo, cada visita também é anotada
+    em disco, para não se perder se o processo cair antes da gravação:
+    - cada processo (ex: cada worker do gunicorn) anota em seus próprios segmentos,
+      <VISITAS_DIARIO>.<pid>.<n>, e segura a trava <VISITAS_DIARIO>.<pid>.lock enquanto vive;
+    - a cada gravação o segmento atual é fechado e um novo começa; os fechados só são
+      apagados depois do commit (se o processo morrer antes, as visitas continuam em disco);
+    - ao iniciar, o processo adota os segmentos de processos que morreram (trava livre).
+    Se o processo cair entre o commit e a remoção dos segmentos, essas visitas contam duas vezes,
+    mas nenhuma se perde.
+    """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._pendentes = {}  # usuario_id -> [quantidade, ultima_visita]
+        self._acordar = threading.Event()
+        self._thread = None
+        self._app = None
+        self._diario = None
+        self._caminho = None
+        self._trava_processo = None
+        self._numero = 0
+        # Segmentos já fechados, esperando o commit das visitas que estão neles
+        self._fechados = []
+        # Uma gravação por vez: os segmentos fechados só saem depois do commit de tudo que veio antes
+        self._gravando = threading.Lock()
+        # Funções chamadas com os ids gravados depois de cada UPDATE em lote
+        self.ao_gravar = []
+
+    # ---------- registro ----------
+
+    def registrar(self, usuario_id, quando=None):
+        """Anota uma visita. Nenhum acesso ao banco acontece aqui."""
+        quando = quando or datetime.utcnow()
+        self._iniciar()
+        with self._trava:
+            self._somar(usuario_id, 1, quando)
+            if self._diario:
+                self._diario.write(f'{usuario_id}\t1\t{quando.isoformat()}\n')
+                self._diario.flush()
+            cheio = len(self._pendentes) >= self._app.config.get('VISITAS_LOTE_MAXIMO', 500)
+        if cheio:
+            self._acordar.set()
+
+    def _somar(self, usuario_id, quantidade, quando):
+        pendente = self._pendentes.setdefault(usuario_id, [0, quando])
+        pendente[0] += quantidade
+        pendente[1] = max(pendente[1], quando)
+
+    # ---------- leitura (para quem precisa do número atualizado) ----------
+
+    def pendentes(self, usuario_id):
+        """(visitas ainda não gravadas, última visita) de um usuário."""
+        with self._trava:
+            quantidade, ultima = self._pendentes.get(usuario_id, (0, None))
+            return quantidade, ultima
+
+    def todos_pendentes(self):
+        with self._trava:
+            return {usuario_id: tuple(dados) for usuario_id, dados in self._pendentes.items()}
+
+    def total_visitas(self, usuario):
+        """total_visitas do usuário somando o que ainda está na memória."""
+        return (usuario.total_visitas or 0) + self.pendentes(usuario.id)[0]
+
+    def ultima_visita(self, usuario):
+        ultima = self.pendentes(usuario.id)[1]
+        if ultima and (usuario.ultima_visita is None or ultima > usuario.ultima_visita):
+            return ultima
+        return usuario.ultima_visita
+
+    # ---------- gravação ----------
+
+    def descarregar(self):
+        """Grava as visitas pendentes com um único UPDATE em lote (executemany)."""
+        with self._gravando:
+            with self._trava:
+                lote = self._pendentes
+                self._pendentes = {}
+                if lote and self._diario:
+                    # As próximas visitas vão para um segmento novo; o atual só sai depois do commit
+                    self._abrir_segmento()
+                fechados = list(self._fechados)
+
+            if not lote:
+                return 0
+
+            tabela = Usuario.__table__
+            comando = update(tabela).where(tabela.c.id == bindparam('b_id')).values(
+                total_visitas=tabela.c.total_visitas + bindparam('b_quantidade'),
+                ultima_visita=case(
+                    (tabela.c.ultima_visita.is_(None), bindparam('b_quando')),
+                    (tabela.c.ultima_visita < bindparam('b_quando'), bindparam('b_quando')),
+                    else_=tabela.c.ultima_visita
+                )
+            )
+            parametros = [
+                {'b_id': usuario_id, 'b_quantidade': quantidade, 'b_quando': quando}
+                for usuario_id, (quantidade, quando) in lote.items()
+            ]
+
+            try:
+                db.session.execute(comando, parametros)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                # Voltam para a memória; no disco continuam nos segmentos fechados,
+                # que só saem no commit da próxima gravação
+                with self._trava:
+                    for usuario_id, (quantidade, quando) in lote.items():
+                        self._somar(usuario_id, quantidade, quando)
+                raise
+
+            with self._trava:
+                for caminho in fechados:
+                    self._apagar(caminho)
+                    self._fechados.remove(caminho)
+
+        for funcao in self.ao_gravar:
+            funcao(list(lote))
+        return len(parametros)
+
+    # ---------- thread de gravação ----------
+
+    def _iniciar(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._trava:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._app = current_app._get_current_object()
+            self._abrir_diario(self._app.config.get('VISITAS_DIARIO'))
+            self._thread = threading.Thread(target=self._trabalhar, name='gravador-visitas', daemon=True)
+            self._thread.start()
+
+    def _abrir_diario(self, caminho):
+        if not caminho or self._diario:
+            return
+        self._caminho = caminho
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        # Um processo por vez procura os segmentos órfãos
+        with open(caminho + '.lock', 'a') as geral:
+            _travar(geral)
+            self._trava_processo = open(f'{caminho}.{os.getpid()}.lock', 'a')
+            _travar(self._trava_processo)
+            # Segmentos com o nosso pid são de um processo antigo que teve o mesmo número
+            self._adotar(os.getpid())
+            for trava in glob.glob(glob.escape(caminho) + '.*.lock'):
+                numero = re.search(r'\.(\d+)\.lock$', trava)
+                if not numero or int(numero.group(1)) == os.getpid():
+                    continue
+                pid = int(numero.group(1))
+                with open(trava, 'a') as outra:
+                    # Trava livre: o processo dono morreu sem gravar tudo
+                    if not _travar(outra, esperar=False):
+                        continue
+                    self._adotar(pid)
+                    self._apagar(trava)
+            self._abrir_segmento()
+
+    def _segmentos(self, pid):
+        padrao = re.compile(re.escape(f'{self._caminho}.{pid}.') + r'(\d+)$')
+        encontrados = [(int(padrao.match(nome).group(1)), nome)
+                       for nome in glob.glob(glob.escape(f'{self._caminho}.{pid}.') + '*') if padrao.match(nome)]
+        return [nome for _, nome in sorted(encontrados)]
+
+    def _adotar(self, pid):
+        """Visitas dos segmentos de outro processo (ou de uma execução anterior) voltam para a memória."""
+        for segmento in self._segmentos(pid):
+            with open(segmento, encoding='utf-8') as antigo:
+                for linha in antigo:
+                    partes = linha.rstrip('\n').split('\t')
+                    if len(partes) == 3:
+                        self._somar(int(partes[0]), int(partes[1]), datetime.fromisoformat(partes[2]))
+            # Passa a ser nosso (protegido pela nossa trava) e sai no próximo commit
+            self._numero += 1
+            meu = f'{self._caminho}.{os.getpid()}.{self._numero}'
+            if segmento != meu:
+                os.replace(segmento, meu)
+            self._fechados.append(meu)
+
+    def _abrir_segmento(self):
+        if self._diario:
+            self._diario.close()
+            self._fechados.append(self._diario.name)
+        self._numero += 1
+        self._diario = open(f'{self._caminho}.{os.getpid()}.{self._numero}', 'w', encoding='utf-8')
+
+    def _apagar(self, caminho):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+    def _trabalhar(self):
+        while True:
+            self._acordar.wait(self._app.config.get('VISITAS_INTERVALO', 10))
+            self._acordar.clear()
+            self.gravar_agora()
+
+    def gravar_agora(self):
+        """Grava as pendências fora de uma requisição (thread de fundo, saída do processo)."""
+        if self._app is None:
+            return
+        with self._app.app_context():
+            try:
+                self.descarregar()
+            except Exception as erro:
+                print(f"Erro ao gravar visitas: {erro}")
+
+
+# Instância única usada pela aplicação
+acumulador_visitas = AcumuladorVisitas()
+atexit.register(acumulador_visitas.gravar_agora)